@@ -1,15 +1,72 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 import streamlit as st
 import pandas as pd
 from streamlit_option_menu import option_menu
-from fpdf import FPDF
 import requests
-import matplotlib.pyplot as plt
 from dotenv import load_dotenv
-import os
+import threading
+import time
+from collections import OrderedDict
+from services.charts import (
+    BELOW_7,
+    NPS_CATEGORIES_BAR,
+    NPS_CATEGORIES_PIE,
+    SCORE_DISTRIBUTION,
+    render_charts,
+)
 
 # Load the .env file
 load_dotenv()
 
+# How often and how long the UI polls an extraction job
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_POLL_TIMEOUT = float(os.getenv("JOB_POLL_TIMEOUT", "600"))
+# Keep-alive connections to the API shared by every browser session
+UI_HTTP_POOL_SIZE = int(os.getenv("UI_HTTP_POOL_SIZE", "10"))
+# Extraction results shared by every browser session, revalidated with the API's ETag before reuse
+UI_RESULT_CACHE_MAX_ITEMS = int(os.getenv("UI_RESULT_CACHE_MAX_ITEMS", "32"))
+
+
+class ResultCache:
+    """LRU of extraction results and their ETags, keyed by spreadsheet URL and wave."""
+
+    def __init__(self, max_items=UI_RESULT_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, etag, result):
+        if not etag:
+            return
+        with self._lock:
+            self._items[key] = (etag, result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+@st.cache_resource
+def http_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=UI_HTTP_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def result_cache():
+    return ResultCache()
+
 
 def setup_page():
     st.set_page_config(
@@ -28,6 +85,12 @@ def initialize_session_state():
         st.session_state.feedback_data = None
     if "cleaned_data" not in st.session_state:
         st.session_state.cleaned_data = None
+    if "metrics" not in st.session_state:
+        st.session_state.metrics = None
+    if "report_id" not in st.session_state:
+        st.session_state.report_id = None
+    if "result_wave_number" not in st.session_state:
+        st.session_state.result_wave_number = None
     if "sheet_title" not in st.session_state:
         st.session_state.sheet_title = None
     if "wave_number" not in st.session_state:
@@ -42,23 +105,95 @@ def call_extract_reviews(spreadsheet_url, wave_number):
         "spreadsheet_url": spreadsheet_url,
         "wave_number": "Wave " + wave_number
     }
+    cache_key = (spreadsheet_url, params["wave_number"])
+    cached = result_cache().get(cache_key)
+    # An unchanged result costs one revalidation round trip instead of a pipeline run
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    session = http_session()
 
     try:
         with st.spinner("Trying to fetch data..."):
-            fastapi_url = f"{os.getenv('MAIN_URL')}/extract-reviews"
-            response = requests.get(fastapi_url, params=params)
-
+            fastapi_url = os.getenv('MAIN_URL')
+            # Registered sheets are kept up to date by the API's scheduler; use that result when there is one
+            response = session.get(f"{fastapi_url}/precompute/results", params=params, headers=headers)
+            if response.status_code == 304:
+                st.success("The precomputed analysis has not changed. Now generating table from it...")
+                store_extraction_result(cached[1])
+                return
             if response.status_code == 200:
+                st.success("Loaded the precomputed analysis. Now generating table from it...")
                 result = response.json()
+                result_cache().put(cache_key, response.headers.get("ETag"), result)
+                store_extraction_result(result)
+                return
+
+            if cached:
+                # Only the sheet revision is checked here; a changed sheet is extracted by a job below
+                response = session.get(f"{fastapi_url}/extract-reviews/etag", params=params, headers=headers)
+                if response.status_code == 304:
+                    st.success("The sheet has not changed since the last analysis. Now generating table from it...")
+                    store_extraction_result(cached[1])
+                    return
+
+            response = session.post(f"{fastapi_url}/extract-reviews/jobs", params=params)
+
+            if response.status_code != 202:
+                st.error(f"Error: {response.status_code} - {response.text}")
+                return
+
+            job = poll_extraction_job(fastapi_url, response.json()['job_id'])
+            if job is None:
+                st.error("Timed out waiting for the extraction job to finish.")
+            elif job['status'] == "succeeded":
                 st.success("Reviews successfully extracted. Now generating table from it...")
-                st.session_state.feedback_data = result['payload']['feedback_generated']
-                st.session_state.cleaned_data = result['cleaned_data']
-                st.session_state.sheet_title = result['sheet_title']
+                result_cache().put(cache_key, job['result'].get('etag'), job['result'])
+                store_extraction_result(job['result'])
             else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+                error = job['error'] or {}
+                st.error(f"Error: {error.get('status_code')} - {error.get('detail')}")
     except Exception as e:
         st.error(f"An error occurred: {e}")
 
+def store_extraction_result(result):
+    st.session_state.feedback_data = result['payload']['feedback_generated']
+    st.session_state.cleaned_data = result['cleaned_data']
+    st.session_state.metrics = result['metrics']
+    st.session_state.report_id = result['report_id']
+    st.session_state.result_wave_number = result['wave_number']
+    st.session_state.sheet_title = result['sheet_title']
+
+def poll_extraction_job(fastapi_url, job_id):
+    """Poll the job endpoint until the job finishes; returns None on timeout."""
+    deadline = time.monotonic() + JOB_POLL_TIMEOUT
+    status_text = st.empty()
+    while time.monotonic() < deadline:
+        response = http_session().get(f"{fastapi_url}/jobs/{job_id}")
+        response.raise_for_status()
+        job = response.json()
+        if job['status'] in ("succeeded", "failed"):
+            status_text.empty()
+            return job
+        status_text.caption(f"Job {job['status']}: {job['stage'] or 'queued'}...")
+        time.sleep(JOB_POLL_INTERVAL)
+    status_text.empty()
+    return None
+
+@st.cache_data(max_entries=UI_RESULT_CACHE_MAX_ITEMS, show_spinner=False)
+def fetch_report_pdf(report_id, kind):
+    """PDF bytes of a report; MAIN_URL may be internal to the server, so the browser never fetches it itself."""
+    response = http_session().get(f"{os.getenv('MAIN_URL')}/reports/{report_id}/{kind}.pdf")
+    response.raise_for_status()
+    return response.content
+
+def pdf_download_button(label, kind, file_name):
+    try:
+        with st.spinner("Preparing the PDF..."):
+            pdf = fetch_report_pdf(st.session_state.report_id, kind)
+    except Exception as e:
+        st.error(f"Could not load the PDF: {e}")
+        return
+    st.download_button(label=label, data=pdf, file_name=file_name, mime="application/pdf")
+
 def generate_table(data,sheet_title, wave_number):
     # Positive and negative aspects from the cleaned_data
     positive_df = pd.DataFrame(data['positive_aspects'])
@@ -76,80 +211,19 @@ def generate_table(data,sheet_title, wave_number):
     negative_df.index = range(1, len(negative_df) + 1)
     st.table(negative_df)
 
-    # Creating PDF and enabling download
-    pdf_file_path = create_pdf(positive_df, negative_df,sheet_title, wave_number)
-    if pdf_file_path:
-        st.download_button(
-            label="Download Feedback as PDF",
-            data=open(pdf_file_path, "rb").read(),
-            file_name=f"{sheet_title}-Wave-{wave_number}.pdf",
-            mime="application/pdf",
-        )
-
-def create_pdf(positive_df, negative_df, sheet_title, wave_number):
-    try:
-        # Check if the dataframes contain the required columns
-        if 'Aspect' not in positive_df.columns or 'Explanation' not in positive_df.columns:
-            st.error("Positive aspects data is missing required columns.")
-            return None
-        if 'Aspect' not in negative_df.columns or 'Explanation' not in negative_df.columns:
-            st.error("Negative aspects data is missing required columns.")
-            return None
-
-        # Create a PDF object
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # Title
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(200, 10, f"Feedback Analysis for {sheet_title}", ln=True, align="C")
-        pdf.cell(200, 10, f"Wave Number: {wave_number}", ln=True, align="C")
-        pdf.ln(10)  # Line break after title
-        pdf.set_font("Arial", "B", 16)
-
-        # Positive aspects
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(200, 10, txt="Positive Aspects", ln=True, align="L")
-        pdf.set_font("Arial", size=12)
-        for index, row in positive_df.iterrows():
-            pdf.multi_cell(0, 10, txt=f"{row['Aspect']}: {row['Explanation']}")
-
-        pdf.ln(10)
-
-        # Negative aspects
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(200, 10, txt="Improvements Needed Aspects", ln=True, align="L")
-        pdf.set_font("Arial", size=12)
-        for index, row in negative_df.iterrows():
-            pdf.multi_cell(0, 10, txt=f"{row['Aspect']}: {row['Explanation']}")
-
-        # Save the PDF
-        pdf_file_path = "feedback_analysis.pdf"
-        pdf.output(pdf_file_path)
-        return pdf_file_path
-    except Exception as e:
-        st.error(f"An error occurred while generating the PDF: {e}")
-        return None
-
-def analyse_data(data):
-    # Convert the cleaned_data from JSON to DataFrame
-    data_df = pd.DataFrame(data)
-    num_respondents = len(data_df)
+    # The API builds the PDF once per report; the bytes are fetched here and kept for reruns
+    pdf_download_button("Download Feedback as PDF", "feedback", f"{sheet_title}-{st.session_state.result_wave_number}.pdf")
 
-    if 'recommendation_score' not in data_df.columns:
-        st.error("The dataset does not contain a 'recommendation_score' column.")
+def analyse_data(metrics, wave_number):
+    """Render the NPS metrics computed by the API."""
+    if not metrics or not metrics['respondents']:
+        st.error("The dataset does not contain any 'recommendation_score' values.")
         return
 
-    score = data_df['recommendation_score']
-    minimal_score = score.min()
-    average_score = score.mean()
-
     # Create a summary DataFrame
     summary_df = pd.DataFrame({
         "Metric": ["Number of Respondents", "Minimum Score", "Average Score"],
-        "Value": [num_respondents, minimal_score, f"{average_score:.2f}"]
+        "Value": [metrics['respondents'], metrics['minimum_score'], f"{metrics['average_score']:.2f}"]
     })
 
     # Set the index to start from 1
@@ -160,89 +234,44 @@ def analyse_data(data):
     st.write("### Analysis Overview")
     st.table(summary_df)
 
-    plot_score_distribution(data_df)
-    calculate_percentage_below_7(data_df)
-    calculate_nps(data_df)
+    # Charts are cached by histogram and wave, so reruns with unchanged data do no plotting
+    charts = render_charts(metrics['histogram'], wave_number)
 
+    plot_score_distribution(charts, wave_number)
+    calculate_percentage_below_7(metrics, charts)
+    calculate_nps(metrics, charts)
 
-def plot_score_distribution(data):
-    if 'wave_number' not in data.columns or len(data['wave_number'].unique()) > 1:
+
+def plot_score_distribution(charts, wave_number):
+    if wave_number is None:
         st.error("Wave number data is missing or inconsistent.")
         return
 
-    wave_number = data['wave_number'].iloc[0]
-
-    plt.figure(figsize=(8, 4))
-    plt.hist(
-        data['recommendation_score'],
-        bins=10,
-        range=(0, 10),
-        color='skyblue',
-        edgecolor='black',
-        alpha=0.7
-    )
-    plt.title(f'Feedback Score Distribution for Wave {wave_number}', fontsize=16)
-    plt.xlabel('Scores (0 to 10)', fontsize=14)
-    plt.ylabel('Frequency', fontsize=14)
-    plt.xticks(range(0, 11))
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Save plot as PNG in the 'charts' folder
-    if not os.path.exists("charts"):
-        os.makedirs("charts")  # Create the folder if it doesn't exist
-
-    plot_filename = f"charts/score_distribution_wave_{wave_number}.png"
-    plt.savefig(plot_filename, bbox_inches='tight')
-
-    st.pyplot(plt)
+    st.image(charts[SCORE_DISTRIBUTION], use_container_width=True)
 
-def calculate_percentage_below_7(data):
-    scores = data['recommendation_score']
-    num_respondents = len(scores)
+def calculate_percentage_below_7(metrics, charts):
+    num_respondents = metrics['respondents']
 
     if num_respondents == 0:
         st.warning("No data available for the selected wave.")
         return
 
-    below_7 = scores[scores < 7]
-    percentage_below_7 = (len(below_7) / num_respondents) * 100
+    percentage_below_7 = metrics['below_7_pct']
 
     st.write(f"### Percentage of Respondents with Scores Below 7: {percentage_below_7:.2f}%")
+    st.image(charts[BELOW_7], use_container_width=True)
 
-    labels = ['Below 7', '7 and Above']
-    sizes = [len(below_7), num_respondents - len(below_7)]
-    colors = ['red', 'green']
-    explode = (0.1, 0)
-
-    plt.figure(figsize=(6, 4))
-    plt.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%', startangle=100)
-    plt.title('Percentage of Respondents with Scores Below 7', fontsize=16)
-
-     # Save plot as PNG in the 'charts' folder
-    if not os.path.exists("charts"):
-        os.makedirs("charts")  # Create the folder if it doesn't exist
-
-    plot_filename = f"charts/score_chart_wave_{st.session_state.wave_number}.png"
-    plt.savefig(plot_filename, bbox_inches='tight')
-
-    st.pyplot(plt)
-
-def calculate_nps(data):
-    scores = data['recommendation_score']
-
-    promoters = scores[scores >= 9]
-    passives = scores[(scores >= 7) & (scores <= 8)]
-    detractors = scores[scores <= 6]
-    total_responses = len(scores)
+def calculate_nps(metrics, charts):
+    total_responses = metrics['respondents']
 
     if total_responses == 0:
         st.warning("No data available for the selected wave.")
         return None
 
-    promoter_pct = len(promoters) / total_responses * 100
-    passive_pct = len(passives) / total_responses * 100
-    detractor_pct = len(detractors) / total_responses * 100
-    nps = promoter_pct - detractor_pct
+    promoter_pct = metrics['promoters_pct']
+    passive_pct = metrics['passives_pct']
+    detractor_pct = metrics['detractors_pct']
+    nps = metrics['nps']
 
     results_df = pd.DataFrame({
         "Metric": ["Total Responses", "Promoters (%)", "Passives (%)", "Detractors (%)", "NPS"],
@@ -254,102 +283,12 @@ def calculate_nps(data):
     st.session_state.nps_results_df = results_df
     st.table(results_df)
 
-    categories = ['Promoters', 'Passives', 'Detractors']
-    percentages = [promoter_pct, passive_pct, detractor_pct]
-
-    fig, ax = plt.subplots(figsize=(6, 4))
-    ax.bar(categories, percentages, color=['green', 'yellow', 'red'])
-    ax.set_xlabel('Categories')
-    ax.set_ylabel('Percentage (%)')
-    ax.set_title('Distribution of NPS Categories')
-    st.pyplot(fig)
-
-    labels = ['Promoters', 'Passives', 'Detractors']
-    sizes = [len(promoters), len(passives), len(detractors)]
-    colors = ['green', 'yellow', 'red']
-    explode = (0, 0, 0)
-
-    fig, ax = plt.subplots(figsize=(4, 2))
-    wedges, texts, autotexts = ax.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%', startangle=80)
-    # Set font size for the labels and the percentages
-    for text in texts:
-        text.set_fontsize(6)  # Decrease label font size
-
-    for autotext in autotexts:
-        autotext.set_fontsize(4)
-    ax.set_title('Proportion of NPS Categories')
-    st.pyplot(fig)
-    # Creating PDF and enabling download
-    pdf_file_path = create_result_pdf()
-    if pdf_file_path:
-        st.download_button(
-            label="Download Results as PDF",
-            data=open(pdf_file_path, "rb").read(),
-            file_name=f"{st.session_state.sheet_title}-wave{st.session_state.wave_number}-results.pdf",
-            mime="application/pdf",
-        )
-
-def create_result_pdf():
-    try:
-        # Create a PDF object
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        # Title
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(200, 10, f"Feedback Result for {st.session_state.sheet_title}", ln=True, align="C")
-        pdf.cell(200, 10, f"Wave Number: {st.session_state.wave_number}", ln=True, align="C")
-        pdf.ln(10)  # Line break after title
-
-        # Analysis Overview Section
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(200, 10, "Analysis Overview", ln=True, align="L")
-        pdf.set_font("Arial", size=12)
-        if 'nps_results_df' in st.session_state:
-            for index, row in st.session_state.nps_results_df.iterrows():
-                pdf.multi_cell(0, 10, txt=f"{row['Metric']}: {row['Value']}")
-        pdf.ln(10)  # Add space after the analysis overview
-
-        # Add NPS Feedback Score Distribution Chart (if available)
-        nps_chart_path = f"charts/score_distribution_wave_Wave {st.session_state.wave_number}.png"
-        if os.path.exists(nps_chart_path):
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(200, 10, "NPS Feedback Score Distribution", ln=True, align="L")
-            pdf.image(nps_chart_path, x=10, y=pdf.get_y(), w=180)
-            pdf.ln(10)  # Add space after the NPS chart
-
-        pdf.ln(100)
-
-        # NPS Calculation Results Section
-        pdf.ln(50)
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(200, 10, "NPS Calculation Results", ln=True, align="L")
-        pdf.set_font("Arial", size=12)
-        if 'nps_results_df' in st.session_state:
-            for index, row in st.session_state.nps_results_df.iterrows():
-                pdf.multi_cell(0, 10, txt=f"{row['Metric']}: {row['Value']}")
-        pdf.ln(10)  # Add space after NPS results section
-        # Add Feedback Score Distribution Chart (if available)
-        pdf.ln(10)
-        chart_path = f"charts/score_chart_wave_{st.session_state.wave_number}.png"
-        if os.path.exists(chart_path):
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(200, 10, "Feedback Score Distribution", ln=True, align="L")
-            pdf.image(chart_path, x=10, y=pdf.get_y(), w=180)
-            pdf.ln(10)  # Add space after the chart
-
-        # Final spacing before saving the PDF
-        pdf.ln(10)
-
-        # Save the PDF
-        pdf_file_path = "feedback_result.pdf"
-        pdf.output(pdf_file_path)
-        return pdf_file_path
-    except Exception as e:
-        st.error(f"An error occurred while generating the PDF: {e}")
-        return None
+    st.image(charts[NPS_CATEGORIES_BAR], use_container_width=True)
+    st.image(charts[NPS_CATEGORIES_PIE])
+    pdf_download_button(
+        "Download Results as PDF", "results",
+        f"{st.session_state.sheet_title}-{st.session_state.result_wave_number}-results.pdf",
+    )
 
 
 def clear_all_data():
@@ -400,7 +339,7 @@ def main():
             generate_table(st.session_state.feedback_data,st.session_state.sheet_title,st.session_state.wave_number)
         elif selected_tab == "Analysis Results":
             st.header("Analysis Results")
-            analyse_data(st.session_state.cleaned_data)
+            analyse_data(st.session_state.metrics, st.session_state.result_wave_number)
     else:
         st.warning("Please extract reviews first by entering a Google Sheet URL.")
 
@@ -1,7 +1,11 @@
-import gspread
-from google.oauth2.service_account import Credentials
-from dotenv import load_dotenv
+import itertools
 import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from services.rate_limit import TokenBucket
 
 # Load the .env file
 load_dotenv()
@@ -12,11 +16,171 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
-# Path to your service account key file
+# "google" for the real API, or "stub" for the local stub sheets (tests, offline runs)
+SHEETS_BACKEND = os.getenv("SHEETS_BACKEND", "google")
+
+# Path to your service account key file; several files separated by commas spread the API quota
 SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE_PATH')
 
-# Authenticate using the service account
-credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+# Connections kept open per service account, shared by concurrent requests
+SHEETS_POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "16"))
+SHEETS_TIMEOUT_SECONDS = float(os.getenv("SHEETS_TIMEOUT_SECONDS", "60"))
+# Refresh access tokens this long before they expire, so no request waits on a refresh
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Sheets and Drive requests allowed per service account per minute; excess requests wait (0 disables)
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+
+
+def service_account_files(value=SERVICE_ACCOUNT_FILE):
+    return [path.strip() for path in (value or "").split(",") if path.strip()]
+
+
+def rate_limited(request, limiter):
+    """Wrap a session's `request` so every HTTP call first takes a token from `limiter`."""
+    def limited_request(*args, **kwargs):
+        limiter.acquire()
+        return request(*args, **kwargs)
+    return limited_request
+
+
+class ServiceAccountClient:
+    """One service account's credentials and gspread client over a pooled HTTP session."""
+
+    def __init__(self, path, pool_size=SHEETS_POOL_SIZE, timeout=SHEETS_TIMEOUT_SECONDS,
+                 refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS, requests_per_minute=SHEETS_REQUESTS_PER_MINUTE):
+        import gspread
+        from google.auth.transport.requests import AuthorizedSession, Request
+        from google.oauth2.service_account import Credentials
+        from requests.adapters import HTTPAdapter
+
+        self.path = path
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.credentials = Credentials.from_service_account_file(path, scopes=SCOPES)
+        self._request = Request()
+        self._lock = threading.Lock()
+
+        session = AuthorizedSession(self.credentials)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        # The per-user quota applies to each service account, so each one has its own bucket
+        self.limiter = TokenBucket.per_minute("sheets", requests_per_minute)
+        session.request = rate_limited(session.request, self.limiter)
+        self.client = gspread.authorize(self.credentials, session=session)
+        self.client.set_timeout(timeout)
+
+    def _needs_refresh(self):
+        expiry = self.credentials.expiry
+        if not self.credentials.token or expiry is None:
+            return True
+        # google-auth stores the expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return expiry - now < self.refresh_margin
+
+    def get(self):
+        """The client, with its access token refreshed ahead of expiry by exactly one thread."""
+        if self._needs_refresh():
+            with self._lock:
+                if self._needs_refresh():
+                    self.credentials.refresh(self._request)
+        return self.client
+
+
+class GSheetClientProvider:
+    """
+    Lazily builds the Sheets clients on first use and hands them out round-robin.
+
+    Nothing is read or authorised at import time, so the app starts without
+    credentials; a missing key file only fails the requests that need Sheets.
+
+    A spreadsheet only opens for the accounts it is shared with, so
+    `open_by_key` pins each spreadsheet to the first account that can open it
+    and keeps using that one. The quota is then spread per spreadsheet rather
+    than per request.
+    """
+
+    def __init__(self, backend=SHEETS_BACKEND, account_files=None):
+        self.backend = backend
+        self.account_files = account_files
+        self._clients = None
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # Spreadsheet ID -> index of the account that opened it
+        self._pinned = {}
+
+    def _build(self):
+        if self.backend == "stub":
+            from services.stub_sheets import StubGSheetClient
+            return [StubGSheetClient()]
+        if self.backend != "google":
+            raise ValueError(f"Unknown SHEETS_BACKEND {self.backend!r}; expected 'google' or 'stub'.")
+        files = self.account_files if self.account_files is not None else service_account_files()
+        if not files:
+            raise RuntimeError("SERVICE_ACCOUNT_FILE_PATH is not set; cannot authorise Google Sheets access.")
+        return [ServiceAccountClient(path) for path in files]
+
+    def set_clients(self, clients):
+        """Replace the clients, e.g. with a stub in tests and benchmarks."""
+        with self._lock:
+            self._clients = list(clients)
+            self._pinned = {}
+
+    def _all(self):
+        clients = self._clients
+        if clients is None:
+            with self._lock:
+                if self._clients is None:
+                    self._clients = self._build()
+                clients = self._clients
+        return clients
+
+    @staticmethod
+    def _authorised(client):
+        return client.get() if isinstance(client, ServiceAccountClient) else client
+
+    def get(self):
+        clients = self._all()
+        return self._authorised(clients[next(self._counter) % len(clients)])
+
+    def open_by_key(self, spreadsheet_id):
+        """
+        Open a spreadsheet with the account it is pinned to.
+
+        A spreadsheet not opened before starts at the next account in
+        round-robin order. When an account gets a permission error, the
+        others are tried in turn and the spreadsheet is pinned to the first
+        one that can open it.
+
+        Raises:
+            PermissionError, SpreadsheetNotFound: No account can open the spreadsheet.
+        """
+        from gspread.exceptions import SpreadsheetNotFound
+
+        clients = self._all()
+        start = self._pinned.get(spreadsheet_id)
+        if start is None:
+            start = next(self._counter)
+        first_error = None
+        for offset in range(len(clients)):
+            index = (start + offset) % len(clients)
+            try:
+                spreadsheet = self._authorised(clients[index]).open_by_key(spreadsheet_id)
+            except (PermissionError, SpreadsheetNotFound) as e:
+                # The Sheets API answers 403, or 404 for some sheets, when the sheet is not shared with the account
+                first_error = first_error or e
+                continue
+            self._pinned[spreadsheet_id] = index
+            return spreadsheet
+        raise first_error
+
+
+gsheet_provider = GSheetClientProvider()
+
+
+def get_gsheet_client():
+    """Return an authorised gspread client, creating the clients on first use."""
+    return gsheet_provider.get()
+
 
-# Initialize the gspread client
-gsheet_client = gspread.authorize(credentials)
+def set_gsheet_client(client):
+    """Serve every request from `client`, e.g. a `StubGSheetClient`."""
+    gsheet_provider.set_clients([client])
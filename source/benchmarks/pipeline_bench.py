@@ -0,0 +1,275 @@
+"""
+Benchmark of the extraction and analysis pipeline on synthetic survey sheets.
+
+Runs every hot path against the stub Sheets client and the stub LLM backend, so
+it needs no credentials or network. Run from the `source` directory:
+
+    python -m benchmarks.pipeline_bench --rows 1000 100000 --waves 20 --repeat 5
+    python -m benchmarks.pipeline_bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_bench --baseline benchmarks/baseline.json
+
+With --baseline the exit status is 1 when any stage's p50 got slower than
+--max-regression times the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+STAGES = [
+    "fetch_cold",
+    "sync_unchanged",
+    "sync_incremental",
+    "wave_query",
+    "clean",
+    "build_json",
+    "preanalysis",
+    "prompt_build",
+    "summarize",
+    "metrics",
+    "charts",
+    "pdf",
+]
+
+# Stages faster than this are too noisy to flag as regressions
+MIN_COMPARABLE_MS = 1.0
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+class PipelineBenchmark:
+    """Times each pipeline stage for one synthetic sheet size."""
+
+    def __init__(self, rows, waves, client):
+        # Imported here so the environment set up in main() is seen by the module-level settings
+        from routers.feedback_generator import summarize_feedback
+        from services import charts, nps_metrics, prompt_builder, reports, review_pipeline, text_analysis
+        from services.llm_client import StubLLMClient
+        from services.response_store import response_store
+        from services.sheet_cache import sheet_cache
+        from services.stub_sheets import survey_headers
+
+        self.rows = rows
+        self.waves = waves
+        self.client = client
+        self.headers = survey_headers()
+        self.json_data = review_pipeline.load_column_keys("col_keys.json")
+        self.llm = StubLLMClient()
+        self._summarize_feedback = summarize_feedback
+        self._charts = charts
+        self._nps_metrics = nps_metrics
+        self._reports = reports
+        self._text_analysis = text_analysis
+        self._prompt_builder = prompt_builder
+        self._pipeline = review_pipeline
+        self._response_store = response_store
+        self._sheet_cache = sheet_cache
+        self._template = client.add_sheet("template", self.headers, rows, waves)
+        self._runs = 0
+
+    def _stages(self):
+        """Yield (stage name, rows handled, callable) for one fresh spreadsheet."""
+        self._runs += 1
+        spreadsheet_id = f"bench-{self.rows}-{self._runs}"
+        spreadsheet = self.client.add_sheet(spreadsheet_id, self.headers, 0, 1)
+        # Copy the generated columns instead of regenerating them, which would dominate the run
+        spreadsheet.sheet1.columns = [list(values) for values in self._template.sheet1.columns]
+        wave = "Wave 1"
+        state = {}
+
+        def sync():
+            state["snapshot"] = self._pipeline.sync_sheet(spreadsheet_id, self.json_data)
+
+        def sync_incremental():
+            spreadsheet.append_synthetic_rows(max(1, self.rows // 100), self.waves, seed=self._runs)
+            sync()
+
+        def wave_query():
+            state["wave_df"] = self._response_store.wave_frame(spreadsheet_id, wave)
+
+        def clean():
+            state["renamed_df"] = self._pipeline.rename_configured_columns(state["wave_df"], self.json_data)
+
+        def build_json():
+            state["structured"] = self._pipeline.build_structured_feedback(state["renamed_df"], self.json_data)
+
+        def preanalysis():
+            state["analysis"] = self._text_analysis.analyze_feedback(state["structured"])
+
+        def prompt_build():
+            analysis = state["analysis"]
+            state["prompt"] = self._prompt_builder.build_prompt_feedback(
+                state["structured"], selected=analysis.feedback if analysis.applied else None,
+            )
+
+        def summarize():
+            analysis = state["analysis"]
+            statistics = analysis.statistics() if analysis.applied else None
+            state["feedback"], _ = self._summarize_feedback(state["prompt"].feedback, self.llm, statistics=statistics)
+
+        def metrics():
+            state["metrics"] = self._nps_metrics.compute_nps_metrics(state["renamed_df"])
+
+        def charts():
+            for render in self._charts.RENDERERS.values():
+                render(state["metrics"]["histogram"], wave)
+
+        def pdf():
+            source = {
+                "feedback": state["feedback"],
+                "metrics": state["metrics"],
+                "sheet_title": "Synthetic Survey",
+                "wave_number": wave,
+            }
+            for build in self._reports.REPORT_BUILDERS.values():
+                build(source)
+
+        wave_rows = -(-self.rows // self.waves)
+        yield "fetch_cold", self.rows, sync
+        yield "sync_unchanged", self.rows, sync
+        yield "sync_incremental", max(1, self.rows // 100), sync_incremental
+        yield "wave_query", wave_rows, wave_query
+        yield "clean", wave_rows, clean
+        yield "build_json", wave_rows, build_json
+        yield "preanalysis", wave_rows, preanalysis
+        yield "prompt_build", wave_rows, prompt_build
+        yield "summarize", wave_rows, summarize
+        yield "metrics", wave_rows, metrics
+        yield "charts", wave_rows, charts
+        yield "pdf", wave_rows, pdf
+        self._sheet_cache.invalidate(spreadsheet_id)
+        del self.client.spreadsheets[spreadsheet_id]
+
+    def run(self, repeat):
+        """
+        Run every stage `repeat` times, plus one traced pass for peak memory.
+
+        Returns:
+            dict: Stage name -> latency, throughput and memory figures.
+        """
+        timings = {stage: [] for stage in STAGES}
+        handled = {}
+        for _ in range(repeat):
+            for stage, rows, call in self._stages():
+                started = time.perf_counter()
+                call()
+                timings[stage].append((time.perf_counter() - started) * 1000)
+                handled[stage] = rows
+
+        # tracemalloc slows allocation-heavy code, so memory is measured in a separate pass
+        peaks = {}
+        tracemalloc.start()
+        try:
+            for stage, _, call in self._stages():
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                call()
+                peaks[stage] = max(0, tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+        results = {}
+        for stage in STAGES:
+            p50 = percentile(timings[stage], 50)
+            results[stage] = {
+                "rows": handled[stage],
+                "p50_ms": round(p50, 3),
+                "p99_ms": round(percentile(timings[stage], 99), 3),
+                "mean_ms": round(sum(timings[stage]) / len(timings[stage]), 3),
+                "rows_per_s": round(handled[stage] / (p50 / 1000)) if p50 else None,
+                "peak_mem_mb": round(peaks[stage] / 2 ** 20, 3),
+            }
+        return results
+
+
+def compare(results, baseline, max_regression):
+    """List of (size, stage, baseline p50, current p50) that regressed beyond `max_regression`."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, figures in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None or reference["p50_ms"] < MIN_COMPARABLE_MS:
+                continue
+            if figures["p50_ms"] > reference["p50_ms"] * max_regression:
+                regressions.append((size, stage, reference["p50_ms"], figures["p50_ms"]))
+    return regressions
+
+
+def print_table(rows, results, baseline=None):
+    print(f"\n{rows:,} rows")
+    print(f"{'stage':<18}{'rows':>10}{'p50 ms':>12}{'p99 ms':>12}{'rows/s':>14}{'peak MB':>10}{'vs base':>9}")
+    for stage, figures in results.items():
+        reference = (baseline or {}).get(stage)
+        ratio = f"{figures['p50_ms'] / reference['p50_ms']:.2f}x" if reference and reference["p50_ms"] else ""
+        print(
+            f"{stage:<18}{figures['rows']:>10,}{figures['p50_ms']:>12.2f}{figures['p99_ms']:>12.2f}"
+            f"{figures['rows_per_s'] or 0:>14,}{figures['peak_mem_mb']:>10.2f}{ratio:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Sheet sizes to run")
+    parser.add_argument("--waves", type=int, default=20, help="Number of waves in each synthetic sheet")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per size")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="Save the results as the new baseline")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="Allowed p50 slowdown factor")
+    args = parser.parse_args(argv)
+
+    # Keep the benchmark's caches and stores away from the real ones, and never call a real model
+    workdir = tempfile.mkdtemp(prefix="nps-bench-")
+    os.environ["CACHE_DIR"] = workdir
+    os.environ["CHART_CACHE_DIR"] = os.path.join(workdir, "charts")
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["SHEETS_BACKEND"] = "stub"
+    from auth import set_gsheet_client
+    from services.stub_sheets import StubGSheetClient
+
+    client = StubGSheetClient()
+    set_gsheet_client(client)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    for rows in args.rows:
+        results[str(rows)] = PipelineBenchmark(rows, args.waves, client).run(args.repeat)
+        print_table(rows, results[str(rows)], (baseline or {}).get(str(rows)))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "waves": args.waves,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=4)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_regression)
+        for size, stage, before, after in regressions:
+            print(f"REGRESSION {size} rows / {stage}: p50 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
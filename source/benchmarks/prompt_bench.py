@@ -0,0 +1,148 @@
+"""
+Benchmark of the prompt builder on synthetic survey waves.
+
+Each wave mixes real answers, their near-duplicate variants (case, spacing,
+punctuation, small typos and additions) and non-answers such as "NA". For
+every size it reports the build time and the prompt size before and after
+collapsing. Run from the `source` directory:
+
+    python -m benchmarks.prompt_bench --answers 1000 10000 100000 --repeat 5
+    python -m benchmarks.prompt_bench --budget 3000 --output prompt_bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmarks.pipeline_bench import percentile
+
+FEEDBACK_KEYS = [
+    "engineer_feedback",
+    "program_likings",
+    "topics_learned",
+    "program_improvements",
+    "engineer_improvements",
+]
+
+ANSWERS = [
+    "Mentors are very supportive and clear doubts quickly",
+    "More hands-on projects please",
+    "The pace of the course is too fast for beginners",
+    "Good coverage of data structures and algorithms",
+    "Need more mock interviews before placements",
+    "Doubt clearing sessions are really helpful",
+    "Spring Boot module was hard to follow",
+    "Daily coding assignments improved my problem solving",
+    "The lab internet connection is slow in the evenings",
+    "Would like more sessions on system design",
+    "All good",
+    "Great learning experience overall",
+]
+NON_ANSWERS = ["NA", "na", "N/A", "nothing", "Nothing.", "-", "nil", "No comments", "none", "ok"]
+
+
+def _variant(text, rnd):
+    """A near-duplicate of `text`, the way the same answer gets typed by different people."""
+    choice = rnd.random()
+    if choice < 0.2:
+        return text.lower()
+    if choice < 0.35:
+        return text + rnd.choice(["!", "!!", ".", " :)", " overall"])
+    if choice < 0.5:
+        i = rnd.randrange(1, len(text) - 1)
+        return text[:i] + text[i + 1:]
+    if choice < 0.6:
+        return "  " + text.upper() + " "
+    return text
+
+
+def synthetic_wave(answers, seed=0, unique_share=0.05):
+    """Structured feedback with `answers` answers per list; `unique_share` of them are one-off comments."""
+    rnd = random.Random(seed)
+    wave = {}
+    for key in FEEDBACK_KEYS:
+        values = []
+        for i in range(answers):
+            roll = rnd.random()
+            if roll < 0.15:
+                values.append(rnd.choice(NON_ANSWERS))
+            elif roll < 0.15 + unique_share:
+                values.append(f"{rnd.choice(ANSWERS)} because of reason {rnd.randrange(answers)} in week {i % 12}")
+            else:
+                values.append(_variant(rnd.choice(ANSWERS), rnd))
+        wave[key] = values
+    return wave
+
+
+def run(answers, repeat, budget, threshold):
+    from services.llm_client import estimate_tokens
+    from services.prompt_builder import build_prompt_feedback, render_feedback
+
+    wave = synthetic_wave(answers)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        built = build_prompt_feedback(wave, token_budget=budget, threshold=threshold)
+        timings.append((time.perf_counter() - started) * 1000)
+    exact = build_prompt_feedback(wave, token_budget=budget, threshold=1.0)
+
+    lists = built.report()["lists"].values()
+    raw_tokens = estimate_tokens(json.dumps(wave))
+    built_tokens = estimate_tokens(render_feedback(built.feedback))
+    return {
+        "answers": answers * len(FEEDBACK_KEYS),
+        "non_answers": sum(item["non_answers"] for item in lists),
+        "distinct": sum(item["distinct"] for item in lists),
+        "exact_entries": sum(len(collapsed.entries) for collapsed in exact.lists.values()),
+        "entries": sum(item["entries"] for item in lists),
+        "included": sum(item["included"] for item in lists),
+        "raw_tokens": raw_tokens,
+        "prompt_tokens": built_tokens,
+        "reduction": round(raw_tokens / built_tokens, 1) if built_tokens else None,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, nargs="+", default=[1000, 10000, 100000], help="Answers per feedback list")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed builds per size")
+    parser.add_argument("--budget", type=int, help="Token budget of the answers (default: PROMPT_FEEDBACK_TOKENS)")
+    parser.add_argument("--threshold", type=float, help="Near-duplicate similarity (default: PROMPT_NEAR_DUPLICATE_THRESHOLD)")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    from services.prompt_builder import PROMPT_FEEDBACK_TOKENS, PROMPT_NEAR_DUPLICATE_THRESHOLD
+
+    budget = args.budget or PROMPT_FEEDBACK_TOKENS
+    threshold = args.threshold if args.threshold is not None else PROMPT_NEAR_DUPLICATE_THRESHOLD
+    results = {str(answers): run(answers, args.repeat, budget, threshold) for answers in args.answers}
+
+    print(f"{'answers':>10}{'non-ans':>9}{'distinct':>10}{'exact':>8}{'near':>7}{'sent':>6}"
+          f"{'raw tok':>11}{'prompt tok':>12}{'ratio':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for figures in results.values():
+        print(
+            f"{figures['answers']:>10,}{figures['non_answers']:>9,}{figures['distinct']:>10,}"
+            f"{figures['exact_entries']:>8,}{figures['entries']:>7,}{figures['included']:>6,}"
+            f"{figures['raw_tokens']:>11,}{figures['prompt_tokens']:>12,}{figures['reduction'] or 0:>7}x"
+            f"{figures['p50_ms']:>10.1f}{figures['p99_ms']:>10.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "budget": budget,
+                "threshold": threshold,
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Benchmark of the API's cold import time.
+
+Imports `main` in fresh interpreters, so every run pays the full import cost
+like a server start or a --reload cycle does. Run from the `source` directory:
+
+    python -m benchmarks.startup_bench --repeat 10
+    python -m benchmarks.startup_bench --max-seconds 1.5 --top 15
+
+The exit status is 1 when the p50 import time exceeds --max-seconds, or when
+importing the API loads any of the modules that must stay lazy (the UI, chart,
+PDF, Sheets and Gemini libraries are only needed once a request uses them).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks.pipeline_bench import percentile
+
+# Modules that importing the API must not load
+LAZY_MODULES = [
+    "streamlit",
+    "matplotlib",
+    "fpdf",
+    "gspread",
+    "google.oauth2",
+    "google.generativeai",
+    "google.api_core",
+    "requests",
+    "textblob",
+    "nltk",
+]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    # Credentials are never needed to import the API; make sure a missing key file cannot matter
+    env.setdefault("SHEETS_BACKEND", "stub")
+    env.setdefault("LLM_BACKEND", "stub")
+    return env
+
+
+def measure_once(modules=LAZY_MODULES):
+    """Import `main` in a new interpreter; returns (seconds, lazy modules it loaded)."""
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(modules=list(modules))],
+        capture_output=True, text=True, env=_environment(), check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def slowest_imports(top):
+    """The `top` modules with the largest cumulative import time, from `python -X importtime`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=_environment(), check=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative) / 1e6, name.rstrip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--max-seconds", type=float, help="Fail when the p50 import time is above this")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    timings = []
+    loaded = set()
+    for _ in range(args.repeat):
+        seconds, modules = measure_once()
+        timings.append(seconds)
+        loaded.update(modules)
+
+    p50 = percentile(timings, 50)
+    print(f"import main: p50 {p50 * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms, "
+          f"max {max(timings) * 1000:.0f} ms over {args.repeat} runs")
+    for seconds, name in slowest_imports(args.top) if args.top else []:
+        print(f"{seconds * 1000:>10.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "repeat": args.repeat,
+                "p50_s": round(p50, 4),
+                "timings_s": [round(seconds, 4) for seconds in timings],
+                "lazy_modules_loaded": sorted(loaded),
+            }, f, indent=4)
+
+    status = 0
+    if loaded:
+        print(f"FAIL importing the API loaded modules that should stay lazy: {', '.join(sorted(loaded))}")
+        status = 1
+    if args.max_seconds is not None and p50 > args.max_seconds:
+        print(f"FAIL p50 import time {p50:.2f} s is above the {args.max_seconds:.2f} s budget")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Supervisor that runs the API workers and the Streamlit UI as managed child processes.
+
+    python launcher.py                      # API workers + UI
+    python launcher.py --workers 8 --no-ui  # API only
+    python launcher.py --reload             # single auto-reloading worker for development
+
+The API runs under uvicorn with `--workers N`; uvicorn replaces worker
+processes that die. The UI is started once the API reports ready on /readyz.
+If either child exits, it is restarted with exponential backoff. Ctrl+C or
+SIGTERM stops the UI, then the API, giving each GRACEFUL_TIMEOUT_SECONDS
+before it is killed.
+
+The workers are told how many of them there are through API_WORKERS, so each
+takes an even share of the Sheets and LLM quotas and of the CPUs for
+pre-analysis, and they publish their metrics to a shared METRICS_DIR. Calls
+are coalesced only within a worker; identical calls on different workers are
+deduplicated by the shared caches once the first one has finished.
+
+This module imports nothing from the app, so `python launcher.py` starts the
+supervisor without loading the app. `python main.py` also works, but imports
+the app in the supervisor process before handing over.
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", str(os.cpu_count() or 1)))
+UI_PORT = int(os.getenv("UI_PORT", "8501"))
+# Seconds to wait for /readyz before the UI is started anyway
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "60"))
+# Seconds a child gets to exit after being asked to stop
+GRACEFUL_TIMEOUT_SECONDS = float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "20"))
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+UI_SCRIPT = os.path.join(SOURCE_DIR, "UI", "nps_automator_ui.py")
+
+# A child that stayed up this long is considered healthy again, and its restart delay is reset
+STABLE_SECONDS = 60
+MAX_RESTART_DELAY_SECONDS = 30
+
+_WINDOWS = sys.platform == "win32"
+
+
+def log(message):
+    print(f"[launcher] {message}", flush=True)
+
+
+class ManagedProcess:
+    """A child process that is restarted with exponential backoff whenever it exits."""
+
+    def __init__(self, name, command, env=None):
+        self.name = name
+        self.command = command
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.restart_delay = 1.0
+        self.restart_at = None
+
+    def start(self):
+        # A separate process group lets Windows children receive CTRL_BREAK as a graceful stop signal
+        flags = subprocess.CREATE_NEW_PROCESS_GROUP if _WINDOWS else 0
+        self.process = subprocess.Popen(self.command, cwd=SOURCE_DIR, env=self.env, creationflags=flags)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        log(f"started {self.name} (pid {self.process.pid})")
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def check(self):
+        """Restart the process if it exited and its backoff delay has passed."""
+        if self.process is None or self.running():
+            return
+        now = time.monotonic()
+        if self.restart_at is None:
+            if now - self.started_at >= STABLE_SECONDS:
+                self.restart_delay = 1.0
+            log(f"{self.name} exited with code {self.process.returncode}; restarting in {self.restart_delay:.0f}s")
+            self.restart_at = now + self.restart_delay
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY_SECONDS)
+        elif now >= self.restart_at:
+            self.start()
+
+    def stop(self, timeout=GRACEFUL_TIMEOUT_SECONDS):
+        if not self.running():
+            return
+        log(f"stopping {self.name}")
+        self.process.send_signal(signal.CTRL_BREAK_EVENT if _WINDOWS else signal.SIGTERM)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            log(f"{self.name} did not stop within {timeout:.0f}s; killing it")
+            self.process.kill()
+            self.process.wait()
+
+
+def connect_host(host):
+    """Address to reach a server bound to `host`; wildcard binds are reached over loopback."""
+    if host in ("", "0.0.0.0"):
+        return "127.0.0.1"
+    if host == "::":
+        return "[::1]"
+    return f"[{host}]" if ":" in host else host
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT_SECONDS, should_stop=lambda: False):
+    """Poll `url` until it answers 200, backing off from 0.1s to 2s between attempts."""
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while time.monotonic() < deadline and not should_stop():
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+    return False
+
+
+class Supervisor:
+    def __init__(self, host=API_HOST, port=API_PORT, workers=API_WORKERS, ui_port=UI_PORT, ui=True, reload=False):
+        # The bind address may be a wildcard, which the readiness probe and the UI cannot connect to
+        self.api_url = f"http://{connect_host(host)}:{port}"
+        workers = 1 if reload else max(1, workers)
+        api_command = [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port)]
+        api_command += ["--reload"] if reload else ["--workers", str(workers)]
+
+        # Metrics of this run only; removed on exit unless METRICS_DIR was given
+        self._metrics_dir = None
+        api_env = dict(os.environ)
+        api_env["API_WORKERS"] = str(workers)
+        if not api_env.get("METRICS_DIR"):
+            self._metrics_dir = tempfile.mkdtemp(prefix="nps-metrics-")
+            api_env["METRICS_DIR"] = self._metrics_dir
+        self.api = ManagedProcess("API", api_command, api_env)
+
+        self.ui = None
+        if ui:
+            env = dict(os.environ)
+            # The UI talks to the API started here unless MAIN_URL points elsewhere
+            env.setdefault("MAIN_URL", self.api_url)
+            ui_command = [
+                sys.executable, "-m", "streamlit", "run", UI_SCRIPT,
+                "--server.port", str(ui_port), "--server.headless", "true",
+            ]
+            self.ui = ManagedProcess("UI", ui_command, env)
+        self._stopping = False
+
+    def _request_stop(self, signum, frame):
+        log(f"received signal {signum}; shutting down")
+        self._stopping = True
+
+    def run(self):
+        handled = [signal.SIGINT, signal.SIGTERM] + ([signal.SIGBREAK] if _WINDOWS else [])
+        for signum in handled:
+            signal.signal(signum, self._request_stop)
+
+        self.api.start()
+        try:
+            if wait_until_ready(f"{self.api_url}/readyz", should_stop=lambda: self._stopping):
+                log(f"API ready at {self.api_url}")
+            elif not self._stopping:
+                log(f"API not ready after {READY_TIMEOUT_SECONDS:.0f}s; continuing")
+            if self.ui is not None and not self._stopping:
+                self.ui.start()
+            while not self._stopping:
+                self.api.check()
+                if self.ui is not None:
+                    self.ui.check()
+                time.sleep(0.5)
+        finally:
+            # Stop the UI first so it does not hit a half-stopped API
+            if self.ui is not None:
+                self.ui.stop()
+            self.api.stop()
+            if self._metrics_dir is not None:
+                shutil.rmtree(self._metrics_dir, ignore_errors=True)
+            log("stopped")
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=API_HOST, help="API bind address")
+    parser.add_argument("--port", type=int, default=API_PORT, help="API port")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="API worker processes")
+    parser.add_argument("--ui-port", type=int, default=UI_PORT, help="Streamlit port")
+    parser.add_argument("--no-ui", action="store_true", help="Run the API only")
+    parser.add_argument("--reload", action="store_true", help="Single worker that reloads on code changes")
+    args = parser.parse_args(argv)
+    return Supervisor(args.host, args.port, args.workers, args.ui_port, not args.no_ui, args.reload).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
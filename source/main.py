@@ -1,52 +1,82 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from routers.extract_reviews import review_router
-import os
-import subprocess
+from routers.health import health_router
+from routers.jobs import jobs_router
+from routers.metrics import metrics_router
+from routers.portfolio import portfolio_router
+from routers.precompute import precompute_router
+from routers.reports import reports_router
+from services.llm_client import init_llm_client
+from services.precompute import precompute_scheduler
+from services.telemetry import HTTP_REQUEST_DURATION, metrics_publisher, server_timing, start_trace
+from services.text_analysis import shutdown_pool
 import time
-import requests
 from dotenv import load_dotenv
 
 # Load the .env file
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # /readyz answers 503 until startup has finished and again once shutdown begins
+    app.state.ready = False
+    # Build the LLM client once so every request reuses the configured model
+    app.state.llm_client = init_llm_client()
+    # Keep the spreadsheets listed in scheduled_sheets.json synced and summarised in the background
+    precompute_scheduler.start()
+    # Publish this worker's metrics for whichever worker answers /metrics
+    metrics_publisher.start()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await precompute_scheduler.stop()
+    shutdown_pool()
+    metrics_publisher.stop()
+
+
 app = FastAPI(
     title="Review Extraction API",
     description="An API to extract reviews from Google Sheets and process them.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Encode response bodies with orjson instead of the standard json module
+    default_response_class=ORJSONResponse
 )
 
-# Include the router
+# Include the routers
 app.include_router(review_router)
+app.include_router(jobs_router)
+app.include_router(reports_router)
+app.include_router(precompute_router)
+app.include_router(portfolio_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
 
 
-def start_streamlit():
-    """Start Streamlit UI in a new terminal."""
-    script_path = os.path.abspath("UI/nps_automator_ui.py")  # Adjust path if needed
-    subprocess.Popen(f'start cmd /k streamlit run "{script_path}" --server.port 8501', shell=True)
-
-
-def start_fastapi():
-    """Start FastAPI server in a new terminal."""
-    subprocess.Popen('start cmd /k uvicorn main:app --host 127.0.0.1 --port 8000 --reload', shell=True)
-
-
-def wait_for_fastapi():
-    """Wait until FastAPI is fully running before starting Streamlit."""
-    url = f"{os.getenv('MAIN_URL')}/docs"
-    for _ in range(10):  # Retry for ~10 seconds
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                print("FastAPI is running!")
-                return True
-        except requests.ConnectionError:
-            print("Waiting for FastAPI to start...")
-            time.sleep(1)
-    print("FastAPI failed to start.")
-    return False
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """Collect the stage spans of each request into a `Server-Timing` header and the latency histogram."""
+    started = time.perf_counter()
+    with start_trace() as trace:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        # The route template keeps the label set small, unlike the raw path
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    if trace.spans:
+        response.headers["Server-Timing"] = server_timing(trace)
+    return response
 
 
 if __name__ == "__main__":
-    start_fastapi()
-    if wait_for_fastapi():
-        start_streamlit()
+    # Kept for `python main.py`; `python launcher.py` starts the supervisor without importing the app first
+    import launcher
+
+    raise SystemExit(launcher.main())
@@ -1,14 +1,33 @@
-import sys
+import asyncio
 import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
-from fastapi import APIRouter, Query, HTTPException, status
-from pydantic import BaseModel
-import json
-import pandas as pd
-from auth import gsheet_client
-from .feedback_generator import generate_feedback_from_ai
-from source.UI.nps_automator_ui import analyse_data
-from urllib.parse import urlparse
+from typing import List, Optional
+import orjson
+from fastapi import APIRouter, Header, Query, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from services.review_pipeline import (
+    Config,
+    EXTRACTION_STAGES,
+    WaveExtraction,
+    build_extraction_response,
+    current_etag,
+    etag_headers,
+    etag_matches,
+    live_wave_metrics,
+    parse_spreadsheet_id,
+    run_extraction,
+    wave_rows,
+)
+from services.batch_analysis import run_batch_analysis, wave_trend
+from services.errors import http_exception_for
+from services.jobs import job_store, job_scheduler
+from services.telemetry import current_trace
+
+# Dashboards may poll the live endpoints every few seconds; sync the sheet at most this often
+LIVE_NPS_MAX_AGE_SECONDS = float(os.getenv("LIVE_NPS_MAX_AGE_SECONDS", "15"))
+# Rows encoded per chunk of an NDJSON stream
+NDJSON_CHUNK_ROWS = int(os.getenv("NDJSON_CHUNK_ROWS", "500"))
+
+FIELDS_DESCRIPTION = 'Columns to return (repeat or comma-separate), or "all"; defaults to wave_number and recommendation_score'
 
 # Define the router
 review_router = APIRouter(
@@ -16,104 +35,162 @@ review_router = APIRouter(
     tags=["Extract Reviews"]
 )
 
-class Config(BaseModel):
-    json_file: str = "col_keys.json"
-    json_output_file: str = "../reviews_data.json"
-
 @review_router.get("/", summary="Extract reviews from Google Sheets")
 def extract_reviews(
     spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
     wave_number: str = Query(..., description="Wave Number"),
+    fields: Optional[List[str]] = Query(None, description=FIELDS_DESCRIPTION),
+    offset: int = Query(0, ge=0, description="Index of the first row returned in cleaned_data"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows returned in cleaned_data"),
+    include_timings: bool = Query(False, description="Add the per-stage timing spans of this request"),
+    if_none_match: Optional[str] = Header(None, description="ETag of a response the client already has"),
+    config: Config = Config(),
+):
+    """
+    Extract reviews from Google Sheets, process them and summarise the feedback.
+
+    The response carries an ETag covering the sheet revision, wave and config. Send it back in
+    `If-None-Match` to get an empty 304 while the sheet is unchanged, without rerunning the pipeline.
+    """
+    try:
+        if if_none_match:
+            etag = current_etag(spreadsheet_url, wave_number, config, fields, offset, limit)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+
+        response = run_extraction(spreadsheet_url, wave_number, config, fields, offset, limit)
+        trace = current_trace()
+        if include_timings and trace is not None:
+            response["timings"] = trace.to_list()
+        return ORJSONResponse(response, headers=etag_headers(response["etag"]))
+
+    except Exception as e:
+        raise http_exception_for(e)
+
+
+@review_router.get("/etag", summary="Revalidate an extraction result without running the pipeline")
+def extraction_etag(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    wave_number: str = Query(..., description="Wave Number"),
+    fields: Optional[List[str]] = Query(None, description=FIELDS_DESCRIPTION),
+    offset: int = Query(0, ge=0, description="Index of the first row returned in cleaned_data"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows returned in cleaned_data"),
+    if_none_match: Optional[str] = Header(None, description="ETag of a response the client already has"),
+    config: Config = Config(),
+):
+    """
+    Answer 304 while `If-None-Match` still matches the result `GET /extract-reviews/` would give, and
+    otherwise 200 with the current ETag. Only the sheet revision is checked; nothing is extracted or summarised.
+    """
+    try:
+        etag = current_etag(spreadsheet_url, wave_number, config, fields, offset, limit)
+    except Exception as e:
+        raise http_exception_for(e)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return ORJSONResponse({"etag": etag}, headers=etag_headers(etag))
+
+
+@review_router.get("/batch", summary="Analyse several waves of one spreadsheet")
+def extract_reviews_batch(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    waves: List[str] = Query(..., description='Wave labels such as "Wave 3" (repeat the parameter), or "all"'),
     config: Config = Config(),
 ):
     """
-    Extract reviews from Google Sheets, process them, and save results in JSON format.
+    Read the sheet once, compute NPS for every requested wave and summarise the waves concurrently.
+    """
+    try:
+        return run_batch_analysis(spreadsheet_url, waves, config)
+
+    except Exception as e:
+        raise http_exception_for(e)
+
+
+@review_router.get("/nps/live", summary="Live NPS of one wave from the incremental aggregates")
+def live_nps(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    wave_number: str = Query(..., description="Wave Number"),
+):
+    """
+    Serve NPS metrics from the stored per-wave score histograms, syncing new rows first.
+    """
+    try:
+        return live_wave_metrics(spreadsheet_url, wave_number, max_age=LIVE_NPS_MAX_AGE_SECONDS)
+
+    except Exception as e:
+        raise http_exception_for(e)
+
+
+@review_router.get("/nps/trend", summary="NPS of every wave from the incremental aggregates")
+def nps_trend(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+):
+    """
+    Serve the cross-wave NPS trend from the stored per-wave score histograms.
     """
     try:
-        # Extract the spreadsheet ID from the URL
-        parsed_url = urlparse(spreadsheet_url)
-        path_segments = parsed_url.path.split("/")
-
-        # Ensure the path is valid
-        if len(path_segments) > 2 and path_segments[2] == "d":
-            spreadsheet_id = path_segments[3]
-        else:
-            raise HTTPException(status_code=400, detail="Invalid Google Sheets URL. Spreadsheet ID not found.")
-
-        if not spreadsheet_id:
-            raise HTTPException(status_code=400, detail="Invalid Google Sheets URL. Spreadsheet ID not found.")
-
-        # Open the spreadsheet
-        sheet = gsheet_client.open_by_key(spreadsheet_id).sheet1
-
-        # Load JSON keys
-        if not os.path.exists(config.json_file):
-            raise HTTPException(status_code=404, detail="Column keys JSON file not found.")
-
-        with open(config.json_file, "r") as f:
-            json_data = json.load(f)
-
-        # Read data from the spreadsheet
-        data = sheet.get_all_records()
-
-        # Convert to a Pandas DataFrame
-        df = pd.DataFrame(data)
-
-        # Check if the "Wave Survey" column exists in the DataFrame
-        if 'Wave Survey?' not in df.columns:
-            raise HTTPException(status_code=400, detail="Wave Survey? column not found in the spreadsheet.")
-
-        # Filter the DataFrame based on the wave_number parameter
-        filtered_df = df[df['Wave Survey?'] == wave_number]
-
-        # If no data for the given wave_number
-        if filtered_df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for Wave Number: {wave_number}")
-
-        # Validate keys in the DataFrame
-        keys = json_data.keys() if isinstance(json_data, dict) else []
-        if not all(key in filtered_df.columns for key in keys):
-            raise HTTPException(status_code=400, detail="Some keys in the JSON file do not match the DataFrame columns.")
-
-        # Filter the data based on the keys in the JSON config
-        filtered_df = filtered_df[keys]
-
-        # Rename the columns according to the JSON file
-        renamed_df = filtered_df.rename(columns=dict(json_data))
-
-        # Replace empty strings with NaN
-        renamed_df.replace("", pd.NA, inplace=True)
-
-        # Drop rows with NaN values or empty strings in the selected columns
-        cleaned_df = renamed_df.dropna(subset=json_data.values())
-
-        # Create a structured JSON object
-        structured_json = {
-            "engineer_feedback": cleaned_df["engineer_feedback"].tolist() if "engineer_feedback" in cleaned_df.columns else [],
-            "program_likings": cleaned_df["program_likings"].tolist() if "program_likings" in cleaned_df.columns else [],
-            "topics_learned": cleaned_df["topics_learned"].tolist() if "topics_learned" in cleaned_df.columns else [],
-            "program_improvements": cleaned_df["program_improvements"].tolist() if "program_improvements" in cleaned_df.columns else [],
-            "engineer_improvements": cleaned_df["engineer_improvements"].tolist() if "engineer_improvements" in cleaned_df.columns else []
-        }
-
-        # Write the structured JSON object to a file
-        with open(config.json_output_file, "w") as json_file:
-            json.dump(structured_json, json_file, indent=4)
-
-        # Generate feedback using AI
-        ai_rep = generate_feedback_from_ai()
-
-        return {
-            "message": "Reviews successfully extracted and saved.",
-            "payload": {
-                "json_file_name": config.json_output_file,
-                "feedback_generated": ai_rep
-            },
-            "cleaned_data": renamed_df.to_dict(orient="records"),
-            "sheet_title":sheet.title,
-            "wave_number":renamed_df['wave_number'].iloc[0],
-            "status": status.HTTP_200_OK
-        }
+        return wave_trend(spreadsheet_url, max_age=LIVE_NPS_MAX_AGE_SECONDS)
+
+    except Exception as e:
+        raise http_exception_for(e)
+
 
+@review_router.get("/rows", summary="Raw rows of one wave, projected and paginated")
+def extract_rows(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    wave_number: str = Query(..., description="Wave Number"),
+    fields: Optional[List[str]] = Query(None, description=FIELDS_DESCRIPTION),
+    offset: int = Query(0, ge=0, description="Index of the first row returned"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows returned"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description='"json", or "ndjson" to stream one row per line'),
+):
+    """
+    Serve the cleaned rows of a wave without summarising them. The free-text answers are only
+    included when requested through `fields`.
+    """
+    try:
+        rows, page = wave_rows(spreadsheet_url, wave_number, fields, offset, limit, max_age=LIVE_NPS_MAX_AGE_SECONDS)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_exception_for(e)
+
+    if format == "ndjson":
+        def stream():
+            for start in range(0, len(rows), NDJSON_CHUNK_ROWS):
+                chunk = rows.iloc[start:start + NDJSON_CHUNK_ROWS].to_dict(orient="records")
+                yield b"".join(orjson.dumps(row) + b"\n" for row in chunk)
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Total-Count": str(page["total"])})
+    return ORJSONResponse({**page, "rows": rows.to_dict(orient="records")})
+
+
+@review_router.post("/jobs", summary="Queue a review extraction job", status_code=status.HTTP_202_ACCEPTED)
+async def create_extraction_job(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    wave_number: str = Query(..., description="Wave Number"),
+    fields: Optional[List[str]] = Query(None, description=FIELDS_DESCRIPTION),
+    offset: int = Query(0, ge=0, description="Index of the first row returned in cleaned_data"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows returned in cleaned_data"),
+    config: Config = Config(),
+):
+    """
+    Queue the extraction and return immediately; poll `GET /jobs/{job_id}` for the result.
+    """
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+    job = await asyncio.to_thread(job_store.create, {"spreadsheet_url": spreadsheet_url, "wave_number": wave_number})
+    # The job ID doubles as the run ID, so a saved artifact can be traced back to its job
+    extraction = WaveExtraction(
+        spreadsheet_id=spreadsheet_id,
+        wave_number=wave_number,
+        config=config,
+        run_id=job.id,
+        row_fields=fields,
+        row_offset=offset,
+        row_limit=limit,
+    )
+    job_scheduler.submit(job, extraction, EXTRACTION_STAGES, build_extraction_response)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+    }
@@ -1,11 +1,31 @@
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from services import prompt_builder, text_analysis
+from services.coalescing import SingleFlight
+from services.llm_cache import feedback_cache_key, llm_cache
+from services.llm_client import estimate_tokens, get_llm_client
+from services.telemetry import PAYLOAD_BYTES, record_cache, span
 
 load_dotenv()
 
+# Token budget of the feedback data inside one chunk prompt
+CHUNK_TOKEN_BUDGET = int(os.getenv("FEEDBACK_CHUNK_TOKENS", str(prompt_builder.PROMPT_FEEDBACK_TOKENS)))
+# Payloads estimated above this many tokens are summarised in chunks (map-reduce)
+CHUNK_THRESHOLD_TOKENS = int(os.getenv("FEEDBACK_CHUNK_THRESHOLD_TOKENS", str(prompt_builder.PROMPT_FEEDBACK_TOKENS)))
+# Feedback that does not fit one prompt keeps up to this many chunks of answers instead of being cut to one prompt
+CHUNK_MAX_CHUNKS = int(os.getenv("FEEDBACK_MAX_CHUNKS", "8"))
+# Maximum number of chunk summaries requested at the same time
+CHUNK_CONCURRENCY = int(os.getenv("FEEDBACK_CHUNK_CONCURRENCY", "4"))
+
+# Identical summaries requested at the same time share one LLM call
+feedback_flights = SingleFlight("llm_summary")
+
 # Define the prompt template
 feedback_gen_prompt = """
 Using the JSON structure provided below, analyze the feedback from engineers to identify key insights:
@@ -23,6 +43,7 @@ JSON Structure:
   "program_improvements": [Array of suggested improvements],
   "engineer_improvements": [Array of areas needing better understanding]
 }
+Answers given by several engineers are listed once with their count, e.g. "more practice [x12]".
 
 Feedback Data:
 {feedback_data}
@@ -47,10 +68,27 @@ TOP 5 NEGATIVE ASPECTS:
 the above output should be in json format with structure {"positive_aspects":[],"improvements_needed":[]}
 """
 
-# Function to read feedback from a JSON file
-def read_feedback_from_json(file_path):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+# Prompt used to merge the partial summaries of a chunked wave
+feedback_reduce_prompt = """
+The feedback of one training wave was too large to analyze at once, so it was split into chunks.
+Below are the partial analyses of every chunk, each in the format {"positive_aspects":[],"improvements_needed":[]}.
+
+Merge them into a single analysis of the whole wave:
+1. Combine aspects that describe the same theme, favouring themes that appear in many chunks.
+2. Keep the most representative example quote for each aspect.
+3. Keep the Top 5 positive aspects and the Top 5 negative aspects.
+Explanation should be precise and not more than 1 sentence
+
+Partial Analyses:
+{partial_analyses}
+
+the above output should be in json format with structure {"positive_aspects":[],"improvements_needed":[]}
+"""
+
+def settings_key(threshold=CHUNK_THRESHOLD_TOKENS, token_budget=CHUNK_TOKEN_BUDGET, max_chunks=CHUNK_MAX_CHUNKS):
+    """Part of the LLM cache key, so changing the chunking settings does not reuse old summaries."""
+    return f"chunks:{threshold}:{token_budget}:{max_chunks}"
+
 
 def extract_data_between_braces(json_string):
     """
@@ -75,16 +113,210 @@ def extract_data_between_braces(json_string):
         raise ValueError(f"Error parsing JSON: {e}")
 
 
-def generate_feedback_from_ai():
-    json_file_path = '../reviews_data.json'
-    # Read the entire feedback data from the JSON file
-    feedback_data = read_feedback_from_json(json_file_path)
-    # print(feedback_data)
-    # Prepare the full prompt by inserting feedback data into the template using f-string
-    full_prompt = f"{feedback_gen_prompt}\nFeedback Data: {json.dumps(feedback_data)}"
-    # print("os.getenv('GEMINI_KEY')",os.getenv('GEMINI_KEY'))
-    genai.configure(api_key=os.getenv('GEMINI_KEY'))
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(full_prompt).text
-    return extract_data_between_braces(response) # Return the response
+def _item_tokens(item):
+    # Counted the way the prompt builder counts its budget, so a payload it built never exceeds a matching threshold
+    return estimate_tokens(json.dumps(item, ensure_ascii=False))
+
+
+def payload_tokens(feedback_data):
+    """Estimated tokens of the feedback entries, summed per entry."""
+    return sum(_item_tokens(item) for items in feedback_data.values() for item in items)
+
+
+def split_feedback_into_chunks(feedback_data, token_budget=CHUNK_TOKEN_BUDGET):
+    """
+    Split the feedback lists into chunks whose JSON stays within `token_budget`.
+
+    Comments are taken round-robin across the lists, so every chunk keeps a
+    mix of likings, improvements and topics instead of a single category.
+
+    Args:
+        feedback_data (dict): Structured feedback, one list per category.
+        token_budget (int): Estimated token budget of each chunk's payload.
+
+    Returns:
+        list: Chunks with the same keys as `feedback_data`.
+    """
+    keys = list(feedback_data)
+    chunks = []
+    chunk = {key: [] for key in keys}
+    chunk_tokens = 0
+    for row in zip_longest(*(feedback_data[key] for key in keys)):
+        for key, item in zip(keys, row):
+            if item is None:
+                continue
+            item_tokens = _item_tokens(item)
+            if chunk_tokens and chunk_tokens + item_tokens > token_budget:
+                chunks.append(chunk)
+                chunk = {key: [] for key in keys}
+                chunk_tokens = 0
+            chunk[key].append(item)
+            chunk_tokens += item_tokens
+    if chunk_tokens or not chunks:
+        chunks.append(chunk)
+    return chunks
+
+
+class UsageTracker:
+    """Adds up latency and token usage of the LLM calls behind one summary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.latency_ms = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, response):
+        with self._lock:
+            self.calls += 1
+            self.latency_ms += response.latency_ms
+            self.prompt_tokens += response.prompt_tokens
+            self.output_tokens += response.output_tokens
+
+    def to_dict(self):
+        return {
+            "llm_calls": self.calls,
+            "llm_latency_ms": round(self.latency_ms, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+def summarize_chunk(client, feedback_data, usage=None, statistics=None):
+    full_prompt = f"{feedback_gen_prompt}\nFeedback Data: {prompt_builder.render_feedback(feedback_data)}"
+    if statistics:
+        full_prompt += f"\nAnswer Statistics (all answers, before sampling): {json.dumps(statistics)}"
+    response = client.generate(full_prompt)
+    if usage is not None:
+        usage.add(response)
+    return extract_data_between_braces(response.text)
+
+
+def reduce_summaries(client, partial_summaries, usage=None):
+    full_prompt = feedback_reduce_prompt.replace("{partial_analyses}", json.dumps(partial_summaries))
+    response = client.generate(full_prompt)
+    if usage is not None:
+        usage.add(response)
+    return extract_data_between_braces(response.text)
+
+
+def summarize_feedback(
+    feedback_data,
+    client,
+    chunk_threshold=CHUNK_THRESHOLD_TOKENS,
+    token_budget=CHUNK_TOKEN_BUDGET,
+    max_concurrency=CHUNK_CONCURRENCY,
+    statistics=None,
+):
+    """
+    Summarise the feedback with one prompt, or map-reduce it when it is large.
+
+    Args:
+        feedback_data (dict): Structured feedback, one list per category.
+        client (LLMClient): Backend from `services.llm_client`, or any object
+            whose `generate(prompt)` returns a response with `.text`,
+            `.latency_ms`, `.prompt_tokens` and `.output_tokens`.
+        chunk_threshold (int): Estimated payload tokens above which the
+            chunked mode is used.
+        token_budget (int): Estimated token budget of each chunk's payload.
+        max_concurrency (int): Maximum number of concurrent chunk requests.
+        statistics (dict): Sentiment and theme counts of every answer, sent
+            along when `feedback_data` is a sample.
+
+    Returns:
+        tuple: (feedback dict, info dict with the mode, chunk count and usage).
+    """
+    usage = UsageTracker()
+    if payload_tokens(feedback_data) <= chunk_threshold:
+        feedback = summarize_chunk(client, feedback_data, usage, statistics)
+        return feedback, {"mode": "single", "chunks": 1, **usage.to_dict()}
+
+    chunks = split_feedback_into_chunks(feedback_data, token_budget)
+    if len(chunks) == 1:
+        feedback = summarize_chunk(client, chunks[0], usage, statistics)
+        return feedback, {"mode": "single", "chunks": 1, **usage.to_dict()}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        partial_summaries = list(executor.map(lambda chunk: summarize_chunk(client, chunk, usage, statistics), chunks))
+    feedback = reduce_summaries(client, partial_summaries, usage)
+    return feedback, {"mode": "chunked", "chunks": len(chunks), **usage.to_dict()}
+
+
+def build_prompt(feedback_data, selected=None):
+    """
+    Prompt-ready feedback: one prompt's budget, or several chunks' worth when it does not fit.
+
+    Answers that would not fit PROMPT_FEEDBACK_TOKENS are kept, up to
+    CHUNK_MAX_CHUNKS chunks, so `summarize_feedback` map-reduces them instead
+    of the prompt builder dropping them.
+    """
+    return prompt_builder.build_prompt_feedback(
+        feedback_data, selected=selected, overflow_budget=CHUNK_TOKEN_BUDGET * CHUNK_MAX_CHUNKS,
+    )
+
+
+def generate_feedback_from_ai(feedback_data, client=None):
+    """
+    Summarise the structured feedback, serving repeated payloads from the LLM cache.
+
+    Args:
+        feedback_data (dict): Structured feedback, one list per category.
+        client (LLMClient): Backend to use; the process-wide client by default.
+
+    Returns:
+        tuple: (feedback dict, metadata dict with the cache result, summary mode and usage).
+    """
+    client = client or get_llm_client()
+
+    started = time.perf_counter()
+    with span("llm_cache_lookup"):
+        cache_key = feedback_cache_key(
+            feedback_data,
+            feedback_gen_prompt + text_analysis.settings_key() + prompt_builder.settings_key() + settings_key(),
+            client.model_name,
+        )
+        cached, age_seconds = llm_cache.get(cache_key)
+    record_cache("llm", cached is not None)
+    if cached is not None:
+        return cached, {
+            "cache": {"hit": True, "key": cache_key, "age_seconds": round(age_seconds, 3)},
+            "mode": "cached",
+            "chunks": 0,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def generate():
+        # Large waves are cut down locally to a representative sample plus sentiment and theme counts
+        with span("text_analysis") as attributes:
+            analysis = text_analysis.analyze_feedback(feedback_data)
+            report = analysis.report()
+            attributes.update(comments=report["comments"], kept=report["kept"])
+
+        # Non-answers are dropped and repeated answers collapse into counted entries within the token budget
+        with span("prompt_build") as attributes:
+            prompt_feedback = build_prompt(feedback_data, selected=analysis.feedback if analysis.applied else None)
+            attributes["tokens"] = prompt_feedback.tokens
+
+        payload_bytes = len(prompt_builder.render_feedback(prompt_feedback.feedback).encode("utf-8"))
+        PAYLOAD_BYTES.observe(payload_bytes, kind="llm_payload")
+        with span("llm_generate", payload_bytes=payload_bytes) as attributes:
+            feedback, summary_info = summarize_feedback(
+                prompt_feedback.feedback, client, statistics=analysis.statistics() if analysis.applied else None,
+            )
+            attributes.update(
+                mode=summary_info["mode"],
+                chunks=summary_info["chunks"],
+                prompt_tokens=summary_info["prompt_tokens"],
+                output_tokens=summary_info["output_tokens"],
+            )
+        llm_cache.put(cache_key, client.model_name, feedback)
+        return feedback, {**summary_info, "preanalysis": report, "prompt": prompt_feedback.report()}
 
+    (feedback, summary_info), shared = feedback_flights.do(cache_key, generate)
+    return feedback, {
+        "cache": {"hit": False, "key": cache_key, "age_seconds": 0.0},
+        **summary_info,
+        "coalesced": shared,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
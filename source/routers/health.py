@@ -0,0 +1,47 @@
+import os
+from contextlib import closing
+
+from fastapi import APIRouter, Request
+from fastapi.responses import ORJSONResponse
+from services.jobs import job_store
+from services.llm_cache import llm_cache
+from services.reports import report_store
+from services.response_store import response_store
+
+# Define the router
+health_router = APIRouter(tags=["Monitoring"])
+
+# Stores shared by the API workers; a worker that cannot open them is not ready
+SHARED_STORES = {
+    "job_store": job_store,
+    "report_store": report_store,
+    "response_store": response_store,
+    "llm_cache": llm_cache,
+}
+
+
+@health_router.get("/healthz", summary="Liveness probe")
+def healthz():
+    """The process is up and serving requests."""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@health_router.get("/readyz", summary="Readiness probe")
+def readyz(request: Request):
+    """
+    200 once startup has finished and the shared stores can be opened; 503 otherwise,
+    including while the worker is shutting down.
+    """
+    checks = {"startup": bool(getattr(request.app.state, "ready", False))}
+    for name, store in SHARED_STORES.items():
+        try:
+            with closing(store.connect()) as conn:
+                conn.execute("SELECT 1")
+            checks[name] = True
+        except Exception:
+            checks[name] = False
+    ready = all(checks.values())
+    return ORJSONResponse(
+        {"status": "ready" if ready else "not ready", "checks": checks, "pid": os.getpid()},
+        status_code=200 if ready else 503,
+    )
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, HTTPException
+from services.jobs import job_store
+
+# Define the router
+jobs_router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"]
+)
+
+@jobs_router.get("/{job_id}", summary="Poll the status and result of a job")
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job.to_dict()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.telemetry import metrics_publisher
+
+# Define the router
+metrics_router = APIRouter(tags=["Monitoring"])
+
+@metrics_router.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Stage timings, sheet rows, payload sizes, LLM latency and tokens, and cache hit counts
+    in the Prometheus text format, added up across the API workers.
+    """
+    return PlainTextResponse(metrics_publisher.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from services.errors import http_exception_for
+from services.portfolio import PortfolioRequest, run_portfolio_analysis
+
+# Define the router
+portfolio_router = APIRouter(
+    prefix="/portfolio",
+    tags=["Portfolio"]
+)
+
+
+@portfolio_router.post("/", summary="NPS and feedback summaries across many cohort spreadsheets")
+def analyze_portfolio(request: PortfolioRequest):
+    """
+    Sync every listed spreadsheet (or named worksheet) concurrently, and return per-cohort and
+    rolled-up NPS with combined summaries. A sheet that fails is reported in its own entry.
+    """
+    try:
+        return run_portfolio_analysis(
+            request.sheets,
+            request.waves,
+            request.config,
+            summarize=request.summarize,
+            summarize_cohorts=request.summarize_cohorts,
+        )
+
+    except Exception as e:
+        raise http_exception_for(e)
@@ -0,0 +1,34 @@
+from typing import Optional
+from fastapi import APIRouter, Header, Query, HTTPException, Response, status
+from fastapi.responses import ORJSONResponse
+from services.precompute import precompute_scheduler
+from services.review_pipeline import etag_headers, etag_matches, parse_spreadsheet_id
+
+# Define the router
+precompute_router = APIRouter(
+    prefix="/precompute",
+    tags=["Precompute"]
+)
+
+@precompute_router.get("/status", summary="Status of the background precompute scheduler")
+def precompute_status():
+    return precompute_scheduler.status()
+
+
+@precompute_router.get("/results", summary="Precomputed extraction result of one wave")
+def precomputed_result(
+    spreadsheet_url: str = Query(..., description="URL of the Google Spreadsheet to process"),
+    wave_number: str = Query(..., description="Wave Number"),
+    if_none_match: Optional[str] = Header(None, description="ETag of a response the client already has"),
+):
+    """
+    Serve the result computed by the scheduler; 404 if the wave is not registered or not computed yet.
+    Answers 304 when `If-None-Match` already holds the result's ETag.
+    """
+    result = precompute_scheduler.get_result(parse_spreadsheet_id(spreadsheet_url), wave_number)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No precomputed result for Wave Number: {wave_number}")
+    etag = result.get("etag")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag))
+    return ORJSONResponse(result, headers=etag_headers(etag))
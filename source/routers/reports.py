@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Response
+from services.reports import REPORT_BUILDERS, report_store
+
+# Define the router
+reports_router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"]
+)
+
+@reports_router.get("/{report_id}/{kind}.pdf", summary="Download a feedback or results report as PDF")
+def download_report(report_id: str, kind: str):
+    """
+    Build the PDF on first download and serve it from the report cache afterwards.
+    """
+    if kind not in REPORT_BUILDERS:
+        raise HTTPException(status_code=404, detail=f"Unknown report type {kind!r}; expected one of {sorted(REPORT_BUILDERS)}.")
+    report = report_store.render(report_id, kind)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found; run the extraction again.")
+    pdf, file_name = report
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+    )
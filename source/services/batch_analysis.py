@@ -0,0 +1,128 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from routers.feedback_generator import generate_feedback_from_ai
+from services.review_pipeline import (
+    Config,
+    build_structured_feedback,
+    header_for,
+    load_column_keys,
+    parse_spreadsheet_id,
+    rename_configured_columns,
+    sync_sheet,
+)
+from services.nps_aggregates import nps_aggregates
+from services.nps_metrics import compute_nps_metrics
+from services.reports import report_store
+
+# Maximum number of wave summaries requested from the LLM at the same time
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+
+def wave_sort_key(wave):
+    """Natural sort key, so "Wave 10" comes after "Wave 9"."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", str(wave))]
+
+
+def _summarize(structured_json):
+    feedback, generation_info = generate_feedback_from_ai(structured_json)
+    return {"feedback_generated": feedback, "generation": generation_info}
+
+
+def run_batch_analysis(spreadsheet_url, waves, config=None, max_concurrency=BATCH_LLM_CONCURRENCY):
+    """
+    Analyse several waves of one spreadsheet with a single sheet read.
+
+    Args:
+        spreadsheet_url (str): URL of the Google Spreadsheet.
+        waves (list): Wave labels (e.g. "Wave 3"), or ["all"] for every wave.
+        config (Config): Extraction settings.
+        max_concurrency (int): Maximum number of concurrent LLM summaries.
+
+    Returns:
+        dict: Per-wave results and a cross-wave comparison table.
+    """
+    config = config or Config()
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+    json_data = load_column_keys(config.json_file)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+    wave_header = header_for(json_data, "wave_number")
+    if wave_header not in snapshot.columns:
+        raise HTTPException(status_code=400, detail=f"{wave_header} column not found in the spreadsheet.")
+
+    renamed_df = rename_configured_columns(snapshot.to_frame(), json_data)
+    renamed_df = renamed_df.dropna(subset=["wave_number"])
+    # Wave labels as the aggregates store them, so both are looked up with the same keys
+    renamed_df = renamed_df.assign(wave_number=renamed_df["wave_number"].astype(str))
+    renamed_df = renamed_df[renamed_df["wave_number"] != ""]
+    groups = dict(tuple(renamed_df.groupby("wave_number", sort=False)))
+
+    if [wave.lower() for wave in waves] == ["all"]:
+        selected = sorted(groups, key=wave_sort_key)
+    else:
+        selected = list(dict.fromkeys(waves))
+    missing = [wave for wave in selected if wave not in groups]
+    selected = [wave for wave in selected if wave in groups]
+    if not selected:
+        raise HTTPException(status_code=404, detail=f"No data found for Wave Numbers: {', '.join(missing)}")
+
+    aggregates = nps_aggregates.get_sheet(snapshot.key)
+    # A wave the shared aggregates do not hold yet is computed from this snapshot instead
+    metrics = {
+        wave: aggregates[wave]["metrics"] if wave in aggregates else compute_nps_metrics(groups[wave])
+        for wave in selected
+    }
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        summaries = dict(zip(selected, executor.map(
+            lambda wave: _summarize(build_structured_feedback(groups[wave], json_data)),
+            selected,
+        )))
+
+    return {
+        "message": f"Analysed {len(selected)} waves.",
+        "sheet_title": snapshot.title,
+        "waves": {
+            wave: {
+                **summaries[wave],
+                "metrics": metrics[wave],
+                "report_id": report_store.register(
+                    summaries[wave]["feedback_generated"], metrics[wave], snapshot.title, wave
+                ),
+            }
+            for wave in selected
+        },
+        "comparison": [
+            {"wave_number": wave, **{k: v for k, v in metrics[wave].items() if k != "histogram"}}
+            for wave in selected
+        ],
+        "missing_waves": missing,
+        "status": status.HTTP_200_OK
+    }
+
+
+def wave_trend(spreadsheet_url, max_age=None, config=None):
+    """
+    NPS metrics of every wave, straight from the incremental aggregates.
+
+    Args:
+        spreadsheet_url (str): URL of the Google Spreadsheet.
+        max_age (float): Skip the sheet sync if it ran less than this many seconds ago.
+        config (Config): Extraction settings.
+
+    Returns:
+        dict: Waves in natural order with their metrics.
+    """
+    config = config or Config()
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+    snapshot = sync_sheet(spreadsheet_id, load_column_keys(config.json_file), max_age=max_age)
+    aggregates = nps_aggregates.get_sheet(snapshot.key)
+    return {
+        "sheet_title": snapshot.title,
+        "synced_at": snapshot.synced_at,
+        "waves": [aggregates[wave] for wave in sorted(aggregates, key=wave_sort_key)],
+    }
@@ -0,0 +1,240 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.telemetry import record_cache, span
+
+# On-disk copies of rendered charts, named by content hash
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "charts")
+# Number of rendered PNGs kept in memory and on disk
+CHART_CACHE_MAX_ITEMS = int(os.getenv("CHART_CACHE_MAX_ITEMS", "128"))
+CHART_CACHE_MAX_FILES = int(os.getenv("CHART_CACHE_MAX_FILES", "2000"))
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "4"))
+
+SCORE_DISTRIBUTION = "score_distribution"
+BELOW_7 = "below_7"
+NPS_CATEGORIES_BAR = "nps_categories_bar"
+NPS_CATEGORIES_PIE = "nps_categories_pie"
+
+
+def _categories(histogram):
+    promoters = sum(histogram[9:])
+    passives = sum(histogram[7:9])
+    detractors = sum(histogram[:7])
+    return promoters, passives, detractors
+
+
+def _new_figure(figsize):
+    # Explicit Figure objects on the Agg canvas: no pyplot global state, safe in worker threads
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _to_png(figure):
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def _render_no_responses(figsize, title):
+    """Placeholder for charts of shares, which are undefined when nobody answered."""
+    figure = _new_figure(figsize)
+    ax = figure.subplots()
+    ax.text(0.5, 0.5, 'No responses', ha='center', va='center', fontsize=14, color='grey')
+    ax.set_axis_off()
+    ax.set_title(title, fontsize=16)
+    return _to_png(figure)
+
+
+def _render_score_distribution(histogram, wave_number):
+    figure = _new_figure((8, 4))
+    ax = figure.subplots()
+    ax.bar(range(len(histogram)), histogram, width=1.0, color='skyblue', edgecolor='black', alpha=0.7)
+    ax.set_title(f'Feedback Score Distribution for Wave {wave_number}', fontsize=16)
+    ax.set_xlabel('Scores (0 to 10)', fontsize=14)
+    ax.set_ylabel('Frequency', fontsize=14)
+    ax.set_xticks(range(0, 11))
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    return _to_png(figure)
+
+
+def _render_below_7(histogram, wave_number):
+    if not sum(histogram):
+        return _render_no_responses((6, 4), 'Percentage of Respondents with Scores Below 7')
+    below_7 = sum(histogram[:7])
+    figure = _new_figure((6, 4))
+    ax = figure.subplots()
+    ax.pie(
+        [below_7, sum(histogram) - below_7],
+        explode=(0.1, 0),
+        labels=['Below 7', '7 and Above'],
+        colors=['red', 'green'],
+        autopct='%1.1f%%',
+        startangle=100,
+    )
+    ax.set_title('Percentage of Respondents with Scores Below 7', fontsize=16)
+    return _to_png(figure)
+
+
+def _render_nps_categories_bar(histogram, wave_number):
+    total = sum(histogram)
+    if not total:
+        return _render_no_responses((6, 4), 'Distribution of NPS Categories')
+    percentages = [count / total * 100 for count in _categories(histogram)]
+    figure = _new_figure((6, 4))
+    ax = figure.subplots()
+    ax.bar(['Promoters', 'Passives', 'Detractors'], percentages, color=['green', 'yellow', 'red'])
+    ax.set_xlabel('Categories')
+    ax.set_ylabel('Percentage (%)')
+    ax.set_title('Distribution of NPS Categories')
+    return _to_png(figure)
+
+
+def _render_nps_categories_pie(histogram, wave_number):
+    if not sum(histogram):
+        return _render_no_responses((4, 2), 'Proportion of NPS Categories')
+    figure = _new_figure((4, 2))
+    ax = figure.subplots()
+    wedges, texts, autotexts = ax.pie(
+        _categories(histogram),
+        explode=(0, 0, 0),
+        labels=['Promoters', 'Passives', 'Detractors'],
+        colors=['green', 'yellow', 'red'],
+        autopct='%1.1f%%',
+        startangle=80,
+    )
+    # Set font size for the labels and the percentages
+    for text in texts:
+        text.set_fontsize(6)
+    for autotext in autotexts:
+        autotext.set_fontsize(4)
+    ax.set_title('Proportion of NPS Categories')
+    return _to_png(figure)
+
+
+RENDERERS = {
+    SCORE_DISTRIBUTION: _render_score_distribution,
+    BELOW_7: _render_below_7,
+    NPS_CATEGORIES_BAR: _render_nps_categories_bar,
+    NPS_CATEGORIES_PIE: _render_nps_categories_pie,
+}
+
+
+def chart_key(name, histogram, wave_number):
+    """Content hash identifying one rendered chart."""
+    payload = json.dumps([name, [int(count) for count in histogram], str(wave_number)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChartCache:
+    """Bounded in-memory LRU of chart PNGs, backed by content-addressed files on disk."""
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_items=CHART_CACHE_MAX_ITEMS, max_files=CHART_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_files = max_files
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        try:
+            with open(self.path(key), "rb") as f:
+                png = f.read()
+        except OSError:
+            return None
+        self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{self.path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, self.path(key))
+        self._remember(key, png)
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop the least recently written files once the directory exceeds max_files."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".png")]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+chart_cache = ChartCache()
+_executor = ThreadPoolExecutor(max_workers=CHART_RENDER_WORKERS, thread_name_prefix="chart-render")
+
+
+def render_charts(histogram, wave_number, names=None):
+    """
+    PNG bytes of the NPS charts for a score histogram, rendering only cache misses.
+
+    Args:
+        histogram (list): Eleven score counts, index = score.
+        wave_number (str): Wave label shown in the chart titles.
+        names (list): Charts to return; all of RENDERERS by default.
+
+    Returns:
+        dict: Chart name -> PNG bytes.
+    """
+    names = list(names or RENDERERS)
+    histogram = [int(count) for count in histogram]
+    keys = {name: chart_key(name, histogram, wave_number) for name in names}
+
+    charts = {}
+    pending = {}
+    for name, key in keys.items():
+        png = chart_cache.get(key)
+        record_cache("chart", png is not None)
+        if png is None:
+            pending[name] = _executor.submit(RENDERERS[name], histogram, wave_number)
+        else:
+            charts[name] = png
+    with span("chart_render", charts=len(pending)):
+        for name, future in pending.items():
+            charts[name] = future.result()
+            chart_cache.put(keys[name], charts[name])
+    return {name: charts[name] for name in names}
+
+
+def chart_paths(histogram, wave_number, names=None):
+    """Paths of the content-addressed PNG files, rendering any that are missing."""
+    paths = {}
+    for name, png in render_charts(histogram, wave_number, names).items():
+        key = chart_key(name, histogram, wave_number)
+        if not os.path.exists(chart_cache.path(key)):
+            chart_cache.put(key, png)
+        paths[name] = chart_cache.path(key)
+    return paths
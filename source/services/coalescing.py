@@ -0,0 +1,57 @@
+import threading
+
+from services.telemetry import COALESCED_CALLS
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time.
+
+    The first caller of a key runs the function; callers arriving with the
+    same key before it finishes wait for it and share its result or error.
+    Nothing is kept once the call returns, so later callers run it again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Run `function()` once for all concurrent callers of `key`.
+
+        Returns:
+            tuple: (result, shared), where shared is True for callers that
+            received another caller's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            COALESCED_CALLS.inc(call=self.name)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,44 @@
+from fastapi import HTTPException
+
+# Sheets API status codes passed through as they are; anything else becomes 502 Bad Gateway
+_PASSTHROUGH_STATUS = {400, 403, 404, 429}
+
+
+def http_exception_for(error):
+    """
+    Map an exception raised while serving a request to the HTTPException to return.
+
+    HTTPExceptions raised by the pipeline pass through unchanged, Google Sheets
+    and Gemini errors keep a meaningful status code, and anything else is a 500.
+    """
+    if isinstance(error, HTTPException):
+        return error
+
+    # Imported here rather than at module level so importing the API does not load gspread
+    from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+
+    if isinstance(error, SpreadsheetNotFound):
+        return HTTPException(status_code=404, detail="Spreadsheet not found or not shared with the service account.")
+    # gspread raises the built-in PermissionError for a 403 on opening a spreadsheet
+    if isinstance(error, PermissionError) and isinstance(error.__cause__, APIError):
+        return HTTPException(status_code=403, detail="Spreadsheet is not shared with any of the service accounts.")
+    if isinstance(error, WorksheetNotFound):
+        return HTTPException(status_code=404, detail=f"Worksheet not found: {error}")
+    if isinstance(error, APIError):
+        status_code = error.code if error.code in _PASSTHROUGH_STATUS else 502
+        return HTTPException(status_code=status_code, detail=f"Google Sheets API error: {error.error.get('message', error)}")
+
+    try:
+        from google.api_core import exceptions as google_exceptions
+    except ImportError:
+        google_exceptions = None
+    if google_exceptions is not None and isinstance(error, google_exceptions.GoogleAPICallError):
+        if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            status_code = 429
+        elif isinstance(error, google_exceptions.DeadlineExceeded):
+            status_code = 504
+        else:
+            status_code = 502
+        return HTTPException(status_code=status_code, detail=f"LLM API error: {error.message}")
+
+    return HTTPException(status_code=500, detail=str(error))
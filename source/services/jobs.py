@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+
+from services.errors import http_exception_for
+from services.sqlite_store import CACHE_DIR, SQLiteStore, json_default
+from services.telemetry import start_trace
+
+# Maximum number of jobs allowed inside each stage at the same time
+STAGE_CONCURRENCY = {
+    "fetch": int(os.getenv("JOB_FETCH_CONCURRENCY", "4")),
+    "clean": int(os.getenv("JOB_CLEAN_CONCURRENCY", "2")),
+    "generate": int(os.getenv("JOB_GENERATE_CONCURRENCY", "2")),
+}
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+# Unfinished jobs not updated for this many seconds are failed; their worker has most likely died
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "1800"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    params: dict
+    status: str = PENDING
+    stage: str = None
+    result: dict = None
+    error: dict = None
+    timings: list = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+# Job fields stored as JSON text
+_JSON_FIELDS = ("params", "result", "error", "timings")
+_COLUMNS = ("id", "params", "status", "stage", "result", "error", "timings", "created_at", "updated_at")
+
+
+class JobStore(SQLiteStore):
+    """
+    Registry of extraction jobs, shared by every API worker process.
+
+    A job runs in the worker that accepted it, but its state lives in SQLite,
+    so polling `/jobs/{id}` works whichever worker the request lands on. A job
+    left pending or running by a worker that died is failed once it has not
+    been updated for `stale_seconds`, and forgotten like any finished job.
+    """
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            result TEXT,
+            error TEXT,
+            timings TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)",
+    )
+
+    def __init__(self, path=JOB_STORE_PATH, ttl_seconds=JOB_TTL_SECONDS, stale_seconds=JOB_STALE_SECONDS):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+
+    def _save(self, conn, job):
+        values = [getattr(job, name) for name in _COLUMNS]
+        values = [
+            json.dumps(value, default=json_default) if name in _JSON_FIELDS else value
+            for name, value in zip(_COLUMNS, values)
+        ]
+        conn.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            values,
+        )
+
+    def create(self, params):
+        job = Job(id=uuid.uuid4().hex, params=params)
+        with closing(self.connect()) as conn, conn:
+            self._prune(conn)
+            self._save(conn, job)
+        return job
+
+    def get(self, job_id):
+        with closing(self.connect()) as conn, conn:
+            self._expire(conn)
+            row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return Job(**{
+            name: json.loads(value) if name in _JSON_FIELDS and value is not None else value
+            for name, value in zip(_COLUMNS, row)
+        })
+
+    def update(self, job, **changes):
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.updated_at = time.time()
+        with closing(self.connect()) as conn, conn:
+            self._save(conn, job)
+
+    def _expire(self, conn):
+        now = time.time()
+        error = {"status_code": 500, "detail": "The job stopped making progress; its worker may have exited."}
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?) AND updated_at < ?",
+            (FAILED, json.dumps(error), now, PENDING, RUNNING, now - self.stale_seconds),
+        )
+
+    def _prune(self, conn):
+        self._expire(conn)
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, time.time() - self.ttl_seconds),
+        )
+
+
+class JobScheduler:
+    """
+    Runs job stages on the event loop, offloading each blocking stage to a
+    worker thread. Every stage has its own semaphore, so a burst of slow LLM
+    calls cannot starve sheet fetches of other jobs and vice versa.
+    """
+
+    def __init__(self, store, concurrency=None):
+        self.store = store
+        self.concurrency = dict(concurrency or STAGE_CONCURRENCY)
+        self._semaphores = {}
+        self._tasks = set()
+
+    def _semaphore(self, stage):
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(self.concurrency.get(stage, 1))
+        return self._semaphores[stage]
+
+    def submit(self, job, state, stages, finalize):
+        """
+        Schedule `stages` for `job` on the running event loop.
+
+        Args:
+            job (Job): Job created through the store.
+            state: Value passed to the first stage.
+            stages (list): (name, callable) pairs; each callable receives the
+                previous stage's return value.
+            finalize (callable): Turns the last stage's value into the job result.
+        """
+        task = asyncio.get_running_loop().create_task(self._run(job, state, stages, finalize))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, job, state, stages, finalize):
+        # Spans recorded by the stages end up in the job's timing breakdown
+        with start_trace() as trace:
+            try:
+                # The store and finalize block on SQLite and the sheet, so they run off the event loop too
+                for name, stage in stages:
+                    await asyncio.to_thread(self.store.update, job, stage=name, status=PENDING)
+                    async with self._semaphore(name):
+                        await asyncio.to_thread(self.store.update, job, status=RUNNING)
+                        state = await asyncio.to_thread(stage, state)
+                result = await asyncio.to_thread(finalize, state)
+                await asyncio.to_thread(self.store.update, job, status=SUCCEEDED, result=result, timings=trace.to_list())
+            except Exception as e:
+                error = http_exception_for(e)
+                await asyncio.to_thread(
+                    self.store.update,
+                    job,
+                    status=FAILED,
+                    error={"status_code": error.status_code, "detail": error.detail},
+                    timings=trace.to_list(),
+                )
+
+
+job_store = JobStore()
+job_scheduler = JobScheduler(job_store)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import re
+import time
+from contextlib import closing
+
+from services.sqlite_store import CACHE_DIR, SQLiteStore
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_feedback_payload(feedback_data):
+    """
+    Canonical form of the structured feedback used for hashing.
+
+    Whitespace is collapsed and every list is sorted, so re-ordered rows or
+    stray spaces in the sheet still map to the same cache entry.
+    """
+    return {
+        key: sorted(_WHITESPACE.sub(" ", str(item)).strip() for item in (values or []))
+        for key, values in sorted(feedback_data.items())
+    }
+
+
+def feedback_cache_key(feedback_data, prompt_template, model_name):
+    """Content address of one summarisation request."""
+    digest = hashlib.sha256()
+    for part in (
+        json.dumps(normalize_feedback_payload(feedback_data), sort_keys=True, ensure_ascii=False),
+        prompt_template,
+        model_name,
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMResponseCache(SQLiteStore):
+    """SQLite-backed cache of parsed LLM responses with TTL and LRU eviction."""
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)",
+    )
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Returns:
+            tuple: (response, age_seconds), or (None, None) on a miss.
+        """
+        now = time.time()
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None, None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None, None
+            conn.execute("UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        return json.loads(response), now - created_at
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, model_name, json.dumps(response), now, now),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            # Keep only the most recently used entries
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with closing(self.connect()) as conn, conn:
+            conn.execute("DELETE FROM llm_cache")
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+from services.rate_limit import TokenBucket
+from services.telemetry import record_llm_call
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-1.5-flash")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# Gemini quota; calls beyond it wait for the bucket to refill instead of failing with 429 (0 disables)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    latency_ms: float
+    prompt_tokens: int
+    output_tokens: int
+    attempts: int = 1
+
+
+class LLMCallStats:
+    """Thread-safe running totals of the calls made through one client."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.total_latency_ms = 0.0
+
+    def record(self, response):
+        with self._lock:
+            self.calls += 1
+            self.retries += response.attempts - 1
+            self.prompt_tokens += response.prompt_tokens
+            self.output_tokens += response.output_tokens
+            self.total_latency_ms += response.latency_ms
+            self._latencies.append(response.latency_ms)
+
+    def record_error(self, attempts):
+        with self._lock:
+            self.errors += 1
+            self.retries += attempts - 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+                "avg_latency_ms": round(self.total_latency_ms / self.calls, 3) if self.calls else 0.0,
+                "p50_latency_ms": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                "p99_latency_ms": round(latencies[int(len(latencies) * 0.99)], 3) if latencies else 0.0,
+            }
+
+
+class LLMClient:
+    """Base class of the LLM backends; subclasses implement `_call`."""
+
+    backend = None
+    max_retries = 0
+
+    def __init__(self, model_name, requests_per_minute=0, tokens_per_minute=0):
+        self.model_name = model_name
+        self.stats = LLMCallStats()
+        self.request_limiter = TokenBucket.per_minute("llm_requests", requests_per_minute)
+        self.token_limiter = TokenBucket.per_minute("llm_tokens", tokens_per_minute)
+
+    def _call(self, prompt):
+        """Return (text, prompt_tokens, output_tokens) for one attempt."""
+        raise NotImplementedError
+
+    def _is_retryable(self, error):
+        return False
+
+    def _backoff(self, attempt):
+        return 0.0
+
+    def _throttle(self, prompt):
+        # Retries count against the quota too, so every attempt waits for its tokens
+        self.request_limiter.acquire()
+        self.token_limiter.acquire(estimate_tokens(prompt))
+
+    def generate(self, prompt):
+        """
+        Send `prompt` to the model, retrying rate-limit and transient errors.
+
+        Returns:
+            LLMResponse: Model text with latency and token usage.
+        """
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._throttle(prompt)
+            try:
+                text, prompt_tokens, output_tokens = self._call(prompt)
+                break
+            except Exception as e:
+                if attempt > self.max_retries or not self._is_retryable(e):
+                    self.stats.record_error(attempt)
+                    record_llm_call(
+                        self.backend, self.model_name, (time.perf_counter() - started) * 1000,
+                        attempts=attempt, outcome="error",
+                    )
+                    raise
+                time.sleep(self._backoff(attempt))
+
+        response = LLMResponse(
+            text=text,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            attempts=attempt,
+        )
+        self.stats.record(response)
+        record_llm_call(
+            self.backend, self.model_name, response.latency_ms,
+            response.prompt_tokens, response.output_tokens, response.attempts,
+        )
+        return response
+
+
+class GeminiClient(LLMClient):
+    """Gemini backend that configures the SDK and builds the model once."""
+
+    backend = "gemini"
+
+    def __init__(
+        self,
+        api_key=None,
+        model_name=LLM_MODEL_NAME,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=LLM_BACKOFF_MAX_SECONDS,
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    ):
+        super().__init__(model_name, requests_per_minute, tokens_per_minute)
+        import google.generativeai as genai
+        from google.api_core import exceptions
+
+        genai.configure(api_key=api_key or os.getenv('GEMINI_KEY'))
+        self._model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._retryable = (
+            exceptions.ResourceExhausted,
+            exceptions.TooManyRequests,
+            exceptions.ServiceUnavailable,
+            exceptions.DeadlineExceeded,
+            exceptions.InternalServerError,
+        )
+
+    def _is_retryable(self, error):
+        return isinstance(error, self._retryable)
+
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter, so parallel chunk calls do not retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _call(self, prompt):
+        response = self._model.generate_content(prompt, request_options={"timeout": self.timeout})
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+        output_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(response.text)
+        return response.text, prompt_tokens, output_tokens
+
+
+class StubLLMClient(LLMClient):
+    """
+    Deterministic offline backend for tests and load testing.
+
+    The answer is derived from a hash of the prompt, so identical prompts get
+    identical summaries and no network or API key is needed.
+    """
+
+    backend = "stub"
+
+    def __init__(self, model_name="stub", latency_ms=STUB_LLM_LATENCY_MS):
+        super().__init__(model_name)
+        self.latency_ms = latency_ms
+
+    def _call(self, prompt):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        text = json.dumps({
+            "positive_aspects": [
+                {"aspect": f"Strength {digest[i * 4:i * 4 + 4]}", "explanation": "Stub summary of positive feedback."}
+                for i in range(5)
+            ],
+            "improvements_needed": [
+                {"aspect": f"Improvement {digest[32 + i * 4:36 + i * 4]}", "explanation": "Stub summary of suggested changes."}
+                for i in range(5)
+            ],
+        })
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+
+
+BACKENDS = {
+    GeminiClient.backend: GeminiClient,
+    StubLLMClient.backend: StubLLMClient,
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def init_llm_client(backend=None):
+    """Create the process-wide LLM client; called once at app startup."""
+    global _client
+    backend = backend or LLM_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend!r}; expected one of {sorted(BACKENDS)}.")
+    client = BACKENDS[backend]()
+    with _client_lock:
+        _client = client
+    return client
+
+
+def get_llm_client():
+    """Return the process-wide LLM client, creating it on first use."""
+    with _client_lock:
+        client = _client
+    return client if client is not None else init_llm_client()
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from services.nps_metrics import NUM_SCORES, grouped_histograms, metrics_from_histogram
+from services.sqlite_store import CACHE_DIR, SQLiteStore
+
+NPS_AGGREGATES_PATH = os.getenv("NPS_AGGREGATES_PATH", os.path.join(CACHE_DIR, "nps_aggregates.sqlite3"))
+
+
+class NPSAggregateStore(SQLiteStore):
+    """
+    Persistent per-(spreadsheet, wave) score histograms.
+
+    Each spreadsheet has a row watermark; `update_from_snapshot` folds only the
+    snapshot rows past it into the stored histograms, so keeping the
+    aggregates current costs O(new rows) and metrics never need raw rows.
+    `sheet_id` is the snapshot key, so a named worksheet is aggregated apart
+    from the first worksheet of the same spreadsheet. The store is shared by
+    the API workers, and a snapshot synced earlier than the one last folded in
+    comes from a worker that is behind, so it is ignored.
+    """
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS sheet_watermarks (
+            sheet_id TEXT PRIMARY KEY,
+            last_row INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            revision TEXT,
+            synced_at REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS wave_aggregates (
+            sheet_id TEXT NOT NULL,
+            wave TEXT NOT NULL,
+            histogram TEXT NOT NULL,
+            response_count INTEGER NOT NULL,
+            last_row INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (sheet_id, wave)
+        )
+        """,
+    )
+    added_columns = (
+        ("sheet_watermarks", "revision", "TEXT"),
+        ("sheet_watermarks", "synced_at", "REAL"),
+    )
+
+    def __init__(self, path=NPS_AGGREGATES_PATH):
+        super().__init__(path)
+
+    def update_from_snapshot(self, snapshot, wave_header, score_header):
+        """
+        Fold the snapshot rows past the stored watermark into the aggregates.
+
+        Args:
+            snapshot (SheetSnapshot): Freshly synced sheet snapshot.
+            wave_header (str): Sheet header holding the wave label.
+            score_header (str): Sheet header holding the recommendation score.
+
+        Returns:
+            int: Number of rows processed.
+        """
+        sheet_id = snapshot.key
+        now = time.time()
+        with closing(self.connect()) as conn, conn:
+            # Serialise concurrent updaters so a row is never counted twice
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT last_row, revision, synced_at FROM sheet_watermarks WHERE sheet_id = ?", (sheet_id,)
+            ).fetchone()
+            if row is not None and row[2] is not None and snapshot.synced_at < row[2]:
+                # Another worker folded in a newer view of the sheet; this worker's snapshot is behind
+                return 0
+            last_row = row[0] if row else 0
+            reloaded = snapshot.rewrite_from is not None and row is not None and snapshot.revision != row[1]
+            if snapshot.row_count < last_row and not reloaded:
+                # Only a reload at a new revision can show the sheet got shorter; otherwise this copy is behind
+                return 0
+            if snapshot.row_count < last_row or (reloaded and snapshot.rewrite_from < last_row):
+                # Rows were removed or edited in place; histograms cannot be patched, so rebuild from scratch
+                conn.execute("DELETE FROM wave_aggregates WHERE sheet_id = ?", (sheet_id,))
+                last_row = 0
+            if snapshot.row_count == last_row:
+                return 0
+
+            new_rows = pd.DataFrame({
+                "wave": snapshot.columns[wave_header][last_row:],
+                "score": snapshot.columns[score_header][last_row:],
+            })
+            new_rows["wave"] = new_rows["wave"].replace("", None)
+            response_counts = new_rows["wave"].value_counts()
+            waves, histograms = grouped_histograms(new_rows, "wave", "score")
+            histograms = dict(zip(waves, histograms))
+
+            for wave, count in response_counts.items():
+                stored = conn.execute(
+                    "SELECT histogram, response_count FROM wave_aggregates WHERE sheet_id = ? AND wave = ?",
+                    (sheet_id, str(wave)),
+                ).fetchone()
+                histogram = histograms.get(wave, np.zeros(NUM_SCORES, dtype=np.int64))
+                total = int(count)
+                if stored:
+                    histogram = histogram + np.asarray(json.loads(stored[0]), dtype=np.int64)
+                    total += stored[1]
+                conn.execute(
+                    "INSERT OR REPLACE INTO wave_aggregates "
+                    "(sheet_id, wave, histogram, response_count, last_row, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (sheet_id, str(wave), json.dumps(histogram.tolist()), total, snapshot.row_count, now),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO sheet_watermarks (sheet_id, last_row, updated_at, revision, synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (sheet_id, snapshot.row_count, now, snapshot.revision, snapshot.synced_at),
+            )
+            return snapshot.row_count - last_row
+
+    def reset(self, sheet_id):
+        with closing(self.connect()) as conn, conn:
+            conn.execute("DELETE FROM wave_aggregates WHERE sheet_id = ?", (sheet_id,))
+            conn.execute("DELETE FROM sheet_watermarks WHERE sheet_id = ?", (sheet_id,))
+
+    @staticmethod
+    def _to_dict(wave, histogram, response_count, last_row, updated_at):
+        return {
+            "wave_number": wave,
+            "response_count": response_count,
+            "last_row": last_row,
+            "updated_at": updated_at,
+            "metrics": metrics_from_histogram(json.loads(histogram)),
+        }
+
+    def get_wave(self, sheet_id, wave):
+        """Aggregate of one wave with its NPS metrics, or None if the wave has no rows."""
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT wave, histogram, response_count, last_row, updated_at FROM wave_aggregates "
+                "WHERE sheet_id = ? AND wave = ?",
+                (sheet_id, wave),
+            ).fetchone()
+        return self._to_dict(*row) if row else None
+
+    def get_sheet(self, sheet_id):
+        """Aggregates of every wave of a spreadsheet, keyed by wave label."""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT wave, histogram, response_count, last_row, updated_at FROM wave_aggregates "
+                "WHERE sheet_id = ?",
+                (sheet_id,),
+            ).fetchall()
+        return {row[0]: self._to_dict(*row) for row in rows}
+
+
+nps_aggregates = NPSAggregateStore()
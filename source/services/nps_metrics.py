@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# Recommendation scores run from 0 to 10
+NUM_SCORES = 11
+PROMOTER_MIN = 9
+PASSIVE_MIN = 7
+
+
+def _score_codes(scores):
+    """
+    Integer bins 0..10 of the valid scores, and the mask of which scores were valid.
+
+    Blanks, non-numeric answers, fractional scores and scores outside 0..10
+    are dropped rather than rounded or clipped into range.
+    """
+    values = pd.to_numeric(pd.Series(scores, dtype=object), errors="coerce").to_numpy(dtype=float)
+    with np.errstate(invalid="ignore"):
+        valid = (values >= 0) & (values <= NUM_SCORES - 1) & (values == np.floor(values))
+    return values[valid].astype(np.int64), valid
+
+
+def score_histogram(scores):
+    """
+    Count of each score 0..10 in one `np.bincount` pass.
+
+    Args:
+        scores: Array-like of recommendation scores.
+
+    Returns:
+        np.ndarray: Eleven counts, index = score.
+    """
+    codes, _ = _score_codes(scores)
+    return np.bincount(codes, minlength=NUM_SCORES)
+
+
+def metrics_from_histogram(histogram):
+    """
+    NPS metrics derived from a score histogram.
+
+    Args:
+        histogram (array-like): Eleven counts, index = score.
+
+    Returns:
+        dict: Respondent count, min/average score, promoter/passive/detractor
+        counts and percentages, below-7 share, NPS and the histogram itself.
+        `respondents` is the number of valid scores, so rows whose score was
+        blank or invalid are not counted.
+    """
+    histogram = np.asarray(histogram, dtype=np.int64)
+    respondents = int(histogram.sum())
+    promoters = int(histogram[PROMOTER_MIN:].sum())
+    passives = int(histogram[PASSIVE_MIN:PROMOTER_MIN].sum())
+    detractors = int(histogram[:PASSIVE_MIN].sum())
+
+    def pct(count):
+        return round(count / respondents * 100, 2) if respondents else 0.0
+
+    nonzero = np.flatnonzero(histogram)
+    return {
+        "respondents": respondents,
+        "minimum_score": int(nonzero[0]) if respondents else None,
+        "average_score": round(float(np.arange(NUM_SCORES) @ histogram) / respondents, 2) if respondents else None,
+        "promoters": promoters,
+        "passives": passives,
+        "detractors": detractors,
+        "promoters_pct": pct(promoters),
+        "passives_pct": pct(passives),
+        "detractors_pct": pct(detractors),
+        # Detractors are exactly the scores 0..6, i.e. the share below 7
+        "below_7": detractors,
+        "below_7_pct": pct(detractors),
+        "nps": round(pct(promoters) - pct(detractors), 2),
+        "histogram": histogram.tolist(),
+    }
+
+
+def grouped_histograms(df, by, score_column="recommendation_score"):
+    """
+    Score histograms of every group with a single `np.bincount`.
+
+    Args:
+        df (pd.DataFrame): Rows holding the score and grouping columns.
+        by (str | list): Grouping column(s).
+        score_column (str): Column with the recommendation scores.
+
+    Returns:
+        tuple: (list of group keys, np.ndarray of shape (groups, 11)).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    codes, valid = _score_codes(df[score_column])
+    # Rows with a missing grouping key are left out
+    has_keys = df[by].notna().all(axis=1).to_numpy()
+    codes = codes[has_keys[valid]]
+    keys_df = df.loc[valid & has_keys, by]
+    if len(by) == 1:
+        group_ids, keys = pd.factorize(keys_df[by[0]], sort=True)
+    else:
+        group_ids, keys = pd.factorize(pd.MultiIndex.from_frame(keys_df), sort=True)
+    keys = list(keys)
+    counts = np.bincount(group_ids * NUM_SCORES + codes, minlength=len(keys) * NUM_SCORES)
+    return keys, counts.reshape(len(keys), NUM_SCORES)
+
+
+def compute_nps_metrics(data, by=None, score_column="recommendation_score"):
+    """
+    NPS metrics of a score array, or of each group of a DataFrame.
+
+    Args:
+        data: Array-like of scores, a DataFrame holding `score_column`, or a
+            `DataFrame.groupby(...)` result.
+        by (str | list): Optional grouping column(s) of `data`.
+        score_column (str): Column with the recommendation scores.
+
+    Invalid scores are left out of every count, including `respondents`.
+
+    Returns:
+        dict: Metrics, or {group key: metrics} when `by` is given.
+    """
+    if isinstance(data, pd.api.typing.DataFrameGroupBy):
+        data, by = data.obj, data.keys
+
+    if by is None:
+        scores = data[score_column] if isinstance(data, pd.DataFrame) else data
+        return metrics_from_histogram(score_histogram(scores))
+
+    keys, histograms = grouped_histograms(data, by, score_column)
+    return {key: metrics_from_histogram(histogram) for key, histogram in zip(keys, histograms)}
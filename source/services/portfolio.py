@@ -0,0 +1,246 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+from routers.feedback_generator import generate_feedback_from_ai
+from services.batch_analysis import BATCH_LLM_CONCURRENCY, wave_sort_key
+from services.errors import http_exception_for
+from services.nps_aggregates import nps_aggregates
+from services.nps_metrics import NUM_SCORES, metrics_from_histogram
+from services.reports import report_store
+from services.review_pipeline import (
+    FEEDBACK_COLUMNS,
+    Config,
+    build_structured_feedback,
+    header_for,
+    load_column_keys,
+    parse_spreadsheet_id,
+    rename_configured_columns,
+    sync_sheet,
+)
+from services.sheet_cache import sheet_key
+from services.telemetry import span
+
+# Maximum number of spreadsheets synced at the same time; each Sheets call is also rate limited per service account
+PORTFOLIO_CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "8"))
+# Maximum number of spreadsheets accepted in one portfolio request
+PORTFOLIO_MAX_SHEETS = int(os.getenv("PORTFOLIO_MAX_SHEETS", "100"))
+
+# A bare spreadsheet ID, as opposed to a full URL
+_SPREADSHEET_ID = re.compile(r"^[A-Za-z0-9_-]{20,}$")
+
+
+class PortfolioSheet(BaseModel):
+    # URL or ID of the spreadsheet
+    spreadsheet: str
+    # Title of the worksheet to read; the first worksheet when omitted
+    worksheet: Optional[str] = None
+    # Cohort name shown in the results; the worksheet title when omitted
+    label: Optional[str] = None
+
+
+class PortfolioRequest(BaseModel):
+    sheets: List[PortfolioSheet]
+    # Wave labels such as "Wave 3", or ["all"] for every wave of every sheet
+    waves: List[str] = ["all"]
+    # Summarise the feedback of every cohort together
+    summarize: bool = True
+    # Also summarise each cohort on its own; one LLM call per cohort unless cached
+    summarize_cohorts: bool = False
+    config: Config = Config()
+
+
+def spreadsheet_id_from(value):
+    """Spreadsheet ID from a Google Sheets URL or a bare ID."""
+    value = value.strip()
+    if _SPREADSHEET_ID.match(value):
+        return value
+    return parse_spreadsheet_id(value)
+
+
+def _error(e):
+    error = http_exception_for(e)
+    return {"status_code": error.status_code, "detail": error.detail}
+
+
+def analyze_cohort(spreadsheet_id, sheet, waves, json_data, with_feedback):
+    """
+    Sync one cohort's worksheet and combine the NPS of the selected waves.
+
+    Returns:
+        tuple: (cohort result dict, summed score histogram, per-wave histograms,
+        structured feedback of the selected waves or None).
+    """
+    snapshot = sync_sheet(spreadsheet_id, json_data, worksheet=sheet.worksheet)
+    wave_header = header_for(json_data, "wave_number")
+    if wave_header not in snapshot.columns:
+        raise HTTPException(status_code=400, detail=f"{wave_header} column not found in the spreadsheet.")
+
+    aggregates = nps_aggregates.get_sheet(snapshot.key)
+    if [wave.lower() for wave in waves] == ["all"]:
+        selected = sorted(aggregates, key=wave_sort_key)
+        missing = []
+    else:
+        requested = list(dict.fromkeys(waves))
+        selected = [wave for wave in requested if wave in aggregates]
+        missing = [wave for wave in requested if wave not in aggregates]
+    if not selected:
+        raise HTTPException(status_code=404, detail=f"No data found for Wave Numbers: {', '.join(missing)}")
+
+    wave_histograms = {wave: np.asarray(aggregates[wave]["metrics"]["histogram"], dtype=np.int64) for wave in selected}
+    histogram = sum(wave_histograms.values(), np.zeros(NUM_SCORES, dtype=np.int64))
+
+    feedback = None
+    if with_feedback:
+        renamed_df = rename_configured_columns(snapshot.to_frame(), json_data)
+        feedback = build_structured_feedback(renamed_df[renamed_df["wave_number"].isin(selected)], json_data)
+
+    result = {
+        "label": sheet.label or snapshot.title,
+        "spreadsheet_id": spreadsheet_id,
+        "worksheet": snapshot.title,
+        "status": "ok",
+        "revision": snapshot.revision,
+        "metrics": metrics_from_histogram(histogram),
+        "waves": {wave: aggregates[wave]["metrics"] for wave in selected},
+        "missing_waves": missing,
+    }
+    return result, histogram, wave_histograms, feedback
+
+
+def _summarize(feedback):
+    try:
+        feedback_generated, generation_info = generate_feedback_from_ai(feedback)
+        return {"feedback_generated": feedback_generated, "generation": generation_info}
+    except Exception as e:
+        return {"error": _error(e)}
+
+
+def run_portfolio_analysis(
+    sheets,
+    waves=("all",),
+    config=None,
+    summarize=True,
+    summarize_cohorts=False,
+    max_concurrency=PORTFOLIO_CONCURRENCY,
+):
+    """
+    NPS and feedback summaries across many cohort spreadsheets.
+
+    Every worksheet is synced concurrently by a bounded pool and read through
+    the same column keys, so sheets with differently worded questions line up.
+    A sheet that cannot be read is reported with its error while the others
+    are still analysed and rolled up.
+
+    Args:
+        sheets (list): PortfolioSheet entries; repeated worksheets are analysed once.
+        waves (list): Wave labels to include, or ["all"].
+        config (Config): Extraction settings, including the column keys file.
+        summarize (bool): Summarise the feedback of all cohorts together.
+        summarize_cohorts (bool): Also summarise every cohort on its own.
+        max_concurrency (int): Maximum number of sheets synced at the same time.
+
+    Returns:
+        dict: Per-cohort results, rolled-up metrics overall and per wave, and the summaries.
+    """
+    config = config or Config()
+    if not sheets:
+        raise HTTPException(status_code=400, detail="No spreadsheets given.")
+    if len(sheets) > PORTFOLIO_MAX_SHEETS:
+        raise HTTPException(status_code=400, detail=f"At most {PORTFOLIO_MAX_SHEETS} spreadsheets per request.")
+    json_data = load_column_keys(config.json_file)
+    with_feedback = summarize or summarize_cohorts
+
+    cohorts, jobs, seen = [], [], set()
+    for sheet in sheets:
+        try:
+            spreadsheet_id = spreadsheet_id_from(sheet.spreadsheet)
+        except Exception as e:
+            cohorts.append({"label": sheet.label or sheet.spreadsheet, "spreadsheet": sheet.spreadsheet,
+                            "worksheet": sheet.worksheet, "status": "failed", "error": _error(e)})
+            continue
+        key = sheet_key(spreadsheet_id, sheet.worksheet)
+        if key in seen:
+            continue
+        seen.add(key)
+        jobs.append((len(cohorts), spreadsheet_id, sheet))
+        cohorts.append(None)
+
+    def analyze(job):
+        index, spreadsheet_id, sheet = job
+        try:
+            return index, analyze_cohort(spreadsheet_id, sheet, waves, json_data, with_feedback)
+        except Exception as e:
+            return index, ({"label": sheet.label or sheet.spreadsheet, "spreadsheet_id": spreadsheet_id,
+                            "worksheet": sheet.worksheet, "status": "failed", "error": _error(e)}, None, None, None)
+
+    with span("portfolio_sync", sheets=len(jobs)):
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(jobs) or 1))) as executor:
+            analyses = dict(executor.map(analyze, jobs))
+
+    histogram = np.zeros(NUM_SCORES, dtype=np.int64)
+    by_wave = {}
+    combined = {column: [] for column in FEEDBACK_COLUMNS}
+    feedback_by_cohort = {}
+    counted = set()
+    for index in sorted(analyses):
+        result, cohort_histogram, wave_histograms, feedback = analyses[index]
+        if result["status"] == "ok":
+            # The first worksheet can be named by title or left out; both resolve to the same worksheet
+            worksheet = (result["spreadsheet_id"], result["worksheet"])
+            if worksheet in counted:
+                continue
+            counted.add(worksheet)
+        cohorts[index] = result
+        if result["status"] != "ok":
+            continue
+        histogram += cohort_histogram
+        for wave, wave_histogram in wave_histograms.items():
+            by_wave[wave] = by_wave.get(wave, np.zeros(NUM_SCORES, dtype=np.int64)) + wave_histogram
+        if feedback is not None:
+            feedback_by_cohort[index] = feedback
+            for column in FEEDBACK_COLUMNS:
+                combined[column].extend(feedback.get(column, []))
+
+    if summarize_cohorts and feedback_by_cohort:
+        with ThreadPoolExecutor(max_workers=max(1, BATCH_LLM_CONCURRENCY)) as executor:
+            for index, summary in zip(feedback_by_cohort, executor.map(_summarize, feedback_by_cohort.values())):
+                cohorts[index]["summary"] = summary
+
+    cohorts = [cohort for cohort in cohorts if cohort is not None]
+    metrics = metrics_from_histogram(histogram)
+    summary = None
+    if summarize and feedback_by_cohort:
+        # One summary over every cohort; pre-analysis and the prompt budget keep it to a single prompt
+        summary = _summarize(combined)
+        if "error" not in summary:
+            wave_label = "All waves" if [wave.lower() for wave in waves] == ["all"] else ", ".join(waves)
+            summary["report_id"] = report_store.register(
+                summary["feedback_generated"], metrics, "Portfolio", wave_label
+            )
+
+    succeeded = sum(1 for cohort in cohorts if cohort["status"] == "ok")
+    return {
+        "message": f"Analysed {succeeded} of {len(cohorts)} spreadsheets.",
+        "succeeded": succeeded,
+        "failed": len(cohorts) - succeeded,
+        "cohorts": cohorts,
+        "rollup": {
+            "metrics": metrics,
+            "waves": [
+                {"wave_number": wave, **metrics_from_histogram(by_wave[wave])}
+                for wave in sorted(by_wave, key=wave_sort_key)
+            ],
+        },
+        "comparison": [
+            {"label": cohort["label"], **{k: v for k, v in cohort["metrics"].items() if k != "histogram"}}
+            for cohort in cohorts if cohort["status"] == "ok"
+        ],
+        "summary": summary,
+        "status": status.HTTP_200_OK
+    }
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import closing
+from typing import List
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from services.batch_analysis import wave_sort_key
+from services.nps_aggregates import nps_aggregates
+from services.sqlite_store import CACHE_DIR, SQLiteStore, json_default
+from services.review_pipeline import (
+    EXTRACTION_STAGES,
+    Config,
+    WaveExtraction,
+    build_extraction_response,
+    load_column_keys,
+    parse_spreadsheet_id,
+    sync_sheet,
+)
+
+# Spreadsheets to keep precomputed; re-read on every pass so edits apply without a restart
+SCHEDULED_SHEETS_FILE = os.getenv("SCHEDULED_SHEETS_FILE", "scheduled_sheets.json")
+PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "300"))
+# Maximum number of spreadsheets refreshed at the same time
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))
+# Only the API worker holding the lease runs passes; another takes over once it expires
+PRECOMPUTE_LEASE_SECONDS = float(os.getenv("PRECOMPUTE_LEASE_SECONDS", str(2 * PRECOMPUTE_INTERVAL_SECONDS)))
+PRECOMPUTE_STORE_PATH = os.getenv("PRECOMPUTE_STORE_PATH", os.path.join(CACHE_DIR, "precompute.sqlite3"))
+
+SCHEDULER_LEASE = "precompute"
+
+
+class ScheduledSheet(BaseModel):
+    spreadsheet_url: str
+    # Active waves to summarise; every wave in the sheet when empty
+    waves: List[str] = []
+
+
+def load_scheduled_sheets(path=SCHEDULED_SHEETS_FILE):
+    """Registered spreadsheets, or an empty list when the file does not exist."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [ScheduledSheet(**entry) for entry in json.load(f)]
+
+
+class PrecomputeStore(SQLiteStore):
+    """Precomputed results, per-sheet status and the scheduler lease, shared by every API worker."""
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS precomputed_results (
+            sheet_id TEXT NOT NULL,
+            wave TEXT NOT NULL,
+            result TEXT NOT NULL,
+            precomputed_at REAL NOT NULL,
+            PRIMARY KEY (sheet_id, wave)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS precompute_status (
+            sheet_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at REAL NOT NULL,
+            last_pass_at REAL,
+            last_error TEXT
+        )
+        """,
+    )
+
+    def __init__(self, path=PRECOMPUTE_STORE_PATH):
+        super().__init__(path)
+
+    def put_result(self, sheet_id, wave, result):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO precomputed_results (sheet_id, wave, result, precomputed_at) VALUES (?, ?, ?, ?)",
+                (sheet_id, wave, json.dumps(result, default=json_default), result["precomputed_at"]),
+            )
+
+    def get_result(self, sheet_id, wave):
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT result FROM precomputed_results WHERE sheet_id = ? AND wave = ?", (sheet_id, wave)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put_status(self, sheet_id, status):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO precompute_status (sheet_id, status) VALUES (?, ?)",
+                (sheet_id, json.dumps(status, default=json_default)),
+            )
+
+    def get_status(self, sheet_id):
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT status FROM precompute_status WHERE sheet_id = ?", (sheet_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def statuses(self):
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT status FROM precompute_status ORDER BY sheet_id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def acquire_lease(self, name, owner, seconds):
+        """Take or renew the lease `name` for `owner`; False while another owner holds an unexpired lease."""
+        now = time.time()
+        with closing(self.connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM scheduler_leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] not in (owner, None) and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                (name, owner, now + seconds),
+            )
+            return True
+
+    def release_lease(self, name, owner):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "UPDATE scheduler_leases SET owner = NULL, expires_at = 0 WHERE name = ? AND owner = ?", (name, owner)
+            )
+
+    def record_pass(self, name, last_pass_at=None, last_error=None):
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO scheduler_leases (name, expires_at) VALUES (?, 0) ON CONFLICT(name) DO NOTHING", (name,)
+            )
+            if last_pass_at is None:
+                conn.execute("UPDATE scheduler_leases SET last_error = ? WHERE name = ?", (last_error, name))
+            else:
+                conn.execute(
+                    "UPDATE scheduler_leases SET last_pass_at = ?, last_error = ? WHERE name = ?",
+                    (last_pass_at, last_error, name),
+                )
+
+    def lease(self, name):
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT owner, expires_at, last_pass_at, last_error FROM scheduler_leases WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return {"owner": None, "expires_at": None, "last_pass_at": None, "last_error": None}
+        return dict(zip(("owner", "expires_at", "last_pass_at", "last_error"), row))
+
+
+class PrecomputeScheduler:
+    """
+    Keeps the results of registered spreadsheets warm in the background.
+
+    Each pass syncs the new rows of every registered sheet, which also folds
+    them into the NPS aggregates. Sheets whose revision has not moved since
+    the previous pass are skipped; for the others every active wave is run
+    through the extraction stages, and the LLM cache makes sure only waves
+    whose feedback actually changed cost a model call.
+
+    Every API worker starts the loop, but a pass only runs in the worker that
+    holds the scheduler lease. The lease is renewed after each sheet, so a
+    pass longer than the lease is not taken over halfway; results and status
+    are read from the shared store, so every worker serves them.
+    """
+
+    def __init__(
+        self,
+        sheets_file=SCHEDULED_SHEETS_FILE,
+        interval=PRECOMPUTE_INTERVAL_SECONDS,
+        concurrency=PRECOMPUTE_CONCURRENCY,
+        config=None,
+        store=None,
+        lease_seconds=PRECOMPUTE_LEASE_SECONDS,
+    ):
+        self.sheets_file = sheets_file
+        self.interval = interval
+        self.concurrency = concurrency
+        self.config = config or Config()
+        self.store = store or PrecomputeStore()
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task = None
+
+    def get_result(self, spreadsheet_id, wave_number):
+        """Latest precomputed extraction response of one wave, or None."""
+        return self.store.get_result(spreadsheet_id, wave_number)
+
+    def status(self):
+        lease = self.store.lease(SCHEDULER_LEASE)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "leader": lease["owner"],
+            "is_leader": lease["owner"] == self.owner,
+            "lease_expires_at": lease["expires_at"],
+            "sheets_file": self.sheets_file,
+            "interval_seconds": self.interval,
+            "last_pass_at": lease["last_pass_at"],
+            "last_error": lease["last_error"],
+            "sheets": self.store.statuses(),
+        }
+
+    def refresh_sheet(self, sheet):
+        """
+        Sync one registered spreadsheet and precompute its active waves.
+
+        Returns:
+            dict: Status of the sheet after this pass.
+        """
+        started = time.time()
+        spreadsheet_id = parse_spreadsheet_id(sheet.spreadsheet_url)
+        previous = self.store.get_status(spreadsheet_id) or {}
+        status = {
+            "spreadsheet_id": spreadsheet_id,
+            "spreadsheet_url": sheet.spreadsheet_url,
+            "revision": previous.get("revision"),
+            "waves": previous.get("waves", {}),
+            "error": None,
+        }
+        try:
+            snapshot = sync_sheet(spreadsheet_id, load_column_keys(self.config.json_file))
+            waves = sheet.waves or sorted(nps_aggregates.get_sheet(spreadsheet_id), key=wave_sort_key)
+            unchanged = snapshot.revision is not None and snapshot.revision == previous.get("revision")
+            # Re-running a wave against the same revision would give the same result, even a failed one
+            if unchanged and all(wave in status["waves"] for wave in waves):
+                status["skipped"] = True
+            else:
+                status["skipped"] = False
+                status["waves"] = {wave: self._refresh_wave(spreadsheet_id, wave) for wave in waves}
+            status["revision"] = snapshot.revision
+            status["synced_at"] = snapshot.synced_at
+        except HTTPException as e:
+            status["error"] = {"status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            status["error"] = {"status_code": 500, "detail": str(e)}
+
+        status["last_run_at"] = started
+        status["duration_ms"] = round((time.time() - started) * 1000, 3)
+        self.store.put_status(spreadsheet_id, status)
+        return status
+
+    def _refresh_wave(self, spreadsheet_id, wave_number):
+        extraction = WaveExtraction(
+            spreadsheet_id=spreadsheet_id,
+            wave_number=wave_number,
+            config=self.config,
+            # The sheet was synced at the start of this pass
+            max_age=self.interval,
+        )
+        try:
+            for _, stage in EXTRACTION_STAGES:
+                extraction = stage(extraction)
+            result = build_extraction_response(extraction)
+        except HTTPException as e:
+            return {"status": "failed", "error": {"status_code": e.status_code, "detail": e.detail}}
+        except Exception as e:
+            return {"status": "failed", "error": {"status_code": 500, "detail": str(e)}}
+
+        result["precomputed_at"] = time.time()
+        self.store.put_result(spreadsheet_id, wave_number, result)
+        return {
+            "status": "ok",
+            "precomputed_at": result["precomputed_at"],
+            "llm_cache_hit": result["payload"]["generation"]["cache"]["hit"],
+        }
+
+    async def run_once(self):
+        """Refresh every registered spreadsheet, a few at a time."""
+        sheets = await asyncio.to_thread(load_scheduled_sheets, self.sheets_file)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        lost_lease = asyncio.Event()
+
+        async def refresh(sheet):
+            async with semaphore:
+                if lost_lease.is_set():
+                    return None
+                status = await asyncio.to_thread(self.refresh_sheet, sheet)
+                # A pass can outlast the lease, so it is renewed after every sheet; once another
+                # worker has taken it over, the remaining sheets are left to that worker
+                if not await asyncio.to_thread(
+                    self.store.acquire_lease, SCHEDULER_LEASE, self.owner, self.lease_seconds
+                ):
+                    lost_lease.set()
+                return status
+
+        results = await asyncio.gather(*(refresh(sheet) for sheet in sheets))
+        if lost_lease.is_set():
+            return [status for status in results if status is not None]
+        await asyncio.to_thread(self.store.record_pass, SCHEDULER_LEASE, time.time())
+        return results
+
+    async def _loop(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self.store.acquire_lease, SCHEDULER_LEASE, self.owner, self.lease_seconds):
+                    await self.run_once()
+            except Exception as e:
+                # A malformed sheets file must not kill the loop; report it and retry next pass
+                await asyncio.to_thread(self.store.record_pass, SCHEDULER_LEASE, last_error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the refresh loop on the running event loop; a no-op without registered sheets."""
+        if self._task is None and os.path.exists(self.sheets_file):
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Let another worker take over right away instead of waiting for the lease to expire
+            await asyncio.to_thread(self.store.release_lease, SCHEDULER_LEASE, self.owner)
+
+
+precompute_scheduler = PrecomputeScheduler()
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from services.llm_client import estimate_tokens
+
+# Estimated token budget of the feedback answers inside one prompt
+PROMPT_FEEDBACK_TOKENS = int(os.getenv("PROMPT_FEEDBACK_TOKENS", "6000"))
+# Answers whose estimated Jaccard similarity reaches this are collapsed into one entry
+PROMPT_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("PROMPT_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# MinHash signature of 64 hashes, bucketed as 16 bands of 4 rows for locality-sensitive hashing
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+SHINGLE_SIZE = 4
+_PRIME = (1 << 61) - 1
+
+# Answers that say nothing, compared after normalisation and with punctuation removed
+NON_ANSWERS = frozenset({
+    "", "na", "n a", "nil", "none", "nothing", "no", "nope", "null", "ok", "okay", "nothing much",
+    "nothing else", "nothing to say", "nothing to add", "no comments", "no comment", "no suggestions",
+    "no suggestion", "not applicable", "no idea", "dont know", "don t know", "idk", "same", "same as above",
+})
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION_RUN = re.compile(r"([^\w\s])\1+")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Canonical form used to compare answers: NFKC, lower case, single spaces, no repeated or edge punctuation."""
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = _PUNCTUATION_RUN.sub(r"\1", text)
+    return _WHITESPACE.sub(" ", text).strip(" .,;:!?-_'\"()[]")
+
+
+def is_non_answer(normalized):
+    stripped = _NON_WORD.sub(" ", normalized).strip()
+    return stripped in NON_ANSWERS or not any(char.isalpha() for char in stripped)
+
+
+def _hash_parameters(count, seed=1):
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2 ** 31 - 1, size=count, dtype=np.int64).astype(np.uint64)
+    b = rng.randint(0, 2 ** 31 - 1, size=count, dtype=np.int64).astype(np.uint64)
+    return a[:, None], b[:, None]
+
+
+_HASH_A, _HASH_B = _hash_parameters(MINHASH_BANDS * MINHASH_ROWS)
+
+
+def _shingle_hashes(text):
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    return [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+
+
+def minhash_signatures(texts, batch_size=1000):
+    """
+    MinHash signatures of the character shingles of normalised answers, one row per text.
+
+    The shingle hashes of a batch of texts are permuted in one array operation
+    and reduced per text with `np.minimum.reduceat`.
+    """
+    signatures = np.empty((len(texts), len(_HASH_A)), dtype=np.uint64)
+    for start in range(0, len(texts), batch_size):
+        hashes = [_shingle_hashes(text) for text in texts[start:start + batch_size]]
+        offsets = np.cumsum([0] + [len(values) for values in hashes[:-1]])
+        flat = np.fromiter((value for values in hashes for value in values), dtype=np.uint64)
+        # (a * x + b) mod p stays below 2**63 for 32-bit shingle hashes and 31-bit coefficients
+        permuted = (_HASH_A * flat[None, :] + _HASH_B) % _PRIME
+        signatures[start:start + len(hashes)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return signatures
+
+
+class _DisjointSet:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+def near_duplicate_groups(texts, threshold=PROMPT_NEAR_DUPLICATE_THRESHOLD):
+    """
+    Group distinct normalised answers that are near-duplicates of each other.
+
+    Candidate pairs come from MinHash LSH buckets and are merged when their
+    estimated Jaccard similarity reaches `threshold`.
+
+    Returns:
+        list: Group number of each text, numbered in order of first appearance.
+    """
+    if threshold >= 1 or len(texts) < 2:
+        return list(range(len(texts)))
+    signatures = minhash_signatures(texts)
+    groups = _DisjointSet(len(texts))
+    for band in range(MINHASH_BANDS):
+        buckets = {}
+        rows = signatures[:, band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        for index, key in enumerate(map(bytes, rows)):
+            buckets.setdefault(key, []).append(index)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # Compare every member of the bucket with its first one in a single vectorised step
+            similarity = (signatures[members[1:]] == signatures[members[0]]).mean(axis=1)
+            for other, value in zip(members[1:], similarity):
+                if value >= threshold:
+                    groups.union(members[0], other)
+    roots = {}
+    return [roots.setdefault(groups.find(index), len(roots)) for index in range(len(texts))]
+
+
+@dataclass
+class Entry:
+    """One distinct answer, standing for `count` answers that were identical or nearly so."""
+    text: str
+    count: int
+    members: set = field(default_factory=set)
+
+    def render(self):
+        return f"{self.text} [x{self.count}]" if self.count > 1 else self.text
+
+
+@dataclass
+class CollapsedList:
+    answers: int
+    non_answers: int
+    distinct: int
+    entries: list
+
+    def to_dict(self):
+        return {
+            "answers": self.answers,
+            "non_answers": self.non_answers,
+            "distinct": self.distinct,
+            "entries": len(self.entries),
+        }
+
+
+def collapse_answers(answers, threshold=PROMPT_NEAR_DUPLICATE_THRESHOLD):
+    """
+    Drop non-answers and merge exact and near-duplicate answers into counted entries.
+
+    Returns:
+        CollapsedList: Entries ordered by how many answers they stand for.
+    """
+    originals = {}
+    counts = Counter()
+    non_answers = 0
+    # Survey answers repeat verbatim a lot, so each distinct raw text is normalised once
+    for text, count in Counter(str(answer).strip() for answer in answers).items():
+        normalized = normalize(text)
+        if is_non_answer(normalized):
+            non_answers += count
+            continue
+        counts[normalized] += count
+        originals.setdefault(normalized, Counter())[text] += count
+
+    distinct = list(counts)
+    entries = {}
+    for normalized, group in zip(distinct, near_duplicate_groups(distinct, threshold)):
+        entry = entries.get(group)
+        if entry is None:
+            entry = entries[group] = Entry(text="", count=0)
+        entry.count += counts[normalized]
+        entry.members.add(normalized)
+
+    for entry in entries.values():
+        # Show the most common spelling of the group, preferring the shorter one on ties
+        spellings = Counter()
+        for normalized in entry.members:
+            spellings.update(originals[normalized])
+        entry.text = min(spellings, key=lambda text: (-spellings[text], len(text), text))
+    ordered = sorted(entries.values(), key=lambda entry: (-entry.count, entry.text))
+    return CollapsedList(
+        answers=len(answers),
+        non_answers=non_answers,
+        distinct=len(distinct),
+        entries=ordered,
+    )
+
+
+@dataclass
+class PromptFeedback:
+    """Feedback lists ready to be placed in a prompt, with what was collapsed or left out."""
+    feedback: dict
+    lists: dict
+    omitted: dict
+    tokens: int
+
+    def report(self):
+        return {
+            "tokens": self.tokens,
+            "lists": {
+                key: {**collapsed.to_dict(), "included": len(self.feedback[key]), "omitted": self.omitted[key]}
+                for key, collapsed in self.lists.items()
+            },
+        }
+
+
+def fit_to_budget(lists, token_budget, selected=None):
+    """
+    Take entries from every list in turn, most frequent first, until the token budget is used up.
+
+    With `selected` (a dict of answer lists, e.g. a representative sample),
+    only the entries containing one of those answers are considered.
+
+    Returns:
+        tuple: (dict of rendered entries per list, dict of omitted entry counts, tokens used,
+        whether entries were left out for lack of budget)
+    """
+    queues = {}
+    for key, collapsed in lists.items():
+        entries = collapsed.entries
+        if selected is not None:
+            chosen = {normalize(answer) for answer in selected.get(key, [])}
+            entries = [entry for entry in entries if entry.members & chosen]
+        queues[key] = list(entries)
+
+    rendered = {key: [] for key in lists}
+    tokens = 0
+    open_lists = [key for key in lists if queues[key]]
+    while open_lists:
+        for key in list(open_lists):
+            text = queues[key][0].render()
+            cost = estimate_tokens(json.dumps(text, ensure_ascii=False))
+            if tokens + cost > token_budget and tokens:
+                open_lists.remove(key)
+                continue
+            rendered[key].append(text)
+            tokens += cost
+            queues[key].pop(0)
+            if not queues[key]:
+                open_lists.remove(key)
+    omitted = {key: len(lists[key].entries) - len(rendered[key]) for key in lists}
+    return rendered, omitted, tokens, any(queues.values())
+
+
+def build_prompt_feedback(feedback_data, token_budget=PROMPT_FEEDBACK_TOKENS, selected=None,
+                          threshold=PROMPT_NEAR_DUPLICATE_THRESHOLD, overflow_budget=None):
+    """
+    Collapse the structured feedback into counted entries that fit `token_budget`.
+
+    Args:
+        feedback_data (dict): Structured feedback, one list of answers per category.
+        token_budget (int): Estimated tokens available for the answers.
+        selected (dict): Answers to restrict the prompt to, per category.
+        threshold (float): Similarity at which answers count as near-duplicates.
+        overflow_budget (int): Larger budget used instead when the entries do
+            not fit `token_budget`, for feedback summarised in several chunks.
+
+    Returns:
+        PromptFeedback: Rendered entries per category plus collapse statistics.
+    """
+    lists = {key: collapse_answers(values or [], threshold) for key, values in feedback_data.items()}
+    rendered, omitted, tokens, truncated = fit_to_budget(lists, token_budget, selected)
+    if truncated and overflow_budget and overflow_budget > token_budget:
+        rendered, omitted, tokens, _ = fit_to_budget(lists, overflow_budget, selected)
+    return PromptFeedback(feedback=rendered, lists=lists, omitted=omitted, tokens=tokens)
+
+
+def render_feedback(feedback):
+    """Compact JSON of the feedback lists as it appears in the prompt."""
+    return json.dumps(feedback, ensure_ascii=False, separators=(",", ":"))
+
+
+def settings_key(token_budget=PROMPT_FEEDBACK_TOKENS, threshold=PROMPT_NEAR_DUPLICATE_THRESHOLD):
+    """Part of the LLM cache key, so changing the prompt settings does not reuse old summaries."""
+    return f"prompt:{token_budget}:{threshold}"
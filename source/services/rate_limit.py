@@ -0,0 +1,67 @@
+import math
+import os
+import threading
+import time
+
+from services.telemetry import RATE_LIMIT_WAIT, span
+
+# API worker processes sharing each quota; the launcher sets it for the workers it starts
+API_WORKERS = max(1, int(os.getenv("API_WORKERS", "1")))
+
+
+class TokenBucket:
+    """
+    Token-bucket limiter that makes callers wait for quota instead of failing.
+
+    Every `acquire` reserves its tokens straight away, letting the balance go
+    negative, and then sleeps until the bucket has refilled past the debt.
+    Callers therefore queue in arrival order, and a request larger than the
+    bucket still goes through once enough time has passed. A rate of zero or
+    less disables the limiter.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, name, limit, burst=None, workers=API_WORKERS):
+        """
+        Limiter for a per-minute quota; by default ten seconds of quota can be used in one burst.
+
+        Every API worker process holds its own bucket, so each gets an even
+        share of the quota and together they stay within it.
+        """
+        limit = limit / max(1, workers)
+        if burst is None:
+            burst = max(1, math.ceil(limit / 6))
+        return cls(name, limit / 60, burst)
+
+    def _reserve(self, amount):
+        """Take `amount` tokens and return how long the caller has to wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self, amount=1):
+        """
+        Block until `amount` tokens are available.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+        wait = self._reserve(amount)
+        if wait > 0:
+            with span("rate_limit_wait", limiter=self.name):
+                time.sleep(wait)
+        RATE_LIMIT_WAIT.observe(wait, limiter=self.name)
+        return wait
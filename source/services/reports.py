@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+from contextlib import closing
+
+from services.charts import BELOW_7, SCORE_DISTRIBUTION, chart_paths, render_charts
+from services.sqlite_store import CACHE_DIR, SQLiteStore, json_default
+from services.telemetry import PAYLOAD_BYTES, record_cache, span
+
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH", os.path.join(CACHE_DIR, "reports.sqlite3"))
+# Number of finished PDFs kept
+REPORT_CACHE_MAX_ITEMS = int(os.getenv("REPORT_CACHE_MAX_ITEMS", "64"))
+# Registered report inputs are forgotten after this many seconds without a download
+REPORT_SOURCE_TTL_SECONDS = int(os.getenv("REPORT_SOURCE_TTL_SECONDS", str(24 * 3600)))
+
+FEEDBACK_REPORT = "feedback"
+RESULTS_REPORT = "results"
+
+# Width of an A4 page minus the default margins, in mm
+_CONTENT_WIDTH = 190
+
+
+def report_id_for(feedback, metrics, sheet_title, wave_number):
+    """Content hash of everything a report is built from."""
+    payload = json.dumps([feedback, metrics, sheet_title, wave_number], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _latin1(text):
+    # The core PDF fonts only cover Latin-1; replace anything else instead of failing the whole report
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(text)).strip("-") or "report"
+
+
+def _new_pdf(title, wave_number):
+    # fpdf is only needed once a report is downloaded, so keep it out of the API's import
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(200, 10, _latin1(title), ln=True, align="C")
+    pdf.cell(200, 10, _latin1(f"Wave Number: {wave_number}"), ln=True, align="C")
+    pdf.ln(10)  # Line break after title
+    return pdf
+
+
+def _section(pdf, heading, lines):
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(200, 10, txt=_latin1(heading), ln=True, align="L")
+    pdf.set_font("Arial", size=12)
+    for line in lines:
+        pdf.multi_cell(0, 10, txt=_latin1(line))
+    pdf.ln(10)
+
+
+def _chart(pdf, heading, png, path, width=_CONTENT_WIDTH - 10):
+    """Place a chart below the cursor, sized from the PNG header so following text never overlaps it."""
+    pixel_width, pixel_height = struct.unpack(">II", png[16:24])
+    height = width * pixel_height / pixel_width
+    if pdf.get_y() + height + 10 > pdf.page_break_trigger:
+        pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(200, 10, _latin1(heading), ln=True, align="L")
+    pdf.image(path, x=10, y=pdf.get_y(), w=width, h=height)
+    pdf.ln(height + 10)
+
+
+def _aspect_lines(items):
+    for item in items or []:
+        if isinstance(item, dict):
+            yield f"{item.get('aspect', '')}: {item.get('explanation', '')}"
+        else:
+            yield str(item)
+
+
+def _to_bytes(pdf):
+    # fpdf 1.x returns the document as a Latin-1 string
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def build_feedback_report(source):
+    """PDF of the summarised positive aspects and improvements of one wave."""
+    feedback = source["feedback"] or {}
+    pdf = _new_pdf(f"Feedback Analysis for {source['sheet_title']}", source["wave_number"])
+    _section(pdf, "Positive Aspects", _aspect_lines(feedback.get("positive_aspects")))
+    _section(pdf, "Improvements Needed Aspects", _aspect_lines(feedback.get("improvements_needed")))
+    return _to_bytes(pdf)
+
+
+def build_results_report(source):
+    """PDF of the NPS metrics and charts of one wave."""
+    metrics = source["metrics"]
+    wave_number = source["wave_number"]
+    pdf = _new_pdf(f"Feedback Result for {source['sheet_title']}", wave_number)
+
+    _section(pdf, "Analysis Overview", [
+        f"Number of Respondents: {metrics['respondents']}",
+        f"Minimum Score: {metrics['minimum_score']}",
+        f"Average Score: {metrics['average_score']}",
+    ])
+    if not metrics["respondents"]:
+        _section(pdf, "NPS Calculation Results", ["No responses were recorded for this wave."])
+        return _to_bytes(pdf)
+    # fpdf 1.x only embeds images from a path, so use the content-addressed chart files
+    names = [SCORE_DISTRIBUTION, BELOW_7]
+    charts = render_charts(metrics["histogram"], wave_number, names)
+    paths = chart_paths(metrics["histogram"], wave_number, names)
+    _chart(pdf, "NPS Feedback Score Distribution", charts[SCORE_DISTRIBUTION], paths[SCORE_DISTRIBUTION])
+
+    _section(pdf, "NPS Calculation Results", [
+        f"Total Responses: {metrics['respondents']}",
+        f"Promoters (%): {metrics['promoters_pct']:.2f}%",
+        f"Passives (%): {metrics['passives_pct']:.2f}%",
+        f"Detractors (%): {metrics['detractors_pct']:.2f}%",
+        f"NPS: {metrics['nps']:.2f}",
+    ])
+    _chart(pdf, "Percentage of Respondents with Scores Below 7", charts[BELOW_7], paths[BELOW_7])
+    return _to_bytes(pdf)
+
+
+REPORT_BUILDERS = {
+    FEEDBACK_REPORT: build_feedback_report,
+    RESULTS_REPORT: build_results_report,
+}
+
+
+def report_filename(kind, source):
+    name = f"{_slug(source['sheet_title'])}-{_slug(source['wave_number'])}"
+    return f"{name}-results.pdf" if kind == RESULTS_REPORT else f"{name}.pdf"
+
+
+class ReportStore(SQLiteStore):
+    """
+    Report inputs registered by extractions, and an LRU of the PDFs built from them.
+
+    Registering is cheap; a PDF is only built the first time it is downloaded,
+    and the report ID is a content hash, so unchanged results reuse the same PDF.
+    Both live in SQLite, so a report registered by one API worker can be
+    downloaded from any other, and a PDF is built once for all of them.
+    """
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS report_sources (
+            report_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            registered_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_pdfs (
+            report_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            pdf BLOB NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (report_id, kind)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_report_pdfs_last_access ON report_pdfs (last_access)",
+    )
+
+    def __init__(self, path=REPORT_STORE_PATH, max_items=REPORT_CACHE_MAX_ITEMS, ttl_seconds=REPORT_SOURCE_TTL_SECONDS):
+        super().__init__(path)
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+
+    def register(self, feedback, metrics, sheet_title, wave_number):
+        """Remember the inputs of a report and return its ID."""
+        report_id = report_id_for(feedback, metrics, sheet_title, wave_number)
+        source = {
+            "feedback": feedback,
+            "metrics": metrics,
+            "sheet_title": sheet_title,
+            "wave_number": wave_number,
+        }
+        with closing(self.connect()) as conn, conn:
+            self._prune(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO report_sources (report_id, source, registered_at) VALUES (?, ?, ?)",
+                (report_id, json.dumps(source, default=json_default), time.time()),
+            )
+        return report_id
+
+    def get_source(self, report_id):
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute("SELECT source FROM report_sources WHERE report_id = ?", (report_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE report_sources SET registered_at = ? WHERE report_id = ?", (time.time(), report_id))
+        return json.loads(row[0])
+
+    def render(self, report_id, kind):
+        """
+        PDF bytes of one report, built on first request.
+
+        Returns:
+            tuple: (pdf_bytes, file_name), or None if the report ID is unknown.
+        """
+        source = self.get_source(report_id)
+        if source is None:
+            return None
+        with closing(self.connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT pdf FROM report_pdfs WHERE report_id = ? AND kind = ?", (report_id, kind)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE report_pdfs SET last_access = ? WHERE report_id = ? AND kind = ?",
+                    (time.time(), report_id, kind),
+                )
+        pdf = None if row is None else bytes(row[0])
+        record_cache("report", pdf is not None)
+        if pdf is None:
+            with span("report_build", kind=kind):
+                pdf = REPORT_BUILDERS[kind](source)
+            PAYLOAD_BYTES.observe(len(pdf), kind=f"{kind}_report")
+            with closing(self.connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO report_pdfs (report_id, kind, pdf, last_access) VALUES (?, ?, ?, ?)",
+                    (report_id, kind, pdf, time.time()),
+                )
+                conn.execute(
+                    "DELETE FROM report_pdfs WHERE rowid NOT IN "
+                    "(SELECT rowid FROM report_pdfs ORDER BY last_access DESC LIMIT ?)",
+                    (self.max_items,),
+                )
+        return pdf, report_filename(kind, source)
+
+    def _prune(self, conn):
+        cutoff = time.time() - self.ttl_seconds
+        conn.execute(
+            "DELETE FROM report_pdfs WHERE report_id IN (SELECT report_id FROM report_sources WHERE registered_at < ?)",
+            (cutoff,),
+        )
+        conn.execute("DELETE FROM report_sources WHERE registered_at < ?", (cutoff,))
+
+
+report_store = ReportStore()
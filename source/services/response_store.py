@@ -0,0 +1,191 @@
+import json
+import os
+from contextlib import closing
+
+import pandas as pd
+
+from services.sheet_cache import SheetSnapshot, split_sheet_key
+from services.sqlite_store import CACHE_DIR, SQLiteStore
+
+RESPONSE_STORE_PATH = os.getenv("RESPONSE_STORE_PATH", os.path.join(CACHE_DIR, "responses.sqlite3"))
+
+
+class ResponseStore(SQLiteStore):
+    """
+    Local copy of the synced survey rows, indexed by (spreadsheet, wave).
+
+    Rows are appended past a per-spreadsheet watermark, like the NPS
+    aggregates, so the Sheets API is only needed for rows added since the last
+    sync. When the sheet cache reports rows edited in place, they are stored
+    again from the first changed one. Snapshots synced earlier than the stored
+    one come from an API worker that is behind and are ignored. A wave is read back through the (sheet_id, wave) index without
+    touching the rest of the sheet, and after a restart the sheet cache is
+    seeded from here instead of downloading the whole sheet again.
+    """
+
+    schema = (
+        """
+        CREATE TABLE IF NOT EXISTS sheet_meta (
+            sheet_id TEXT PRIMARY KEY,
+            title TEXT,
+            header TEXT NOT NULL,
+            header_map TEXT NOT NULL,
+            projection TEXT,
+            wave_header TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            revision TEXT,
+            synced_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            sheet_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            wave TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (sheet_id, row_index)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_responses_sheet_wave ON responses (sheet_id, wave)",
+    )
+
+    def __init__(self, path=RESPONSE_STORE_PATH):
+        super().__init__(path)
+
+    def update_from_snapshot(self, snapshot, wave_header):
+        """
+        Store the snapshot rows past the stored watermark.
+
+        Args:
+            snapshot (SheetSnapshot): Freshly synced sheet snapshot.
+            wave_header (str): Sheet header holding the wave label.
+
+        Returns:
+            int: Number of rows written.
+        """
+        sheet_id = snapshot.key
+        # Read the row count once; the sheet cache may append to the columns concurrently
+        row_count = snapshot.row_count
+        header = list(snapshot.header)
+        projection = None if snapshot.projection is None else list(snapshot.projection)
+        with closing(self.connect()) as conn, conn:
+            # Serialise concurrent writers so a row is never stored twice
+            conn.execute("BEGIN IMMEDIATE")
+            meta = conn.execute(
+                "SELECT header, projection, wave_header, row_count, revision, synced_at FROM sheet_meta "
+                "WHERE sheet_id = ?",
+                (sheet_id,),
+            ).fetchone()
+            last_row = 0
+            if meta is not None:
+                if snapshot.synced_at < meta[5]:
+                    # Another worker stored a newer view of the sheet; this worker's snapshot is behind
+                    return 0
+                same_layout = [json.loads(meta[0]), json.loads(meta[1]), meta[2]] == [header, projection, wave_header]
+                if not same_layout:
+                    # The columns changed; rebuild from scratch
+                    conn.execute("DELETE FROM responses WHERE sheet_id = ?", (sheet_id,))
+                elif row_count < meta[3]:
+                    if snapshot.rewrite_from is None or snapshot.revision == meta[4]:
+                        # Only a reload at a new revision can show the sheet got shorter; otherwise this copy is behind
+                        return 0
+                    # Rows were removed; drop the stored rows from the first changed one and store the rest again
+                    last_row = min(row_count, snapshot.rewrite_from)
+                    conn.execute("DELETE FROM responses WHERE sheet_id = ? AND row_index >= ?", (sheet_id, last_row))
+                else:
+                    last_row = meta[3]
+                    if row_count == last_row and snapshot.revision == meta[4]:
+                        return 0
+                    if snapshot.rewrite_from is not None and snapshot.revision != meta[4]:
+                        # Rows were edited in place; store them again from the first changed one
+                        last_row = min(last_row, snapshot.rewrite_from)
+
+            waves = snapshot.columns.get(wave_header, [])
+            columns = [snapshot.columns[name] for name in header]
+            conn.executemany(
+                "INSERT OR REPLACE INTO responses (sheet_id, row_index, wave, data) VALUES (?, ?, ?, ?)",
+                (
+                    (sheet_id, i, str(waves[i]) if i < len(waves) and waves[i] != "" else None,
+                     json.dumps([values[i] for values in columns]))
+                    for i in range(last_row, row_count)
+                ),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sheet_meta "
+                "(sheet_id, title, header, header_map, projection, wave_header, row_count, revision, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    sheet_id, snapshot.title, json.dumps(header), json.dumps(snapshot.header_map),
+                    json.dumps(projection), wave_header, row_count, snapshot.revision, snapshot.synced_at,
+                ),
+            )
+            return row_count - last_row
+
+    def load_snapshot(self, sheet_id):
+        """
+        Rebuild the sheet snapshot from the stored rows, or None if the sheet was never synced.
+
+        `sheet_id` is the snapshot's key, which names the worksheet when it is not the first one.
+        """
+        with closing(self.connect()) as conn:
+            meta = conn.execute(
+                "SELECT title, header, header_map, projection, row_count, revision, synced_at FROM sheet_meta "
+                "WHERE sheet_id = ?",
+                (sheet_id,),
+            ).fetchone()
+            if meta is None:
+                return None
+            rows = conn.execute(
+                "SELECT data FROM responses WHERE sheet_id = ? ORDER BY row_index",
+                (sheet_id,),
+            ).fetchall()
+        title, header, header_map, projection, row_count, revision, synced_at = meta
+        header = json.loads(header)
+        values = [json.loads(row[0]) for row in rows]
+        columns = {name: [row[i] for row in values] for i, name in enumerate(header)}
+        projection = json.loads(projection)
+        spreadsheet_id, worksheet = split_sheet_key(sheet_id)
+        return SheetSnapshot(
+            spreadsheet_id=spreadsheet_id,
+            worksheet=worksheet,
+            title=title,
+            header=header,
+            header_map=json.loads(header_map),
+            columns=columns,
+            projection=None if projection is None else tuple(projection),
+            row_count=row_count,
+            revision=revision,
+            synced_at=synced_at,
+            # The last full download is at least this old, so a revision change soon triggers another one
+            loaded_at=synced_at,
+        )
+
+    def wave_frame(self, sheet_id, wave):
+        """
+        Rows of one wave through the (sheet_id, wave) index.
+
+        Returns:
+            pd.DataFrame: Matching rows with every stored column, indexed by
+            their position in the sheet; empty if the wave has no rows.
+        """
+        with closing(self.connect()) as conn:
+            meta = conn.execute("SELECT header FROM sheet_meta WHERE sheet_id = ?", (sheet_id,)).fetchone()
+            if meta is None:
+                return pd.DataFrame()
+            rows = conn.execute(
+                "SELECT row_index, data FROM responses WHERE sheet_id = ? AND wave = ? ORDER BY row_index",
+                (sheet_id, str(wave)),
+            ).fetchall()
+        return pd.DataFrame(
+            [json.loads(row[1]) for row in rows],
+            columns=json.loads(meta[0]),
+            index=[row[0] for row in rows],
+        )
+
+    def reset(self, sheet_id):
+        with closing(self.connect()) as conn, conn:
+            conn.execute("DELETE FROM responses WHERE sheet_id = ?", (sheet_id,))
+            conn.execute("DELETE FROM sheet_meta WHERE sheet_id = ?", (sheet_id,))
+
+
+response_store = ResponseStore()
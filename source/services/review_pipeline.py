@@ -0,0 +1,418 @@
+import os
+import re
+import json
+import hashlib
+import uuid
+from dataclasses import dataclass, field, replace
+from urllib.parse import urlparse
+
+import pandas as pd
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+from auth import gsheet_provider
+from routers import feedback_generator
+from routers.feedback_generator import generate_feedback_from_ai
+from services import prompt_builder, text_analysis
+from services.coalescing import SingleFlight
+from services.llm_client import LLM_BACKEND, LLM_MODEL_NAME
+from services.nps_aggregates import nps_aggregates
+from services.nps_metrics import compute_nps_metrics
+from services.reports import report_store
+from services.response_store import response_store
+from services.sheet_cache import sheet_cache, sheet_key
+from services.telemetry import PAYLOAD_BYTES, SHEET_ROWS_PROCESSED, SHEET_ROWS_SYNCED, span
+
+FEEDBACK_COLUMNS = [
+    "engineer_feedback",
+    "program_likings",
+    "topics_learned",
+    "program_improvements",
+    "engineer_improvements",
+]
+
+# Row columns returned unless the client asks for more; the free-text answers are the heavy part
+DEFAULT_ROW_FIELDS = ["wave_number", "recommendation_score"]
+ALL_FIELDS = "all"
+
+# Concurrent requests for the same sheet, or the same sheet, wave and config, share one run
+sheet_syncs = SingleFlight("sheet_sync")
+extractions = SingleFlight("extraction")
+
+
+class Config(BaseModel):
+    json_file: str = "col_keys.json"
+    # Optionally keep the structured feedback of each run as a uniquely named JSON artifact
+    save_artifact: bool = False
+    artifact_dir: str = "../artifacts"
+
+
+@dataclass
+class WaveExtraction:
+    """State handed from one extraction stage to the next."""
+    spreadsheet_id: str
+    wave_number: str
+    config: Config
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # Reuse a sheet snapshot synced less than this many seconds ago
+    max_age: float = None
+    # Projection and page of the rows returned as `cleaned_data`
+    row_fields: list = None
+    row_offset: int = 0
+    row_limit: int = None
+    json_data: dict = None
+    snapshot: object = None
+    filtered_df: pd.DataFrame = None
+    renamed_df: pd.DataFrame = None
+    structured_json: dict = None
+    artifact_path: str = None
+    feedback: dict = None
+    generation_info: dict = None
+
+
+def parse_spreadsheet_id(spreadsheet_url):
+    """Extract the spreadsheet ID from a Google Sheets URL."""
+    parsed_url = urlparse(spreadsheet_url)
+    path_segments = parsed_url.path.split("/")
+
+    # Ensure the path is valid
+    if len(path_segments) > 3 and path_segments[2] == "d" and path_segments[3]:
+        return path_segments[3]
+    raise HTTPException(status_code=400, detail="Invalid Google Sheets URL. Spreadsheet ID not found.")
+
+
+def load_column_keys(json_file):
+    if not os.path.exists(json_file):
+        raise HTTPException(status_code=404, detail="Column keys JSON file not found.")
+
+    with open(json_file, "r") as f:
+        return json.load(f)
+
+
+def header_for(json_data, column):
+    """Sheet header configured for a renamed column such as "recommendation_score"."""
+    for header, name in json_data.items():
+        if name == column:
+            return header
+    raise HTTPException(status_code=400, detail=f"No column is mapped to '{column}' in the column keys JSON file.")
+
+
+def sync_sheet(spreadsheet_id, json_data, max_age=None, worksheet=None):
+    """
+    Sync the cached snapshot of the configured columns and fold new rows into the NPS aggregates.
+
+    Callers arriving while a sync of the same sheet and columns is running get
+    that sync's snapshot instead of contacting the API again. `worksheet`
+    selects a worksheet by title instead of the first one.
+    """
+    snapshot, _ = sheet_syncs.do(
+        (spreadsheet_id, worksheet, tuple(sorted(json_data))),
+        lambda: _sync_sheet(spreadsheet_id, json_data, max_age, worksheet),
+    )
+    return snapshot
+
+
+def _sync_sheet(spreadsheet_id, json_data, max_age, worksheet=None):
+    if sheet_cache.get(spreadsheet_id, worksheet) is None:
+        # After a restart, resume from the local response store instead of downloading the whole sheet
+        stored = response_store.load_snapshot(sheet_key(spreadsheet_id, worksheet))
+        if stored is not None:
+            sheet_cache.seed(stored)
+
+    with span("sheet_sync") as attributes:
+        # Only the configured columns are fetched, and only rows added since the last sync
+        snapshot = sheet_cache.sync(
+            gsheet_provider, spreadsheet_id, columns=list(json_data), max_age=max_age, worksheet=worksheet
+        )
+        wave_header = header_for(json_data, "wave_number")
+        score_header = header_for(json_data, "recommendation_score")
+        new_rows = 0
+        if wave_header in snapshot.columns:
+            new_rows = response_store.update_from_snapshot(snapshot, wave_header)
+        if wave_header in snapshot.columns and score_header in snapshot.columns:
+            nps_aggregates.update_from_snapshot(snapshot, wave_header, score_header)
+        attributes.update(rows=snapshot.row_count, new_rows=new_rows)
+    SHEET_ROWS_SYNCED.inc(new_rows)
+    return snapshot
+
+
+def fetch_wave_rows(extraction):
+    """Stage 1: sync the sheet snapshot and select the rows of the requested wave."""
+    extraction.json_data = load_column_keys(extraction.config.json_file)
+    snapshot = sync_sheet(extraction.spreadsheet_id, extraction.json_data, max_age=extraction.max_age)
+
+    # Check if the "Wave Survey" column exists in the snapshot
+    if 'Wave Survey?' not in snapshot.columns:
+        raise HTTPException(status_code=400, detail="Wave Survey? column not found in the spreadsheet.")
+
+    # Read only the rows of the requested wave through the local store's (sheet, wave) index
+    with span("wave_query") as attributes:
+        filtered_df = response_store.wave_frame(extraction.spreadsheet_id, extraction.wave_number)
+        attributes["rows"] = len(filtered_df)
+    SHEET_ROWS_PROCESSED.inc(len(filtered_df), stage="fetch")
+
+    # If no data for the given wave_number
+    if filtered_df.empty:
+        raise HTTPException(status_code=404, detail=f"No data found for Wave Number: {extraction.wave_number}")
+
+    extraction.snapshot = snapshot
+    extraction.filtered_df = filtered_df
+    return extraction
+
+
+def rename_configured_columns(df, json_data):
+    """Keep the configured columns, rename them and turn empty cells into NA."""
+    # Validate keys in the DataFrame
+    keys = json_data.keys() if isinstance(json_data, dict) else []
+    missing = [key for key in keys if key not in df.columns]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Some keys in the JSON file do not match the DataFrame columns: {', '.join(missing)}",
+        )
+
+    # Filter the data based on the keys in the JSON config
+    filtered_df = df[keys]
+
+    # Rename the columns according to the JSON file
+    renamed_df = filtered_df.rename(columns=dict(json_data))
+
+    # Replace empty strings with NaN
+    renamed_df.replace("", pd.NA, inplace=True)
+    return renamed_df
+
+
+def build_structured_feedback(renamed_df, json_data):
+    """Collect the feedback lists from the rows that answered every configured question."""
+    # Drop rows with NaN values or empty strings in the selected columns
+    cleaned_df = renamed_df.dropna(subset=json_data.values())
+
+    # Create a structured JSON object
+    return {
+        column: cleaned_df[column].tolist() if column in cleaned_df.columns else []
+        for column in FEEDBACK_COLUMNS
+    }
+
+
+def parse_fields(fields, json_data):
+    """
+    Validate a `fields=` projection against the configured columns.
+
+    Args:
+        fields (list): Requested column names; repeated values and comma
+            separated lists are both accepted, and "all" selects every column.
+        json_data (dict): Column keys mapping sheet headers to column names.
+
+    Returns:
+        list: Column names to return, DEFAULT_ROW_FIELDS when none were requested.
+    """
+    available = list(json_data.values())
+    requested = [name.strip() for value in fields or [] for name in value.split(",") if name.strip()]
+    if not requested:
+        return list(DEFAULT_ROW_FIELDS)
+    if requested == [ALL_FIELDS]:
+        return available
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(available)} or '{ALL_FIELDS}'.",
+        )
+    return list(dict.fromkeys(requested))
+
+
+def project_rows(renamed_df, fields, offset=0, limit=None):
+    """
+    Select one page of rows and the requested columns.
+
+    Returns:
+        tuple: (page DataFrame with NA turned into None, page info dict).
+    """
+    stop = offset + limit if limit is not None else None
+    page = renamed_df.iloc[offset:stop][fields]
+    page = page.astype(object).where(page.notna(), None)
+    return page, {"total": len(renamed_df), "offset": offset, "limit": limit, "fields": fields}
+
+
+def clean_wave_rows(extraction):
+    """Stage 2: rename the configured columns and build the structured feedback."""
+    with span("clean", rows=len(extraction.filtered_df)):
+        extraction.renamed_df = rename_configured_columns(extraction.filtered_df, extraction.json_data)
+    with span("build_json") as attributes:
+        extraction.structured_json = build_structured_feedback(extraction.renamed_df, extraction.json_data)
+        payload_bytes = len(json.dumps(extraction.structured_json).encode("utf-8"))
+        attributes["payload_bytes"] = payload_bytes
+    SHEET_ROWS_PROCESSED.inc(len(extraction.renamed_df), stage="clean")
+    PAYLOAD_BYTES.observe(payload_bytes, kind="structured_feedback")
+    return extraction
+
+
+def save_feedback_artifact(extraction):
+    """Write the structured feedback to a per-run file so concurrent runs never collide."""
+    os.makedirs(extraction.config.artifact_dir, exist_ok=True)
+    wave_slug = re.sub(r"[^A-Za-z0-9]+", "-", extraction.wave_number).strip("-")
+    file_name = f"reviews_{extraction.spreadsheet_id}_{wave_slug}_{extraction.run_id}.json"
+    path = os.path.join(extraction.config.artifact_dir, file_name)
+    with open(path, "w") as json_file:
+        json.dump(extraction.structured_json, json_file, indent=4)
+    return path
+
+
+def summarize_wave(extraction):
+    """Stage 3: hand the structured feedback to the LLM."""
+    if extraction.config.save_artifact:
+        extraction.artifact_path = save_feedback_artifact(extraction)
+
+    # Generate feedback using AI
+    with span("llm_summarize") as attributes:
+        extraction.feedback, extraction.generation_info = generate_feedback_from_ai(extraction.structured_json)
+        attributes["cache_hit"] = extraction.generation_info["cache"]["hit"]
+    return extraction
+
+
+EXTRACTION_STAGES = [
+    ("fetch", fetch_wave_rows),
+    ("clean", clean_wave_rows),
+    ("generate", summarize_wave),
+]
+
+
+def result_etag(spreadsheet_id, revision, wave_number, config, fields=None, offset=0, limit=None):
+    """
+    Weak ETag of an extraction response, or None when the sheet revision is unknown.
+
+    It covers what the response is derived from: the sheet revision, the wave,
+    the config, the requested page of rows and the summarisation settings. The
+    summary text itself is not hashed; the LLM cache returns the same summary
+    for the same feedback, so the tag is weak rather than byte-exact.
+    """
+    if revision is None:
+        return None
+    key = json.dumps([
+        spreadsheet_id, revision, wave_number, config.model_dump_json(), fields, offset, limit,
+        LLM_BACKEND, LLM_MODEL_NAME, text_analysis.settings_key(), prompt_builder.settings_key(),
+        feedback_generator.settings_key(),
+    ])
+    return f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an `If-None-Match` header matches `etag`, using the weak comparison of RFC 9110."""
+    if not if_none_match or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def etag_headers(etag):
+    """Validator headers of a cacheable result; clients must revalidate before reusing it."""
+    return {"ETag": etag, "Cache-Control": "no-cache"} if etag else {}
+
+
+def current_etag(spreadsheet_url, wave_number, config=None, fields=None, offset=0, limit=None):
+    """
+    ETag the extraction would have right now, at the cost of a sheet revision check.
+
+    When the revision has not moved, the sync does not download any rows.
+    """
+    config = config or Config()
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+    snapshot = sync_sheet(spreadsheet_id, load_column_keys(config.json_file))
+    return result_etag(spreadsheet_id, snapshot.revision, wave_number, config, fields, offset, limit)
+
+
+def build_extraction_response(extraction):
+    renamed_df = extraction.renamed_df
+    aggregate = nps_aggregates.get_wave(extraction.snapshot.key, extraction.wave_number)
+    # The shared aggregates can lag this worker's snapshot; the wave's rows are at hand to compute them
+    metrics = aggregate["metrics"] if aggregate is not None else compute_nps_metrics(renamed_df)
+    wave_number = renamed_df['wave_number'].iloc[0]
+    # PDFs are only built when downloaded from /reports/{report_id}/...
+    report_id = report_store.register(extraction.feedback, metrics, extraction.snapshot.title, wave_number)
+    with span("build_response"):
+        rows, page = project_rows(
+            renamed_df,
+            parse_fields(extraction.row_fields, extraction.json_data),
+            extraction.row_offset,
+            extraction.row_limit,
+        )
+        cleaned_data = rows.to_dict(orient="records")
+    return {
+        "message": "Reviews successfully extracted and saved.",
+        "payload": {
+            "json_file_name": extraction.artifact_path,
+            "feedback_generated": extraction.feedback,
+            "generation": extraction.generation_info
+        },
+        "cleaned_data": cleaned_data,
+        "rows": page,
+        "metrics": metrics,
+        "report_id": report_id,
+        "sheet_title": extraction.snapshot.title,
+        "wave_number": wave_number,
+        "etag": result_etag(
+            extraction.spreadsheet_id,
+            extraction.snapshot.revision,
+            extraction.wave_number,
+            extraction.config,
+            extraction.row_fields,
+            extraction.row_offset,
+            extraction.row_limit,
+        ),
+        "status": status.HTTP_200_OK
+    }
+
+
+def run_extraction(spreadsheet_url, wave_number, config=None, fields=None, offset=0, limit=None):
+    """
+    Run every extraction stage in the calling thread and build the API response.
+
+    Identical extractions (same sheet, wave and config) that run at the same
+    time share one sheet fetch and one LLM call; only the requested page of
+    rows differs between their responses.
+    """
+    config = config or Config()
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+
+    def extract():
+        extraction = WaveExtraction(spreadsheet_id=spreadsheet_id, wave_number=wave_number, config=config)
+        for _, stage in EXTRACTION_STAGES:
+            extraction = stage(extraction)
+        return extraction
+
+    extraction, _ = extractions.do((spreadsheet_id, wave_number, config.model_dump_json()), extract)
+    return build_extraction_response(replace(extraction, row_fields=fields, row_offset=offset, row_limit=limit))
+
+
+def live_wave_metrics(spreadsheet_url, wave_number, max_age=None, config=None):
+    """NPS metrics of one wave served from the incremental aggregates."""
+    config = config or Config()
+    spreadsheet_id = parse_spreadsheet_id(spreadsheet_url)
+    snapshot = sync_sheet(spreadsheet_id, load_column_keys(config.json_file), max_age=max_age)
+    aggregate = nps_aggregates.get_wave(snapshot.key, wave_number)
+    if aggregate is None:
+        raise HTTPException(status_code=404, detail=f"No data found for Wave Number: {wave_number}")
+    return {
+        "sheet_title": snapshot.title,
+        "synced_at": snapshot.synced_at,
+        **aggregate,
+    }
+
+
+def wave_rows(spreadsheet_url, wave_number, fields=None, offset=0, limit=None, max_age=None, config=None):
+    """
+    Projected page of the raw rows of one wave, read from the cached sheet snapshot.
+
+    Returns:
+        tuple: (page DataFrame, page info dict) as returned by `project_rows`.
+    """
+    extraction = fetch_wave_rows(WaveExtraction(
+        spreadsheet_id=parse_spreadsheet_id(spreadsheet_url),
+        wave_number=wave_number,
+        config=config or Config(),
+        max_age=max_age,
+    ))
+    renamed_df = rename_configured_columns(extraction.filtered_df, extraction.json_data)
+    return project_rows(renamed_df, parse_fields(fields, extraction.json_data), offset, limit)
@@ -0,0 +1,297 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from services.telemetry import record_cache
+
+# Rows before the watermark that every incremental sync reads again; any difference means rows were edited or removed
+SHEET_RECONCILE_ROWS = int(os.getenv("SHEET_RECONCILE_ROWS", "50"))
+# A revision change this many seconds after the last full download reloads the whole sheet, catching older edits
+SHEET_FULL_RELOAD_SECONDS = float(os.getenv("SHEET_FULL_RELOAD_SECONDS", "3600"))
+
+
+def sheet_key(spreadsheet_id, worksheet=None):
+    """
+    Key of one worksheet in the caches and stores: the spreadsheet ID for the
+    first worksheet, "<spreadsheet_id>:<worksheet title>" for a named one.
+    """
+    return spreadsheet_id if worksheet is None else f"{spreadsheet_id}:{worksheet}"
+
+
+def split_sheet_key(key):
+    """Inverse of `sheet_key`; spreadsheet IDs never contain a colon."""
+    spreadsheet_id, separator, worksheet = key.partition(":")
+    return spreadsheet_id, worksheet if separator else None
+
+
+@dataclass
+class SheetSnapshot:
+    """Columnar copy of the projected columns of one worksheet, the first one unless `worksheet` names another."""
+    spreadsheet_id: str
+    title: str
+    header: list
+    header_map: dict
+    columns: dict
+    projection: tuple = None
+    row_count: int = 0
+    revision: str = None
+    synced_at: float = field(default_factory=time.time)
+    worksheet: str = None
+    # Time of the last full download of the worksheet
+    loaded_at: float = field(default_factory=time.time)
+    # First row that changed in place in the last fetch, so stored copies from that row on are stale;
+    # None when rows were only appended
+    rewrite_from: int = None
+
+    @property
+    def key(self):
+        return sheet_key(self.spreadsheet_id, self.worksheet)
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns, columns=self.header)
+
+    def filter_rows(self, column, value):
+        """
+        Build a DataFrame holding only the rows where `column` equals `value`.
+
+        Args:
+            column (str): Header of the column to filter on.
+            value: Value the column must match.
+
+        Returns:
+            pd.DataFrame: Matching rows with every cached column.
+        """
+        indices = [i for i, cell in enumerate(self.columns[column]) if cell == value]
+        data = {header: [values[i] for i in indices] for header, values in self.columns.items()}
+        return pd.DataFrame(data, columns=self.header, index=indices)
+
+
+def _column_letter(col):
+    # gspread is imported on first use so importing the API does not load its auth stack
+    from gspread.utils import rowcol_to_a1
+
+    return rowcol_to_a1(1, col).rstrip("0123456789")
+
+
+def _get_revision(spreadsheet):
+    # Drive's modifiedTime changes on every edit, so it works as a cheap revision marker.
+    try:
+        return spreadsheet.get_lastUpdateTime()
+    except Exception:
+        return None
+
+
+def map_headers(header_row, columns=None):
+    """
+    Map header names to their A1 column letters.
+
+    Args:
+        header_row (list): Values of the worksheet's first row.
+        columns (list): Headers to keep; every non-empty header when None.
+
+    Returns:
+        dict: Header name -> column letter, in sheet order.
+    """
+    wanted = None if columns is None else set(columns)
+    return {
+        name: _column_letter(index)
+        for index, name in enumerate(header_row, start=1)
+        if name and (wanted is None or name in wanted)
+    }
+
+
+def _batch_get_columns(spreadsheet, title, ranges):
+    """Fetch several single-column A1 ranges in one values:batchGet call."""
+    from gspread.utils import absolute_range_name
+
+    response = spreadsheet.values_batch_get(
+        [absolute_range_name(title, a1) for a1 in ranges],
+        params={"majorDimension": "COLUMNS"},
+    )
+    # Each range spans one column, so its column-major "values" hold at most one list.
+    return [(value_range.get("values") or [[]])[0] for value_range in response.get("valueRanges", [])]
+
+
+def _pad_columns(column_values):
+    from gspread.utils import numericise_all
+
+    # The API trims trailing blanks per column, so align every column to the longest one.
+    length = max((len(values) for values in column_values), default=0)
+    return [numericise_all(list(values) + [""] * (length - len(values))) for values in column_values], length
+
+
+class SheetCache:
+    """
+    Keeps one projected snapshot per spreadsheet ID and refreshes it incrementally.
+
+    Only the columns named in the projection are downloaded, using a single
+    batched range request. A sync skips the download entirely when the Drive
+    revision has not moved, and otherwise fetches the rows appended after the
+    cached row-count watermark together with the last SHEET_RECONCILE_ROWS
+    rows before it. A changed header row or a difference in those re-read rows
+    forces a full reload, and so does a revision change once the last full
+    download is older than SHEET_FULL_RELOAD_SECONDS, so edits to existing
+    rows are picked up too.
+
+    The opened spreadsheet handle is kept per spreadsheet ID, so a sync costs
+    only the revision lookup; the spreadsheet is opened again only when that
+    lookup fails on the kept handle.
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._spreadsheets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, spreadsheet_id):
+        with self._lock:
+            return self._locks.setdefault(spreadsheet_id, threading.Lock())
+
+    def get(self, spreadsheet_id, worksheet=None):
+        return self._snapshots.get(sheet_key(spreadsheet_id, worksheet))
+
+    def seed(self, snapshot):
+        """Install a snapshot restored from elsewhere unless one is already cached."""
+        with self._lock_for(snapshot.key):
+            return self._snapshots.setdefault(snapshot.key, snapshot)
+
+    def invalidate(self, spreadsheet_id=None, worksheet=None):
+        with self._lock:
+            if spreadsheet_id is None:
+                self._snapshots.clear()
+                self._spreadsheets.clear()
+            else:
+                self._snapshots.pop(sheet_key(spreadsheet_id, worksheet), None)
+                self._spreadsheets.pop(spreadsheet_id, None)
+
+    def sync(self, client, spreadsheet_id, columns=None, max_age=None, worksheet=None):
+        """
+        Bring the cached snapshot of `spreadsheet_id` up to date.
+
+        Args:
+            client: Opens spreadsheets with `open_by_key`, e.g. a gspread
+                client or the `GSheetClientProvider` of the service accounts.
+            spreadsheet_id (str): ID of the spreadsheet to sync.
+            columns (list): Headers to download; every column when None.
+            max_age (float): Serve a snapshot synced less than this many
+                seconds ago without contacting the API at all.
+            worksheet (str): Title of the worksheet to read; the first one when None.
+
+        Returns:
+            SheetSnapshot: The refreshed snapshot.
+        """
+        projection = None if columns is None else tuple(sorted(columns))
+        key = sheet_key(spreadsheet_id, worksheet)
+        with self._lock_for(key):
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.projection != projection:
+                snapshot = None
+            if snapshot is not None and max_age is not None and time.time() - snapshot.synced_at < max_age:
+                record_cache("sheet", True)
+                return snapshot
+
+            spreadsheet, revision = self._open(client, spreadsheet_id)
+
+            if snapshot is not None and revision is not None and snapshot.revision == revision:
+                snapshot.synced_at = time.time()
+                record_cache("sheet", True)
+                return snapshot
+            record_cache("sheet", False)
+
+            sheet = spreadsheet.sheet1 if worksheet is None else spreadsheet.worksheet(worksheet)
+            reload_due = snapshot is not None and time.time() - snapshot.loaded_at >= SHEET_FULL_RELOAD_SECONDS
+            if snapshot is not None and not reload_due and self._append_new_rows(snapshot, spreadsheet, sheet):
+                snapshot.rewrite_from = None
+            else:
+                loaded = self._full_load(spreadsheet_id, spreadsheet, sheet, columns)
+                loaded.rewrite_from = 0 if snapshot is None else _first_difference(snapshot, loaded)
+                snapshot = loaded
+
+            snapshot.title = sheet.title
+            snapshot.worksheet = worksheet
+            snapshot.projection = projection
+            snapshot.revision = revision
+            snapshot.synced_at = time.time()
+            self._snapshots[key] = snapshot
+            return snapshot
+
+    def _open(self, client, spreadsheet_id):
+        """The spreadsheet handle and its revision, reusing the handle of an earlier sync."""
+        spreadsheet = self._spreadsheets.get(spreadsheet_id)
+        if spreadsheet is not None:
+            revision = _get_revision(spreadsheet)
+            if revision is not None:
+                return spreadsheet, revision
+        # First sync, or the kept handle no longer answers (e.g. access was revoked), so open it again
+        spreadsheet = client.open_by_key(spreadsheet_id)
+        self._spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet, _get_revision(spreadsheet)
+
+    def _full_load(self, spreadsheet_id, spreadsheet, worksheet, columns):
+        header_map = map_headers(worksheet.row_values(1), columns)
+        header = list(header_map)
+        column_values, row_count = [], 0
+        if header:
+            ranges = [f"{letter}2:{letter}" for letter in header_map.values()]
+            column_values, row_count = _pad_columns(_batch_get_columns(spreadsheet, worksheet.title, ranges))
+        return SheetSnapshot(
+            spreadsheet_id=spreadsheet_id,
+            title=worksheet.title,
+            header=header,
+            header_map=header_map,
+            columns=dict(zip(header, column_values)),
+            row_count=row_count,
+        )
+
+    def _append_new_rows(self, snapshot, spreadsheet, worksheet):
+        """
+        Fetch rows past the watermark; returns False if a full reload is needed.
+
+        The last SHEET_RECONCILE_ROWS cached rows are fetched again in the same
+        request. If they no longer match, rows were edited or removed, and
+        appending would leave the snapshot wrong.
+        """
+        if not snapshot.header:
+            return False
+
+        # The header cells ride along in the same batch request to detect schema changes.
+        overlap = min(SHEET_RECONCILE_ROWS, snapshot.row_count)
+        first_row = snapshot.row_count - overlap
+        ranges = [f"{letter}1" for letter in snapshot.header_map.values()]
+        ranges += [f"{letter}{first_row + 2}:{letter}" for letter in snapshot.header_map.values()]
+        results = _batch_get_columns(spreadsheet, worksheet.title, ranges)
+
+        width = len(snapshot.header)
+        header = [values[0] if values else "" for values in results[:width]]
+        if header != snapshot.header:
+            return False
+
+        new_columns, fetched_rows = _pad_columns(results[width:])
+        if fetched_rows < overlap:
+            return False
+        for name, values in zip(snapshot.header, new_columns):
+            if values[:overlap] != snapshot.columns[name][first_row:]:
+                return False
+        for name, values in zip(snapshot.header, new_columns):
+            snapshot.columns[name].extend(values[overlap:])
+        snapshot.row_count += fetched_rows - overlap
+        return True
+
+
+def _first_difference(old, new):
+    """Index of the first row where `new` differs from `old`; None when rows were only appended."""
+    if old.header != new.header:
+        return 0
+    first = min(old.row_count, new.row_count)
+    for name in new.header:
+        old_values, new_values = old.columns[name], new.columns[name]
+        if old_values[:first] != new_values[:first]:
+            first = next(i for i in range(first) if old_values[i] != new_values[i])
+    return None if first >= old.row_count else first
+
+
+sheet_cache = SheetCache()
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+# Directory holding the local caches and stores
+CACHE_DIR = os.getenv("CACHE_DIR", "../.cache")
+
+
+def json_default(value):
+    """`json.dumps` fallback for numpy scalars and other values without a JSON form."""
+    item = getattr(value, "item", None)
+    return item() if callable(item) else str(value)
+
+
+class SQLiteStore:
+    """
+    Base class of the small SQLite-backed stores under CACHE_DIR.
+
+    A fresh connection is opened per operation, so a store can be shared
+    between threads and worker processes without extra locking. Subclasses
+    list their CREATE statements in `schema`; they run on first connect.
+    Columns added to a table after its first release go in `added_columns`
+    as (table, column, type), so stores created by older versions are upgraded.
+    """
+
+    schema = ()
+    added_columns = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+                        # WAL lets readers proceed while another process writes
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        for statement in self.schema:
+                            conn.execute(statement)
+                        for table, column, column_type in self.added_columns:
+                            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                            if column not in existing:
+                                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                        conn.commit()
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30)
@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import random
+import threading
+import zlib
+
+from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+# Directory of `<spreadsheet_id>.csv` files served by the stub backend; other IDs get a synthetic sheet
+STUB_SHEETS_DIR = os.getenv("STUB_SHEETS_DIR", "")
+STUB_SHEET_ROWS = int(os.getenv("STUB_SHEET_ROWS", "200"))
+STUB_SHEET_WAVES = int(os.getenv("STUB_SHEET_WAVES", "4"))
+
+# Answer vocabulary of the synthetic free-text columns
+PHRASES = [
+    "mentors are very supportive",
+    "more hands-on projects please",
+    "the pace is too fast",
+    "good coverage of data structures",
+    "need more mock interviews",
+    "doubt sessions are helpful",
+    "spring boot was hard to follow",
+    "nothing",
+    "na",
+    "",
+]
+
+
+def synthetic_columns(headers, rows, waves, seed=0):
+    """
+    Column-major values of a survey sheet, as the Sheets API returns them (all strings).
+
+    Args:
+        headers (list): Header row; the wave and score columns are detected by name.
+        rows (int): Number of data rows.
+        waves (int): Number of distinct "Wave N" labels, spread evenly.
+        seed (int): Random seed, so runs are comparable.
+    """
+    rnd = random.Random(seed)
+    columns = []
+    for header in headers:
+        if header == "Wave Survey?":
+            columns.append([f"Wave {i % waves + 1}" for i in range(rows)])
+        elif header.startswith("How likely"):
+            columns.append([str(rnd.randint(0, 10)) for _ in range(rows)])
+        elif header == "Timestamp":
+            columns.append([f"2024-01-01 00:00:{i % 60:02d}" for i in range(rows)])
+        else:
+            columns.append([rnd.choice(PHRASES) for _ in range(rows)])
+    return columns
+
+
+class StubWorksheet:
+    def __init__(self, title, headers, columns):
+        self.title = title
+        self.id = 0
+        self.headers = headers
+        self.columns = columns
+
+    @property
+    def row_count(self):
+        return len(self.columns[0]) + 1 if self.columns else 1
+
+    def row_values(self, row):
+        if row == 1:
+            return list(self.headers)
+        return [values[row - 2] if row - 2 < len(values) else "" for values in self.columns]
+
+
+class StubSpreadsheet:
+    """In-memory spreadsheet implementing the gspread calls the sheet cache makes."""
+
+    def __init__(self, spreadsheet_id, worksheet):
+        self.id = spreadsheet_id
+        self.title = worksheet.title
+        self.sheet1 = worksheet
+        self.revision = 1
+        self.api_calls = 0
+
+    def get_lastUpdateTime(self):
+        self.api_calls += 1
+        return f"rev-{self.revision}"
+
+    def worksheet(self, title):
+        self.api_calls += 1
+        if title != self.sheet1.title:
+            raise WorksheetNotFound(title)
+        return self.sheet1
+
+    def values_batch_get(self, ranges, params=None):
+        self.api_calls += 1
+        worksheet = self.sheet1
+        value_ranges = []
+        for name in ranges:
+            grid = a1_range_to_grid_range(name.split("!", 1)[-1])
+            column = grid.get("startColumnIndex", 0)
+            start = grid.get("startRowIndex", 0)
+            stop = grid.get("endRowIndex")
+            cells = ([worksheet.headers[column]] + worksheet.columns[column])[start:stop]
+            # Like the API, trailing blank cells are trimmed
+            while cells and cells[-1] == "":
+                cells.pop()
+            value_range = {"range": name, "majorDimension": "COLUMNS"}
+            if cells:
+                value_range["values"] = [cells]
+            value_ranges.append(value_range)
+        return {"valueRanges": value_ranges}
+
+    def append_synthetic_rows(self, rows, waves, seed=1):
+        """Append rows and bump the revision, as a new batch of form responses would."""
+        new_columns = synthetic_columns(self.sheet1.headers, rows, waves, seed)
+        for values, new_values in zip(self.sheet1.columns, new_columns):
+            values.extend(new_values)
+        self.revision += 1
+
+
+class StubGSheetClient:
+    """
+    Local stand-in for the authorised gspread client (SHEETS_BACKEND=stub).
+
+    Serves `<spreadsheet_id>.csv` from `sheets_dir` when it exists, and
+    otherwise a synthetic survey sheet seeded by the spreadsheet ID, so tests,
+    benchmarks and offline runs need no credentials or network.
+    """
+
+    def __init__(self, sheets_dir=STUB_SHEETS_DIR, rows=STUB_SHEET_ROWS, waves=STUB_SHEET_WAVES):
+        self.sheets_dir = sheets_dir
+        self.rows = rows
+        self.waves = waves
+        self.spreadsheets = {}
+        self._lock = threading.Lock()
+
+    def add_sheet(self, spreadsheet_id, headers, rows, waves, title="Synthetic Survey", seed=0):
+        worksheet = StubWorksheet(title, list(headers), synthetic_columns(headers, rows, waves, seed))
+        self.spreadsheets[spreadsheet_id] = StubSpreadsheet(spreadsheet_id, worksheet)
+        return self.spreadsheets[spreadsheet_id]
+
+    def add_csv(self, spreadsheet_id, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        if not rows:
+            raise SpreadsheetNotFound(f"{path} is empty")
+        headers, data = rows[0], rows[1:]
+        columns = [[row[i] if i < len(row) else "" for row in data] for i in range(len(headers))]
+        title = os.path.splitext(os.path.basename(path))[0]
+        self.spreadsheets[spreadsheet_id] = StubSpreadsheet(spreadsheet_id, StubWorksheet(title, headers, columns))
+        return self.spreadsheets[spreadsheet_id]
+
+    def open_by_key(self, spreadsheet_id):
+        with self._lock:
+            return self._open(spreadsheet_id)
+
+    def _open(self, spreadsheet_id):
+        if spreadsheet_id not in self.spreadsheets:
+            path = os.path.join(self.sheets_dir, f"{spreadsheet_id}.csv") if self.sheets_dir else ""
+            if path and os.path.exists(path):
+                self.add_csv(spreadsheet_id, path)
+            else:
+                seed = zlib.crc32(spreadsheet_id.encode("utf-8"))
+                self.add_sheet(spreadsheet_id, survey_headers(), self.rows, self.waves, seed=seed)
+        return self.spreadsheets[spreadsheet_id]
+
+
+def survey_headers(column_keys_file="col_keys.json"):
+    """Header row of a survey sheet: the configured questions plus a few unused columns."""
+    with open(column_keys_file, "r") as f:
+        configured = list(json.load(f))
+    return ["Timestamp", "Email Address"] + configured + ["Any other comments?"]
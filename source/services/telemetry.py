@@ -0,0 +1,321 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bounds (bytes) of the payload size histogram buckets
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+# Directory where every API worker publishes its metrics so /metrics can add them up; unset for a single process
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+# How often (seconds) a worker publishes its metrics to METRICS_DIR
+METRICS_PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", "5"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(float(bound))),), bucket_count))
+                samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+                samples.append((f"{self.name}_sum", key, total))
+                samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def _collect(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return [(metric, metric.samples()) for metric in metrics]
+
+    def export(self):
+        """Samples of every metric by metric name, as JSON-serialisable lists."""
+        return {
+            metric.name: [[name, [list(label) for label in labels], value] for name, labels, value in samples]
+            for metric, samples in self._collect()
+        }
+
+    def render(self, others=()):
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+
+        `others` are `export()`s of other processes; their samples are added to
+        the ones with the same name and labels here, so counters and histogram
+        buckets read as totals across processes.
+        """
+        lines = []
+        for metric, samples in self._collect():
+            totals = {}
+            for name, labels, value in samples:
+                totals[(name, tuple(labels))] = totals.get((name, tuple(labels)), 0) + value
+            for other in others:
+                for name, labels, value in other.get(metric.name, []):
+                    key = (name, tuple(tuple(label) for label in labels))
+                    totals[key] = totals.get(key, 0) + value
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for (name, labels), value in totals.items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsPublisher:
+    """
+    Shares the metrics of one API worker with the others.
+
+    Each uvicorn worker has its own registry and a scrape reaches only one of
+    them. Every worker therefore writes its samples to its own file in
+    `directory`, and the worker answering /metrics adds up all the files.
+    Files of workers that have exited are kept, so counters never go
+    backwards when uvicorn replaces a worker. Without a directory only this
+    process's metrics are rendered.
+    """
+
+    def __init__(self, registry, directory=METRICS_DIR, interval=METRICS_PUBLISH_SECONDS):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        # The start time keeps a reused pid from overwriting the file of an exited worker
+        self.path = os.path.join(directory, f"{os.getpid()}-{time.time_ns()}.json") if directory else None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self):
+        if not self.path:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.registry.export(), f)
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except OSError:
+                pass
+
+    def start(self):
+        if not self.path or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.publish()
+        except OSError:
+            pass
+
+    def render(self):
+        """Metrics of every worker that published to `directory`, added up."""
+        if not self.path:
+            return self.registry.render()
+        others = []
+        for name in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".json") or path == self.path:
+                continue
+            try:
+                with open(path) as f:
+                    others.append(json.load(f))
+            except (OSError, ValueError):
+                # A file being replaced or already removed is skipped for this scrape
+                continue
+        return self.registry.render(others)
+
+
+registry = MetricsRegistry()
+metrics_publisher = MetricsPublisher(registry)
+
+STAGE_DURATION = registry.histogram(
+    "nps_stage_duration_seconds", "Time spent in each pipeline stage.", labels=("stage", "outcome"))
+HTTP_REQUEST_DURATION = registry.histogram(
+    "nps_http_request_duration_seconds", "HTTP request latency.", labels=("method", "route", "status"))
+SHEET_ROWS_SYNCED = registry.counter(
+    "nps_sheet_rows_synced_total", "Sheet rows downloaded and stored by syncs.")
+SHEET_ROWS_PROCESSED = registry.counter(
+    "nps_sheet_rows_processed_total", "Sheet rows handed to a pipeline stage.", labels=("stage",))
+PAYLOAD_BYTES = registry.histogram(
+    "nps_payload_bytes", "Size of the payloads built by the pipeline.", labels=("kind",), buckets=SIZE_BUCKETS)
+LLM_REQUEST_DURATION = registry.histogram(
+    "nps_llm_request_duration_seconds", "LLM call latency including retries.", labels=("backend", "model", "outcome"))
+LLM_TOKENS = registry.counter(
+    "nps_llm_tokens_total", "Tokens sent to and received from the LLM.", labels=("backend", "model", "kind"))
+LLM_RETRIES = registry.counter(
+    "nps_llm_retries_total", "LLM call attempts that were retried.", labels=("backend", "model"))
+CACHE_REQUESTS = registry.counter(
+    "nps_cache_requests_total", "Cache lookups by cache and result.", labels=("cache", "result"))
+COALESCED_CALLS = registry.counter(
+    "nps_coalesced_calls_total", "Calls served by an identical call already in flight.", labels=("call",))
+RATE_LIMIT_WAIT = registry.histogram(
+    "nps_rate_limit_wait_seconds", "Time spent queued for external API quota.", labels=("limiter",))
+
+
+class Trace:
+    """Spans recorded while handling one request or job."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_list(self):
+        with self._lock:
+            return [dict(span) for span in self.spans]
+
+    def totals(self):
+        """Total milliseconds per span name, in first-seen order."""
+        totals = {}
+        for span in self.to_list():
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return totals
+
+
+_current_trace = contextvars.ContextVar("nps_trace", default=None)
+
+
+@contextmanager
+def start_trace():
+    """Collect the spans of the enclosed block, including `asyncio.to_thread` work started from it."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a pipeline stage.
+
+    The duration is recorded in `nps_stage_duration_seconds` and, inside
+    `start_trace()`, added to the trace together with `attributes`. The body
+    can add attributes known only at the end through the yielded dict.
+    """
+    started = time.perf_counter()
+    attributes = dict(attributes)
+    outcome = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_DURATION.observe(duration, stage=name, outcome=outcome)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add({"name": name, "duration_ms": round(duration * 1000, 3), "outcome": outcome, **attributes})
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_call(backend, model, latency_ms, prompt_tokens=0, output_tokens=0, attempts=1, outcome="ok"):
+    LLM_REQUEST_DURATION.observe(latency_ms / 1000, backend=backend, model=model, outcome=outcome)
+    LLM_TOKENS.inc(prompt_tokens, backend=backend, model=model, kind="prompt")
+    LLM_TOKENS.inc(output_tokens, backend=backend, model=model, kind="output")
+    if attempts > 1:
+        LLM_RETRIES.inc(attempts - 1, backend=backend, model=model)
+
+
+def server_timing(trace):
+    """`Server-Timing` header value summarising a trace."""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in trace.totals().items())
@@ -0,0 +1,297 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from services.prompt_builder import is_non_answer, normalize
+
+# Feedback lists longer than this are sampled down to a representative subset before the LLM call
+PREANALYSIS_MAX_COMMENTS = int(os.getenv("PREANALYSIS_MAX_COMMENTS", "40"))
+# Number of recurring themes reported per feedback list
+PREANALYSIS_THEMES = int(os.getenv("PREANALYSIS_THEMES", "10"))
+# Sentiment is scored in worker processes once a wave has this many distinct comments
+PREANALYSIS_PARALLEL_MIN_COMMENTS = int(os.getenv("PREANALYSIS_PARALLEL_MIN_COMMENTS", "5000"))
+# Every API worker process starts its own pool, so by default they share the CPUs between them
+_API_WORKERS = max(1, int(os.getenv("API_WORKERS", "1")))
+PREANALYSIS_WORKERS = int(os.getenv("PREANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 1) // _API_WORKERS))))
+
+POSITIVE = "positive"
+NEUTRAL = "neutral"
+NEGATIVE = "negative"
+# TextBlob polarity runs from -1 to 1; answers within this distance of 0 count as neutral
+NEUTRAL_POLARITY = 0.1
+
+_TOKEN = re.compile(r"[a-z][a-z'+#]*")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my myself no nor not of off on once only or other
+our ours out over own same she should so some such than that the their them then there these they this
+those through to too under until up very was we were what when where which while who whom why will with
+would you your yours
+""".split()) - {"more", "not", "no", "too", "very"}
+# Kept as tokens for phrases such as "too fast" or "need more", but never reported as a theme on their own
+MODIFIERS = frozenset({"more", "not", "no", "too", "very", "need", "needs"})
+
+
+def tokenize(text):
+    """Lower-cased words of `text` without stopwords."""
+    return [token for token in _TOKEN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+def terms(tokens):
+    """Distinct unigrams and bigrams of a token list."""
+    return set(tokens) | {f"{first} {second}" for first, second in zip(tokens, tokens[1:])}
+
+
+@lru_cache(maxsize=1)
+def _sentiment_analyzer():
+    # TextBlob pulls in NLTK, so it is only imported once a large wave is analysed
+    from textblob.en.sentiments import PatternAnalyzer
+    return PatternAnalyzer()
+
+
+def polarities(texts):
+    """TextBlob polarity of each text; runs in the worker processes for large batches."""
+    analyzer = _sentiment_analyzer()
+    return [analyzer.analyze(text).polarity for text in texts]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Forking a process that runs request threads can copy held locks, so start clean workers
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the sentiment worker processes, if any were started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def score_sentiment(texts, workers=PREANALYSIS_WORKERS, parallel_min=PREANALYSIS_PARALLEL_MIN_COMMENTS):
+    """
+    Polarity of every text, scoring each distinct text once.
+
+    Batches of distinct texts are spread across a process pool when there are
+    at least `parallel_min` of them and more than one worker.
+    """
+    unique = list(dict.fromkeys(texts))
+    if workers > 1 and len(unique) >= parallel_min:
+        size = math.ceil(len(unique) / (workers * 4))
+        batches = [unique[start:start + size] for start in range(0, len(unique), size)]
+        scores = [score for batch in _process_pool(workers).map(polarities, batches) for score in batch]
+    else:
+        scores = polarities(unique)
+    lookup = dict(zip(unique, scores))
+    return [lookup[text] for text in texts]
+
+
+def sentiment_label(polarity):
+    if polarity > NEUTRAL_POLARITY:
+        return POSITIVE
+    if polarity < -NEUTRAL_POLARITY:
+        return NEGATIVE
+    return NEUTRAL
+
+
+@dataclass
+class ListAnalysis:
+    """Sentiment, themes and the selected subset of one feedback list."""
+    comments: int
+    selected: list
+    sentiment: dict = field(default_factory=dict)
+    themes: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "comments": self.comments,
+            "kept": len(self.selected),
+            "dropped": self.comments - len(self.selected),
+            "sentiment": self.sentiment,
+            "themes": self.themes,
+        }
+
+
+def rank_themes(term_sets, limit):
+    """
+    Recurring unigrams and bigrams with the number of comments mentioning them.
+
+    A unigram is left out when one of its bigrams covers nearly all of its
+    mentions, so "mock interviews" is reported instead of both words.
+    """
+    document_frequency = Counter(term for term_set in term_sets for term in term_set)
+    recurring = [
+        (term, count) for term, count in document_frequency.items()
+        if count > 1 and term not in MODIFIERS and term.rsplit(" ", 1)[-1] not in MODIFIERS
+    ]
+    bigram_counts = Counter()
+    for term, count in recurring:
+        if " " in term:
+            for word in term.split(" "):
+                bigram_counts[word] = max(bigram_counts[word], count)
+    themes = [
+        (term, count) for term, count in recurring
+        if " " in term or bigram_counts[term] < 0.8 * count
+    ]
+    themes.sort(key=lambda item: (-item[1], item[0]))
+    return [{"theme": term, "count": count} for term, count in themes[:limit]], document_frequency
+
+
+def representativeness(term_sets, document_frequency):
+    """
+    TF-IDF cosine similarity of each comment to the centroid of its list.
+
+    Comments sharing many of the list's common but not ubiquitous terms
+    score highest; empty and stopword-only comments score 0.
+    """
+    total = len(term_sets)
+    idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in document_frequency.items()}
+    # Each comment's vector holds idf[t] for its terms, so the centroid weight of t is df * idf / total
+    centroid = {term: count * idf[term] / total for term, count in document_frequency.items()}
+    scores = []
+    for term_set in term_sets:
+        norm = math.sqrt(sum(idf[term] ** 2 for term in term_set))
+        scores.append(sum(idf[term] * centroid[term] for term in term_set) / norm if norm else 0.0)
+    return scores
+
+
+def select_balanced(indices_by_label, scores, term_sets, limit):
+    """
+    Pick up to `limit` comments, sharing the slots evenly between sentiment labels.
+
+    Within a label comments are taken in order of representativeness, and a
+    comment adding no term beyond those already picked is skipped while
+    others remain, so the subset covers the list instead of one repeated answer.
+    """
+    queues = {}
+    for label, indices in indices_by_label.items():
+        ranked = sorted(indices, key=lambda i: -scores[i])
+        novel, repeats, covered = [], [], set()
+        for i in ranked:
+            if term_sets[i] - covered:
+                novel.append(i)
+                covered |= term_sets[i]
+            else:
+                repeats.append(i)
+        queues[label] = novel + repeats
+
+    selected = []
+    while len(selected) < limit and any(queues.values()):
+        for label in (NEGATIVE, POSITIVE, NEUTRAL):
+            if queues.get(label) and len(selected) < limit:
+                selected.append(queues[label].pop(0))
+    return sorted(selected)
+
+
+def analyze_list(comments, polarity, max_comments, theme_limit):
+    texts = [str(comment).strip() for comment in comments]
+    term_sets = [terms(tokenize(text)) for text in texts]
+    themes, document_frequency = rank_themes(term_sets, theme_limit)
+    labels = [sentiment_label(value) for value in polarity]
+    indices_by_label = {}
+    for i, label in enumerate(labels):
+        indices_by_label.setdefault(label, []).append(i)
+
+    if len(comments) > max_comments:
+        scores = representativeness(term_sets, document_frequency)
+        # Repeated answers are already reflected in the theme counts, so only distinct ones are candidates
+        first_seen = {}
+        for i, text in enumerate(texts):
+            first_seen.setdefault(" ".join(text.lower().split()), i)
+        distinct = set(first_seen.values())
+        candidates = {label: [i for i in indices if i in distinct] for label, indices in indices_by_label.items()}
+        selected = [comments[i] for i in select_balanced(candidates, scores, term_sets, max_comments)]
+    else:
+        selected = list(comments)
+    sentiment = {label: len(indices_by_label.get(label, [])) for label in (POSITIVE, NEUTRAL, NEGATIVE)}
+    return ListAnalysis(comments=len(comments), selected=selected, sentiment=sentiment, themes=themes)
+
+
+@dataclass
+class FeedbackAnalysis:
+    """Result of the local pre-analysis of one wave's structured feedback."""
+    feedback: dict
+    lists: dict
+    applied: bool
+
+    def statistics(self):
+        """Per-list sentiment and themes over every answer, for the prompt."""
+        return {
+            key: {"answers": analysis.comments, "sentiment": analysis.sentiment, "themes": analysis.themes}
+            for key, analysis in self.lists.items()
+        }
+
+    def report(self):
+        """Kept and dropped comment counts, overall and per list, for the API response."""
+        comments = sum(analysis.comments for analysis in self.lists.values())
+        kept = sum(len(analysis.selected) for analysis in self.lists.values())
+        return {
+            "applied": self.applied,
+            "comments": comments,
+            "kept": kept,
+            "dropped": comments - kept,
+            "lists": {key: analysis.to_dict() for key, analysis in self.lists.items()},
+        }
+
+
+def analyze_feedback(feedback_data, max_comments=PREANALYSIS_MAX_COMMENTS, theme_limit=PREANALYSIS_THEMES):
+    """
+    Score, theme and sample the structured feedback before it is summarised.
+
+    Non-answers such as "NA" or "nothing" are not counted. Waves whose lists
+    all fit within `max_comments` are passed through untouched. Otherwise every comment is scored for sentiment in one batch,
+    and each list is cut to a sentiment-balanced, representative subset.
+
+    Args:
+        feedback_data (dict): Structured feedback, one list per category.
+        max_comments (int): Comments kept per list.
+        theme_limit (int): Themes reported per list.
+
+    Returns:
+        FeedbackAnalysis: The feedback to prompt with, plus per-list statistics.
+    """
+    lists = {
+        key: [item for item in (values or []) if not is_non_answer(normalize(item))]
+        for key, values in feedback_data.items()
+    }
+    if all(len(values) <= max_comments for values in lists.values()):
+        return FeedbackAnalysis(
+            feedback=feedback_data,
+            lists={key: ListAnalysis(comments=len(values), selected=values) for key, values in lists.items()},
+            applied=False,
+        )
+
+    # One batch over every list, so the process pool is only used once per wave
+    flat = [str(item).strip() for values in lists.values() for item in values]
+    scores = score_sentiment(flat)
+    analyses, start = {}, 0
+    for key, values in lists.items():
+        analyses[key] = analyze_list(values, scores[start:start + len(values)], max_comments, theme_limit)
+        start += len(values)
+    return FeedbackAnalysis(
+        feedback={key: analysis.selected for key, analysis in analyses.items()},
+        lists=analyses,
+        applied=True,
+    )
+
+
+def settings_key(max_comments=PREANALYSIS_MAX_COMMENTS, theme_limit=PREANALYSIS_THEMES):
+    """Part of the LLM cache key, so changing the sampling settings does not reuse old summaries."""
+    return f"preanalysis:{max_comments}:{theme_limit}"
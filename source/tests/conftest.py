@@ -0,0 +1,64 @@
+"""
+Shared fixtures. The suite runs offline against the stub Sheets and LLM backends:
+
+    cd source
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings are read when the modules are imported, so they are fixed before anything is imported
+os.environ["SHEETS_BACKEND"] = "stub"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="nps-tests-")
+os.environ["SCHEDULED_SHEETS_FILE"] = os.path.join(os.environ["CACHE_DIR"], "scheduled_sheets.json")
+os.environ["CHART_CACHE_DIR"] = os.path.join(os.environ["CACHE_DIR"], "charts")
+os.chdir(SOURCE_DIR)
+sys.path.insert(0, SOURCE_DIR)
+
+import pytest  # noqa: E402
+
+from auth import set_gsheet_client  # noqa: E402
+from services.review_pipeline import load_column_keys  # noqa: E402
+from services.stub_sheets import StubGSheetClient  # noqa: E402
+
+
+@pytest.fixture
+def sheets():
+    """A fresh stub Sheets backend: 200 synthetic rows over 4 waves per spreadsheet."""
+    client = StubGSheetClient(rows=200, waves=4)
+    set_gsheet_client(client)
+    return client
+
+
+@pytest.fixture
+def client():
+    """API test client; the app's startup and shutdown run around each test."""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def spreadsheet_id():
+    """A spreadsheet ID no other test uses, so the shared caches and stores start empty for it."""
+    return f"test{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def json_data():
+    return load_column_keys("col_keys.json")
+
+
+def sheet_url(spreadsheet_id):
+    return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/edit"
+
+
+def column_index(spreadsheet, header):
+    return spreadsheet.sheet1.headers.index(header)
@@ -0,0 +1,85 @@
+import pytest
+from gspread.exceptions import SpreadsheetNotFound
+
+from auth import GSheetClientProvider
+from services.errors import http_exception_for
+from services.stub_sheets import StubGSheetClient
+
+
+class SharedWith(StubGSheetClient):
+    """Stub account that can open only the spreadsheets shared with it."""
+
+    def __init__(self, *shared, error=PermissionError):
+        super().__init__(rows=20, waves=2)
+        self.shared = set(shared)
+        self.error = error
+        self.opened = []
+
+    def open_by_key(self, spreadsheet_id):
+        self.opened.append(spreadsheet_id)
+        if spreadsheet_id not in self.shared:
+            raise self.error(spreadsheet_id)
+        return super().open_by_key(spreadsheet_id)
+
+
+def provider(*clients):
+    provider = GSheetClientProvider(backend="stub")
+    provider.set_clients(clients)
+    return provider
+
+
+def test_spreadsheet_is_pinned_to_the_account_it_is_shared_with():
+    unshared, shared = SharedWith(), SharedWith("sheet")
+    accounts = provider(unshared, shared)
+
+    spreadsheets = [accounts.open_by_key("sheet") for _ in range(4)]
+
+    assert all(spreadsheet is shared.spreadsheets["sheet"] for spreadsheet in spreadsheets)
+    assert shared.opened == ["sheet"] * 4
+    # Tried at most once, before the sheet was pinned to the other account
+    assert len(unshared.opened) <= 1
+
+
+def test_not_found_falls_back_to_the_other_accounts():
+    accounts = provider(SharedWith(error=SpreadsheetNotFound), SharedWith("sheet"), SharedWith())
+
+    assert accounts.open_by_key("sheet").id == "sheet"
+
+
+def test_new_spreadsheets_are_spread_over_the_accounts():
+    first, second = SharedWith("a", "b"), SharedWith("a", "b")
+    accounts = provider(first, second)
+
+    accounts.open_by_key("a")
+    accounts.open_by_key("b")
+
+    assert sorted(first.opened + second.opened) == ["a", "b"]
+    assert first.opened != second.opened
+
+
+def test_sheet_shared_with_no_account_is_a_403():
+    accounts = provider(SharedWith(), SharedWith())
+
+    with pytest.raises(PermissionError):
+        accounts.open_by_key("sheet")
+
+
+def test_gspread_permission_error_maps_to_403():
+    from gspread.exceptions import APIError
+
+    class Response:
+        status_code = 403
+        text = ""
+
+        def json(self):
+            return {"error": {"code": 403, "message": "The caller does not have permission", "status": "PERMISSION_DENIED"}}
+
+    try:
+        try:
+            raise APIError(Response())
+        except APIError as e:
+            raise PermissionError from e
+    except PermissionError as error:
+        assert http_exception_for(error).status_code == 403
+    # A local file permission error is not a sharing problem
+    assert http_exception_for(PermissionError("cache dir")).status_code == 500
@@ -0,0 +1,35 @@
+from conftest import sheet_url
+
+from services.batch_analysis import run_batch_analysis
+from services.nps_aggregates import nps_aggregates
+from services.stub_sheets import survey_headers
+
+
+def test_batch_metrics_match_the_aggregates(sheets, spreadsheet_id):
+    result = run_batch_analysis(sheet_url(spreadsheet_id), ["Wave 2", "Wave 1", "Wave 9"])
+
+    assert list(result["waves"]) == ["Wave 2", "Wave 1"]
+    assert result["missing_waves"] == ["Wave 9"]
+    aggregates = nps_aggregates.get_sheet(spreadsheet_id)
+    for wave, analysis in result["waves"].items():
+        assert analysis["metrics"] == aggregates[wave]["metrics"]
+        assert analysis["feedback_generated"]
+
+
+def test_all_waves_in_natural_order(sheets, spreadsheet_id):
+    sheets.add_sheet(spreadsheet_id, survey_headers(), rows=220, waves=11)
+
+    result = run_batch_analysis(sheet_url(spreadsheet_id), ["all"])
+
+    assert [row["wave_number"] for row in result["comparison"]] == [f"Wave {i}" for i in range(1, 12)]
+    assert sum(row["respondents"] for row in result["comparison"]) == 220
+
+
+def test_waves_missing_from_the_aggregates_are_computed(sheets, spreadsheet_id, monkeypatch):
+    expected = run_batch_analysis(sheet_url(spreadsheet_id), ["Wave 3"])["waves"]["Wave 3"]["metrics"]
+    # Another worker rebuilding the shared aggregates may leave them empty for a moment
+    nps_aggregates.reset(spreadsheet_id)
+    monkeypatch.setattr(nps_aggregates, "update_from_snapshot", lambda *args: 0)
+    result = run_batch_analysis(sheet_url(spreadsheet_id), ["Wave 3"])
+
+    assert result["waves"]["Wave 3"]["metrics"] == expected
@@ -0,0 +1,22 @@
+from services.charts import RENDERERS, render_charts
+from services.nps_metrics import metrics_from_histogram
+from services.reports import build_results_report
+
+PNG_SIGNATURE = b"\x89PNG"
+
+
+def test_charts_of_an_empty_wave_are_placeholders():
+    charts = render_charts([0] * 11, "Wave 1")
+
+    assert set(charts) == set(RENDERERS)
+    assert all(png.startswith(PNG_SIGNATURE) for png in charts.values())
+
+
+def test_charts_are_cached_by_histogram():
+    histogram = [0, 1, 0, 2, 0, 3, 0, 4, 5, 6, 7]
+    assert render_charts(histogram, "Wave 2") == render_charts(histogram, "Wave 2")
+
+
+def test_results_report_of_an_empty_wave():
+    source = {"metrics": metrics_from_histogram([0] * 11), "wave_number": "Wave 1", "sheet_title": "Cohort"}
+    assert build_results_report(source).startswith(b"%PDF")
@@ -0,0 +1,67 @@
+from conftest import sheet_url
+
+
+def extract(client, spreadsheet_id, etag=None, **params):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(
+        "/extract-reviews/",
+        params={"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 1", **params},
+        headers=headers,
+    )
+
+
+def test_unchanged_sheet_revalidates_with_304(sheets, spreadsheet_id, client):
+    first = extract(client, spreadsheet_id)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.json()["etag"] == etag
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    revalidated = extract(client, spreadsheet_id, etag)
+
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+
+
+def test_changed_sheet_gets_a_new_etag(sheets, spreadsheet_id, client):
+    etag = extract(client, spreadsheet_id).headers["ETag"]
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(8, waves=4)
+
+    response = extract(client, spreadsheet_id, etag)
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["metrics"]["respondents"] == 52
+
+
+def test_etag_covers_the_requested_page(sheets, spreadsheet_id, client):
+    etag = extract(client, spreadsheet_id).headers["ETag"]
+
+    response = extract(client, spreadsheet_id, etag, limit=5)
+
+    assert response.status_code == 200
+    assert len(response.json()["cleaned_data"]) == 5
+    assert extract(client, spreadsheet_id, response.headers["ETag"], limit=5).status_code == 304
+
+
+def test_weak_and_listed_etags_match(sheets, spreadsheet_id, client):
+    etag = extract(client, spreadsheet_id).headers["ETag"]
+
+    assert extract(client, spreadsheet_id, f'"other", {etag.removeprefix("W/")}').status_code == 304
+    assert extract(client, spreadsheet_id, "*").status_code == 304
+
+
+def test_etag_endpoint_revalidates_without_extracting(sheets, spreadsheet_id, client, monkeypatch):
+    etag = extract(client, spreadsheet_id).headers["ETag"]
+    params = {"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 1"}
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("the pipeline must not run")
+
+    monkeypatch.setattr("routers.extract_reviews.run_extraction", no_extraction)
+
+    assert client.get("/extract-reviews/etag", params=params, headers={"If-None-Match": etag}).status_code == 304
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(4, waves=4)
+    response = client.get("/extract-reviews/etag", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["etag"] == response.headers["ETag"] != etag
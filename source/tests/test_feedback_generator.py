@@ -0,0 +1,110 @@
+import random
+
+from routers.feedback_generator import (
+    CHUNK_MAX_CHUNKS,
+    CHUNK_THRESHOLD_TOKENS,
+    CHUNK_TOKEN_BUDGET,
+    build_prompt,
+    generate_feedback_from_ai,
+    feedback_reduce_prompt,
+    payload_tokens,
+    split_feedback_into_chunks,
+    summarize_feedback,
+)
+from services import prompt_builder
+from services.llm_client import StubLLMClient
+
+REDUCE_MARKER = feedback_reduce_prompt.strip().splitlines()[0]
+
+
+class RecordingClient(StubLLMClient):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.prompts = []
+
+    def _call(self, prompt):
+        self.prompts.append(prompt)
+        return super()._call(prompt)
+
+
+WORDS = ("practice", "mentor", "sessions", "projects", "pace", "doubts", "assignments", "labs", "recordings",
+         "examples", "feedback", "schedule", "java", "testing", "deployment", "interviews", "clarity", "support")
+
+
+def wave_feedback(answers, seed=0):
+    """Distinct answers, so the prompt builder cannot collapse them."""
+    rng = random.Random(seed)
+    return {
+        key: [" ".join(rng.choices(WORDS, k=8)) + f" {i}" for i in range(answers)]
+        for key in ("engineer_feedback", "program_likings", "program_improvements")
+    }
+
+
+def test_small_payload_is_one_prompt():
+    client = RecordingClient()
+
+    feedback, info = summarize_feedback(wave_feedback(5), client)
+
+    assert info["mode"] == "single" and info["chunks"] == 1 and info["llm_calls"] == 1
+    assert len(feedback["positive_aspects"]) == 5
+
+
+def test_wave_that_fits_one_prompt_is_not_chunked():
+    prompt = build_prompt(wave_feedback(50))
+    assert payload_tokens(prompt.feedback) <= CHUNK_THRESHOLD_TOKENS
+
+    _, info = summarize_feedback(prompt.feedback, RecordingClient())
+
+    assert info["mode"] == "single"
+
+
+def test_large_wave_is_map_reduced_with_the_default_settings():
+    prompt = build_prompt(wave_feedback(600))
+    # Answers beyond one prompt's budget are kept for the chunks instead of being dropped
+    assert payload_tokens(prompt.feedback) > prompt_builder.PROMPT_FEEDBACK_TOKENS
+    assert payload_tokens(prompt.feedback) <= CHUNK_TOKEN_BUDGET * CHUNK_MAX_CHUNKS
+    client = RecordingClient()
+
+    feedback, info = summarize_feedback(prompt.feedback, client)
+
+    assert info["mode"] == "chunked" and info["chunks"] >= 3
+    assert info["llm_calls"] == info["chunks"] + 1
+    # Every chunk is summarised before the partial analyses are merged in one last call
+    assert [REDUCE_MARKER in prompt for prompt in client.prompts] == [False] * info["chunks"] + [True]
+    assert "Strength" in client.prompts[-1]
+    assert len(feedback["improvements_needed"]) == 5
+
+
+def test_feedback_beyond_the_chunk_limit_is_cut():
+    prompt = build_prompt(wave_feedback(3000))
+
+    assert payload_tokens(prompt.feedback) <= CHUNK_TOKEN_BUDGET * CHUNK_MAX_CHUNKS
+    assert sum(prompt.omitted.values()) > 0
+
+
+def test_long_answers_of_a_large_wave_are_chunked_end_to_end():
+    rng = random.Random(1)
+    # Long answers, so even the pre-analysis sample does not fit one prompt
+    feedback = {
+        key: [" ".join(rng.choices(WORDS, k=60)) + f" {i}" for i in range(400)]
+        for key in ("engineer_feedback", "program_likings", "program_improvements")
+    }
+    client = RecordingClient()
+
+    _, info = generate_feedback_from_ai(feedback, client)
+
+    assert info["preanalysis"]["applied"] is True
+    assert info["mode"] == "chunked" and info["llm_calls"] == info["chunks"] + 1
+
+
+def test_chunks_stay_within_budget_and_keep_every_answer():
+    feedback = wave_feedback(300)
+
+    chunks = split_feedback_into_chunks(feedback, token_budget=200)
+
+    assert len(chunks) > 1
+    assert all(payload_tokens(chunk) <= 200 for chunk in chunks)
+    # Answers are taken round-robin, so every chunk holds all the categories
+    assert all(all(chunk[key] for key in feedback) for chunk in chunks[:-1])
+    for key, answers in feedback.items():
+        assert [answer for chunk in chunks for answer in chunk[key]] == answers
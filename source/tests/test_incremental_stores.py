@@ -0,0 +1,58 @@
+from conftest import column_index
+
+from services.nps_aggregates import nps_aggregates
+from services.nps_metrics import compute_nps_metrics
+from services.response_store import response_store
+from services.review_pipeline import header_for, rename_configured_columns, sync_sheet
+
+
+def full_recompute(snapshot, json_data):
+    """Metrics per wave computed from scratch over the whole snapshot."""
+    renamed = rename_configured_columns(snapshot.to_frame(), json_data)
+    return compute_nps_metrics(renamed.dropna(subset=["wave_number"]), by="wave_number")
+
+
+def stored_metrics(spreadsheet_id):
+    return {wave: aggregate["metrics"] for wave, aggregate in nps_aggregates.get_sheet(spreadsheet_id).items()}
+
+
+def test_appended_rows_are_folded_into_the_stores(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(37, waves=5)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert snapshot.row_count == 237
+    assert stored_metrics(spreadsheet_id) == full_recompute(snapshot, json_data)
+    assert len(response_store.wave_frame(spreadsheet_id, "Wave 5")) == 7
+    assert response_store.load_snapshot(spreadsheet_id).row_count == 237
+
+
+def test_edited_scores_replace_the_stale_rows(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    wave = column_index(spreadsheet, header_for(json_data, "wave_number"))
+    score = column_index(spreadsheet, header_for(json_data, "recommendation_score"))
+    # An edit close to the end of the sheet, inside the rows re-read on every sync
+    spreadsheet.sheet1.columns[wave][195] = "Wave 9"
+    spreadsheet.sheet1.columns[score][195] = "10"
+    spreadsheet.revision += 1
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert stored_metrics(spreadsheet_id) == full_recompute(snapshot, json_data)
+    assert stored_metrics(spreadsheet_id)["Wave 9"]["promoters"] == 1
+    rows = response_store.wave_frame(spreadsheet_id, "Wave 9")
+    assert len(rows) == 1 and str(rows.iloc[0][header_for(json_data, "recommendation_score")]) == "10"
+    assert sum(len(response_store.wave_frame(spreadsheet_id, f"Wave {i}")) for i in range(1, 5)) == 199
+
+
+def test_wave_query_matches_the_snapshot(sheets, spreadsheet_id, json_data):
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+    frame = snapshot.to_frame()
+    wave_header = header_for(json_data, "wave_number")
+
+    rows = response_store.wave_frame(spreadsheet_id, "Wave 3")
+
+    expected = frame[frame[wave_header] == "Wave 3"].reset_index(drop=True)
+    assert rows.reset_index(drop=True)[list(expected.columns)].equals(expected)
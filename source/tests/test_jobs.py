@@ -0,0 +1,65 @@
+import time
+from contextlib import closing
+
+from conftest import sheet_url
+
+from services.jobs import FAILED, PENDING, RUNNING, JobStore
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_runs_every_stage(sheets, spreadsheet_id, client):
+    response = client.post(
+        "/extract-reviews/jobs", params={"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 1"}
+    )
+    assert response.status_code == 202
+
+    job = wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "succeeded"
+    assert job["stage"] == "generate"
+    assert job["result"]["metrics"]["respondents"] == 50
+    assert {"sheet_sync", "build_response"} <= {span["name"] for span in job["timings"]}
+
+
+def test_job_errors_are_recorded(sheets, spreadsheet_id, client):
+    response = client.post(
+        "/extract-reviews/jobs", params={"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 9"}
+    )
+
+    job = wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "failed"
+    assert job["error"]["status_code"] == 404
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_jobs_of_a_dead_worker_are_failed_and_pruned(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), ttl_seconds=60, stale_seconds=600)
+    pending = store.create({"wave_number": "Wave 1"})
+    running = store.create({"wave_number": "Wave 2"})
+    store.update(running, status=RUNNING)
+    fresh = store.create({"wave_number": "Wave 3"})
+
+    with closing(store.connect()) as conn, conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id IN (?, ?)", (time.time() - 601, pending.id, running.id))
+
+    assert store.get(pending.id).status == FAILED
+    assert store.get(running.id).error["status_code"] == 500
+    assert store.get(fresh.id).status == PENDING
+
+    with closing(store.connect()) as conn, conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE status = ?", (time.time() - 61, FAILED))
+    store.create({"wave_number": "Wave 4"})
+    assert store.get(pending.id) is None and store.get(running.id) is None
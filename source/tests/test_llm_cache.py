@@ -0,0 +1,51 @@
+import uuid
+
+from routers.feedback_generator import generate_feedback_from_ai
+from services.llm_cache import LLMResponseCache, feedback_cache_key
+from services.llm_client import StubLLMClient
+
+
+class CountingClient(StubLLMClient):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.calls = 0
+
+    def _call(self, prompt):
+        self.calls += 1
+        return super()._call(prompt)
+
+
+def test_key_ignores_row_order_and_whitespace():
+    key = feedback_cache_key({"likings": ["good  mentors", "labs"]}, "prompt", "model")
+
+    assert feedback_cache_key({"likings": ["labs", " good mentors"]}, "prompt", "model") == key
+    assert feedback_cache_key({"likings": ["labs"]}, "prompt", "model") != key
+    assert feedback_cache_key({"likings": ["good mentors", "labs"]}, "prompt", "other model") != key
+
+
+def test_repeated_feedback_is_served_from_the_cache():
+    feedback = {"program_likings": [f"hands-on labs {uuid.uuid4().hex}"], "program_improvements": ["more practice"]}
+    client = CountingClient()
+
+    first, first_info = generate_feedback_from_ai(feedback, client)
+    second, second_info = generate_feedback_from_ai(feedback, client)
+
+    assert client.calls == 1
+    assert first_info["cache"]["hit"] is False and second_info["cache"]["hit"] is True
+    assert second_info["mode"] == "cached"
+    assert second == first
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=3600, max_entries=2)
+    cache.put("a", "model", {"summary": "a"})
+    cache.put("b", "model", {"summary": "b"})
+    assert cache.get("a")[0] == {"summary": "a"}
+
+    cache.put("c", "model", {"summary": "c"})
+
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[0] == {"summary": "a"} and cache.get("c")[0] == {"summary": "c"}
+
+    expired = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=-1)
+    assert expired.get("a") == (None, None)
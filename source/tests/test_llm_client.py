@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import pytest
+from google.api_core import exceptions
+
+from services import llm_client
+from services.llm_client import GeminiClient, LLMClient, estimate_tokens
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, amount=1):
+        self.acquired.append(amount)
+        return 0.0
+
+
+class FlakyClient(LLMClient):
+    """Fails `failures` times with `error`, then answers."""
+
+    backend = "flaky"
+    max_retries = 3
+
+    def __init__(self, failures, error=TimeoutError):
+        super().__init__("flaky")
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.request_limiter = RecordingLimiter()
+        self.token_limiter = RecordingLimiter()
+
+    def _call(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("try again")
+        return "answer", 10, 2
+
+    def _is_retryable(self, error):
+        return isinstance(error, TimeoutError)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(llm_client.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_transient_errors_are_retried(sleeps):
+    client = FlakyClient(failures=2)
+
+    response = client.generate("prompt")
+
+    assert response.text == "answer" and response.attempts == 3
+    assert client.calls == 3 and len(sleeps) == 2
+    stats = client.stats.snapshot()
+    assert stats["calls"] == 1 and stats["retries"] == 2 and stats["errors"] == 0
+    assert stats["prompt_tokens"] == 10 and stats["output_tokens"] == 2
+
+
+def test_every_attempt_is_throttled(sleeps):
+    client = FlakyClient(failures=1)
+
+    client.generate("a prompt")
+
+    assert client.request_limiter.acquired == [1, 1]
+    assert client.token_limiter.acquired == [estimate_tokens("a prompt")] * 2
+
+
+def test_retries_stop_after_max_retries(sleeps):
+    client = FlakyClient(failures=10)
+
+    with pytest.raises(TimeoutError):
+        client.generate("prompt")
+
+    assert client.calls == client.max_retries + 1
+    stats = client.stats.snapshot()
+    assert stats["calls"] == 0 and stats["errors"] == 1 and stats["retries"] == client.max_retries
+
+
+def test_non_retryable_errors_are_raised_immediately(sleeps):
+    client = FlakyClient(failures=1, error=ValueError)
+
+    with pytest.raises(ValueError):
+        client.generate("prompt")
+
+    assert client.calls == 1 and sleeps == []
+    assert client.stats.snapshot()["errors"] == 1 and client.stats.snapshot()["retries"] == 0
+
+
+class FlakyModel:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_content(self, prompt, request_options):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        usage = SimpleNamespace(prompt_token_count=7, candidates_token_count=3)
+        return SimpleNamespace(text="summary", usage_metadata=usage)
+
+
+def gemini_client(monkeypatch, errors, **kwargs):
+    import google.generativeai as genai
+
+    model = FlakyModel(errors)
+    monkeypatch.setattr(genai, "configure", lambda **_: None)
+    monkeypatch.setattr(genai, "GenerativeModel", lambda name: model)
+    client = GeminiClient(api_key="test", requests_per_minute=0, tokens_per_minute=0, **kwargs)
+    return client, model
+
+
+def test_gemini_retries_quota_and_server_errors_with_capped_backoff(monkeypatch, sleeps):
+    errors = [exceptions.ResourceExhausted("quota"), exceptions.ServiceUnavailable("down"),
+              exceptions.DeadlineExceeded("slow"), exceptions.InternalServerError("oops")]
+    client, model = gemini_client(monkeypatch, errors, max_retries=4, backoff_base=1, backoff_max=3)
+
+    response = client.generate("prompt")
+
+    assert response.text == "summary" and response.attempts == 5 and model.calls == 5
+    assert (response.prompt_tokens, response.output_tokens) == (7, 3)
+    # Full jitter: attempt n waits up to min(max, base * 2 ** (n - 1))
+    assert [0 <= wait <= limit for wait, limit in zip(sleeps, [1, 2, 3, 3])] == [True] * 4
+    assert client.stats.snapshot()["retries"] == 4
+
+
+def test_gemini_does_not_retry_client_errors(monkeypatch, sleeps):
+    client, model = gemini_client(monkeypatch, [exceptions.InvalidArgument("bad prompt")])
+
+    with pytest.raises(exceptions.InvalidArgument):
+        client.generate("prompt")
+
+    assert model.calls == 1 and sleeps == []
+    assert client.stats.snapshot()["errors"] == 1
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from services.nps_metrics import compute_nps_metrics, metrics_from_histogram, score_histogram
+
+
+def test_metrics_of_a_score_list():
+    metrics = compute_nps_metrics(pd.Series([10, 9, 8, 7, 6, 0, "10", None, "n/a"]))
+
+    assert metrics["respondents"] == 7
+    assert (metrics["promoters"], metrics["passives"], metrics["detractors"]) == (3, 2, 2)
+    assert metrics["nps"] == round(3 / 7 * 100, 2) - round(2 / 7 * 100, 2)
+    assert metrics["minimum_score"] == 0
+    assert metrics["histogram"] == score_histogram([10, 9, 8, 7, 6, 0, 10]).tolist()
+
+
+def test_grouped_metrics_match_per_group_metrics():
+    df = pd.DataFrame({"wave_number": ["Wave 1", "Wave 2", "Wave 1", "Wave 2"], "recommendation_score": [10, 3, 8, 9]})
+
+    grouped = compute_nps_metrics(df, by="wave_number")
+
+    assert grouped["Wave 1"] == compute_nps_metrics(df[df["wave_number"] == "Wave 1"])
+    assert grouped["Wave 2"]["nps"] == 0.0
+
+
+def test_empty_histogram_has_no_scores():
+    metrics = metrics_from_histogram([0] * 11)
+
+    assert metrics["respondents"] == 0
+    assert metrics["average_score"] is None and metrics["minimum_score"] is None
+    assert metrics["nps"] == 0.0
+
+
+def test_invalid_scores_are_dropped_not_clipped():
+    scores = [10, "9", 9.0, 7, 3, -1, 11, 42, 8.5, "6.4", "ten", "", None, float("nan")]
+
+    metrics = compute_nps_metrics(pd.Series(scores, dtype=object))
+
+    # Only 10, "9", 9.0, 7 and 3 are whole scores on the 0..10 scale
+    assert metrics["respondents"] == 5
+    assert metrics["histogram"] == score_histogram([10, 9, 9, 7, 3]).tolist()
+    assert (metrics["promoters"], metrics["passives"], metrics["detractors"]) == (3, 1, 1)
+    assert metrics["minimum_score"] == 3
+
+
+def test_grouped_metrics_drop_invalid_scores():
+    df = pd.DataFrame({
+        "wave_number": ["Wave 1", "Wave 1", "Wave 1", "Wave 2", "Wave 2"],
+        "recommendation_score": [10, 12, "n/a", -3, 0.5],
+    })
+
+    grouped = compute_nps_metrics(df, by="wave_number")
+
+    assert grouped["Wave 1"]["respondents"] == 1 and grouped["Wave 1"]["nps"] == 100.0
+    # A wave without a single valid score is left out, like one without rows
+    assert "Wave 2" not in grouped
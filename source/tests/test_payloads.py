@@ -0,0 +1,94 @@
+import asyncio
+
+import orjson
+from conftest import sheet_url
+
+from routers import extract_reviews
+
+
+def rows(client, spreadsheet_id, **params):
+    return client.get(
+        "/extract-reviews/rows",
+        params={"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 2", **params},
+    )
+
+
+def test_rows_default_to_the_wave_and_score(sheets, spreadsheet_id, client):
+    body = rows(client, spreadsheet_id).json()
+
+    assert body["total"] == 50 and body["offset"] == 0 and body["limit"] is None
+    assert body["fields"] == ["wave_number", "recommendation_score"]
+    assert len(body["rows"]) == 50
+    assert set(body["rows"][0]) == {"wave_number", "recommendation_score"}
+
+
+def test_fields_are_projected(sheets, spreadsheet_id, client, json_data):
+    every = rows(client, spreadsheet_id, fields="all").json()
+    assert every["fields"] == list(json_data.values())
+    assert set(every["rows"][0]) == set(json_data.values())
+
+    # Repeated and comma-separated names are both accepted, duplicates are dropped
+    body = client.get("/extract-reviews/rows", params=[
+        ("spreadsheet_url", sheet_url(spreadsheet_id)), ("wave_number", "Wave 2"),
+        ("fields", "recommendation_score,program_likings"), ("fields", "recommendation_score"),
+    ]).json()
+    assert body["fields"] == ["recommendation_score", "program_likings"]
+
+
+def test_unknown_fields_are_rejected(sheets, spreadsheet_id, client):
+    response = rows(client, spreadsheet_id, fields="recommendation_score,salary")
+
+    assert response.status_code == 400
+    assert "salary" in response.json()["detail"]
+
+
+def test_offset_and_limit_page_the_rows(sheets, spreadsheet_id, client):
+    every = rows(client, spreadsheet_id).json()["rows"]
+
+    page = rows(client, spreadsheet_id, offset=45, limit=10).json()
+
+    assert page["total"] == 50 and page["offset"] == 45 and page["limit"] == 10
+    assert page["rows"] == every[45:]
+    assert rows(client, spreadsheet_id, limit=0).status_code == 422
+
+
+def test_extraction_pages_cleaned_data(sheets, spreadsheet_id, client):
+    params = {"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 2"}
+    every = client.get("/extract-reviews/", params=params).json()
+
+    page = client.get("/extract-reviews/", params={**params, "offset": 10, "limit": 5, "fields": "all"}).json()
+
+    assert every["rows"]["total"] == 50 and len(every["cleaned_data"]) == 50
+    assert len(page["cleaned_data"]) == 5
+    assert [row["recommendation_score"] for row in page["cleaned_data"]] == [
+        row["recommendation_score"] for row in every["cleaned_data"][10:15]
+    ]
+    # The summary does not depend on the page
+    assert page["payload"]["feedback_generated"] == every["payload"]["feedback_generated"]
+
+
+def test_ndjson_streams_one_row_per_line(sheets, spreadsheet_id, client):
+    expected = rows(client, spreadsheet_id, limit=20).json()["rows"]
+
+    response = rows(client, spreadsheet_id, limit=20, format="ndjson")
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["X-Total-Count"] == "50"
+    assert response.text.endswith("\n")
+    assert [orjson.loads(line) for line in response.text.splitlines()] == expected
+    assert rows(client, spreadsheet_id, format="csv").status_code == 422
+
+
+def test_ndjson_is_encoded_in_chunks(sheets, spreadsheet_id, monkeypatch):
+    monkeypatch.setattr(extract_reviews, "NDJSON_CHUNK_ROWS", 7)
+    response = extract_reviews.extract_rows(
+        sheet_url(spreadsheet_id), "Wave 2", fields=None, offset=0, limit=None, format="ndjson",
+    )
+
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(collect())
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [7] * 7 + [1]
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
@@ -0,0 +1,49 @@
+from conftest import sheet_url
+
+from services.portfolio import PortfolioSheet, run_portfolio_analysis
+
+
+def test_rollup_adds_up_the_cohorts(sheets, spreadsheet_id):
+    other_id = f"{spreadsheet_id}b"
+    sheets.open_by_key(other_id).append_synthetic_rows(40, waves=4)
+
+    result = run_portfolio_analysis(
+        [PortfolioSheet(spreadsheet=sheet_url(spreadsheet_id), label="A"), PortfolioSheet(spreadsheet=other_id)],
+        summarize=False,
+    )
+
+    assert result["succeeded"] == 2 and result["failed"] == 0
+    assert [cohort["label"] for cohort in result["cohorts"]] == ["A", "Synthetic Survey"]
+    assert result["rollup"]["metrics"]["respondents"] == 440
+    assert sum(wave["respondents"] for wave in result["rollup"]["waves"]) == 440
+    assert [wave["wave_number"] for wave in result["rollup"]["waves"]] == ["Wave 1", "Wave 2", "Wave 3", "Wave 4"]
+
+
+def test_first_worksheet_by_title_is_counted_once(sheets, spreadsheet_id):
+    result = run_portfolio_analysis(
+        [
+            PortfolioSheet(spreadsheet=spreadsheet_id),
+            PortfolioSheet(spreadsheet=sheet_url(spreadsheet_id), worksheet="Synthetic Survey"),
+        ],
+        summarize=False,
+    )
+
+    assert result["succeeded"] == 1 and len(result["cohorts"]) == 1
+    assert result["rollup"]["metrics"]["respondents"] == 200
+
+
+def test_failed_sheets_are_reported_with_a_label(sheets, spreadsheet_id):
+    result = run_portfolio_analysis(
+        [
+            PortfolioSheet(spreadsheet=spreadsheet_id),
+            PortfolioSheet(spreadsheet="not a spreadsheet"),
+            PortfolioSheet(spreadsheet=spreadsheet_id, worksheet="Missing"),
+        ],
+        summarize=True,
+    )
+
+    assert result["succeeded"] == 1 and result["failed"] == 2
+    failed = [cohort for cohort in result["cohorts"] if cohort["status"] == "failed"]
+    assert [cohort["label"] for cohort in failed] == ["not a spreadsheet", spreadsheet_id]
+    assert result["summary"]["feedback_generated"]
+    assert result["summary"]["report_id"]
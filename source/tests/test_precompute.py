@@ -0,0 +1,110 @@
+import asyncio
+
+from conftest import sheet_url
+
+from services.precompute import (
+    SCHEDULER_LEASE,
+    PrecomputeScheduler,
+    PrecomputeStore,
+    ScheduledSheet,
+    precompute_scheduler,
+)
+
+
+def scheduler(tmp_path, **kwargs):
+    return PrecomputeScheduler(
+        sheets_file=str(tmp_path / "scheduled_sheets.json"),
+        store=PrecomputeStore(str(tmp_path / "precompute.sqlite3")),
+        **kwargs,
+    )
+
+
+def test_only_one_worker_holds_the_lease(tmp_path):
+    first, second = scheduler(tmp_path), scheduler(tmp_path)
+
+    assert first.store.acquire_lease(SCHEDULER_LEASE, first.owner, 60)
+    assert not second.store.acquire_lease(SCHEDULER_LEASE, second.owner, 60)
+    # The holder renews its own lease
+    assert first.store.acquire_lease(SCHEDULER_LEASE, first.owner, 60)
+    assert second.status()["leader"] == first.owner and not second.status()["is_leader"]
+
+    first.store.release_lease(SCHEDULER_LEASE, first.owner)
+    assert second.store.acquire_lease(SCHEDULER_LEASE, second.owner, 60)
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    first, second = scheduler(tmp_path), scheduler(tmp_path)
+
+    assert first.store.acquire_lease(SCHEDULER_LEASE, first.owner, -1)
+    assert second.store.acquire_lease(SCHEDULER_LEASE, second.owner, 60)
+    assert not first.store.acquire_lease(SCHEDULER_LEASE, first.owner, 60)
+
+
+def test_lease_is_renewed_after_every_sheet(tmp_path, monkeypatch):
+    worker = scheduler(tmp_path, concurrency=1, lease_seconds=60)
+    expiries = []
+    monkeypatch.setattr(
+        worker, "refresh_sheet",
+        lambda sheet: expiries.append(worker.store.lease(SCHEDULER_LEASE)["expires_at"]) or {"sheet": sheet},
+    )
+    monkeypatch.setattr("services.precompute.load_scheduled_sheets", lambda path: ["a", "b", "c"])
+    worker.store.acquire_lease(SCHEDULER_LEASE, worker.owner, 60)
+
+    results = asyncio.run(worker.run_once())
+
+    assert [result["sheet"] for result in results] == ["a", "b", "c"]
+    assert expiries == sorted(expiries) and len(set(expiries)) == 3
+    assert worker.store.lease(SCHEDULER_LEASE)["last_pass_at"] is not None
+
+
+def test_pass_stops_once_the_lease_is_taken_over(tmp_path, monkeypatch):
+    worker, other = scheduler(tmp_path, concurrency=1), scheduler(tmp_path)
+    refreshed = []
+
+    def refresh_sheet(sheet):
+        refreshed.append(sheet)
+        # Another worker takes over while this one is still busy with the first sheet
+        worker.store.release_lease(SCHEDULER_LEASE, worker.owner)
+        other.store.acquire_lease(SCHEDULER_LEASE, other.owner, 60)
+        return {"sheet": sheet}
+
+    monkeypatch.setattr(worker, "refresh_sheet", refresh_sheet)
+    monkeypatch.setattr("services.precompute.load_scheduled_sheets", lambda path: ["a", "b", "c"])
+    worker.store.acquire_lease(SCHEDULER_LEASE, worker.owner, 60)
+
+    results = asyncio.run(worker.run_once())
+
+    assert refreshed == ["a"] and results == [{"sheet": "a"}]
+    assert worker.store.lease(SCHEDULER_LEASE)["owner"] == other.owner
+    assert worker.store.lease(SCHEDULER_LEASE)["last_pass_at"] is None
+
+
+def test_unchanged_sheet_is_skipped(sheets, spreadsheet_id, tmp_path):
+    worker = scheduler(tmp_path)
+    sheet = ScheduledSheet(spreadsheet_url=sheet_url(spreadsheet_id), waves=["Wave 1"])
+
+    first = worker.refresh_sheet(sheet)
+    assert first["error"] is None and not first["skipped"]
+    assert first["waves"]["Wave 1"]["status"] == "ok"
+
+    second = worker.refresh_sheet(sheet)
+    assert second["skipped"] and second["revision"] == first["revision"]
+
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(4, waves=4)
+    third = worker.refresh_sheet(sheet)
+    assert not third["skipped"] and third["revision"] != first["revision"]
+    assert worker.get_result(spreadsheet_id, "Wave 1")["metrics"]["respondents"] == 51
+
+
+def test_precomputed_results_revalidate_with_304(sheets, spreadsheet_id, client):
+    params = {"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 2"}
+    assert client.get("/precompute/results", params=params).status_code == 404
+
+    precompute_scheduler.refresh_sheet(ScheduledSheet(spreadsheet_url=sheet_url(spreadsheet_id), waves=["Wave 2"]))
+    response = client.get("/precompute/results", params=params)
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200 and response.json()["etag"] == etag
+    revalidated = client.get("/precompute/results", params=params, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert client.get("/precompute/results", params=params, headers={"If-None-Match": '"other"'}).status_code == 200
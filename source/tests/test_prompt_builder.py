@@ -0,0 +1,51 @@
+import hashlib
+
+from services.prompt_builder import build_prompt_feedback, collapse_answers, near_duplicate_groups, normalize
+
+
+def test_normalize_folds_case_spacing_and_punctuation():
+    assert normalize("  More   PRACTICE!!! ") == "more practice"
+    assert normalize("ｍｏｒｅ practice...") == "more practice"
+
+
+def test_exact_and_near_duplicates_collapse_into_counted_entries():
+    answers = (
+        ["More practice sessions"] * 5
+        + ["more practice sessions!!", "More  practice session", "MORE PRACTICE SESSIONS"]
+        + ["The trainer explained recursion very clearly"] * 2
+        + ["NA", "nothing", "-", ""]
+    )
+
+    collapsed = collapse_answers(answers)
+
+    assert collapsed.answers == 14
+    assert collapsed.non_answers == 4
+    assert [(entry.text, entry.count) for entry in collapsed.entries] == [
+        ("More practice sessions", 8),
+        ("The trainer explained recursion very clearly", 2),
+    ]
+    assert collapsed.entries[0].render() == "More practice sessions [x8]"
+
+
+def test_different_answers_stay_apart():
+    texts = ["more practice sessions", "fewer theory lectures", "better lab machines"]
+    assert near_duplicate_groups(texts) == [0, 1, 2]
+    assert near_duplicate_groups(texts, threshold=1) == [0, 1, 2]
+
+
+def test_prompt_keeps_the_most_frequent_entries_within_budget():
+    # Unrelated one-off answers, so none of them collapse
+    one_offs = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(200)]
+    feedback = {
+        "program_improvements": ["more practice"] * 30 + one_offs,
+        "program_likings": ["friendly mentors"] * 10 + ["nothing"] * 50,
+    }
+
+    prompt = build_prompt_feedback(feedback, token_budget=100)
+
+    assert prompt.tokens <= 100
+    assert prompt.feedback["program_improvements"][0] == "more practice [x30]"
+    assert prompt.feedback["program_likings"] == ["friendly mentors [x10]"]
+    assert prompt.omitted["program_improvements"] > 0
+    report = prompt.report()["lists"]["program_likings"]
+    assert report["non_answers"] == 50 and report["included"] == 1
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from services.coalescing import SingleFlight
+from services.rate_limit import TokenBucket
+
+
+def test_bucket_queues_callers_once_the_burst_is_used():
+    bucket = TokenBucket("test", rate=100, capacity=2)
+
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    # The third call owes one token, i.e. 10 ms at 100 tokens a second
+    assert bucket.acquire() == pytest.approx(0.01, abs=0.005)
+
+
+def test_zero_rate_disables_the_limiter():
+    bucket = TokenBucket.per_minute("test", 0)
+    assert all(bucket.acquire(1000) == 0 for _ in range(3))
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 3
+    # Nothing is kept once the call has finished
+    assert flight.do("key", lambda: "again") == ("again", False)
+
+
+def test_errors_are_raised_and_not_kept():
+    flight = SingleFlight("test")
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("key", lambda: 1) == (1, False)
@@ -0,0 +1,30 @@
+import pytest
+from conftest import sheet_url
+from fastapi import HTTPException
+
+from services.nps_aggregates import nps_aggregates
+from services.review_pipeline import live_wave_metrics, run_extraction
+
+
+def test_extraction_metrics_come_from_the_aggregates(sheets, spreadsheet_id):
+    result = run_extraction(sheet_url(spreadsheet_id), "Wave 2")
+
+    assert result["wave_number"] == "Wave 2"
+    assert result["metrics"] == nps_aggregates.get_wave(spreadsheet_id, "Wave 2")["metrics"]
+    assert result["metrics"]["respondents"] == 50
+
+
+def test_extraction_without_an_aggregate_computes_the_metrics(sheets, spreadsheet_id, monkeypatch):
+    expected = run_extraction(sheet_url(spreadsheet_id), "Wave 2")["metrics"]
+    monkeypatch.setattr(nps_aggregates, "get_wave", lambda sheet_id, wave: None)
+
+    result = run_extraction(sheet_url(spreadsheet_id), "Wave 2", limit=5)
+
+    assert result["metrics"] == expected
+
+
+def test_live_metrics_of_an_unknown_wave_are_not_found(sheets, spreadsheet_id):
+    assert live_wave_metrics(sheet_url(spreadsheet_id), "Wave 1")["response_count"] == 50
+    with pytest.raises(HTTPException) as error:
+        live_wave_metrics(sheet_url(spreadsheet_id), "Wave 7")
+    assert error.value.status_code == 404
@@ -0,0 +1,63 @@
+from services.nps_aggregates import nps_aggregates
+from services.response_store import response_store
+from services.review_pipeline import header_for
+from services.sheet_cache import SheetCache
+
+
+def store(snapshot, json_data):
+    wave_header = header_for(json_data, "wave_number")
+    response_store.update_from_snapshot(snapshot, wave_header)
+    nps_aggregates.update_from_snapshot(snapshot, wave_header, header_for(json_data, "recommendation_score"))
+
+
+def stored_rows(spreadsheet_id):
+    return sum(aggregate["response_count"] for aggregate in nps_aggregates.get_sheet(spreadsheet_id).values())
+
+
+def test_worker_behind_does_not_roll_the_stores_back(sheets, spreadsheet_id, json_data):
+    # Two API workers, each with its own in-memory sheet cache, sharing the SQLite stores
+    first, second = SheetCache(), SheetCache()
+    columns = list(json_data)
+    store(first.sync(sheets, spreadsheet_id, columns), json_data)
+
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(30, waves=4)
+    store(second.sync(sheets, spreadsheet_id, columns), json_data)
+    assert stored_rows(spreadsheet_id) == 230
+
+    # The first worker serves its cached snapshot without checking the revision
+    behind = first.sync(sheets, spreadsheet_id, columns, max_age=3600)
+    assert behind.row_count == 200
+    store(behind, json_data)
+
+    assert stored_rows(spreadsheet_id) == 230
+    assert response_store.load_snapshot(spreadsheet_id).row_count == 230
+
+
+def test_worker_catching_up_appends_without_rebuilding(sheets, spreadsheet_id, json_data):
+    first, second = SheetCache(), SheetCache()
+    columns = list(json_data)
+    store(first.sync(sheets, spreadsheet_id, columns), json_data)
+    sheets.open_by_key(spreadsheet_id).append_synthetic_rows(30, waves=4)
+    store(second.sync(sheets, spreadsheet_id, columns), json_data)
+
+    # A revision-checked sync brings the first worker up to date
+    caught_up = first.sync(sheets, spreadsheet_id, columns)
+    assert caught_up.row_count == 230 and caught_up.rewrite_from is None
+    store(caught_up, json_data)
+
+    assert stored_rows(spreadsheet_id) == 230
+
+
+def test_fresh_reload_of_a_shorter_sheet_rebuilds(sheets, spreadsheet_id, json_data):
+    first, second = SheetCache(), SheetCache()
+    columns = list(json_data)
+    store(first.sync(sheets, spreadsheet_id, columns), json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    for values in spreadsheet.sheet1.columns:
+        del values[120:]
+    spreadsheet.revision += 1
+
+    store(second.sync(sheets, spreadsheet_id, columns), json_data)
+
+    assert stored_rows(spreadsheet_id) == 120
+    assert response_store.load_snapshot(spreadsheet_id).row_count == 120
@@ -0,0 +1,232 @@
+import numpy as np
+
+from conftest import column_index, sheet_url
+from services import sheet_cache as sheet_cache_module
+from services.nps_aggregates import nps_aggregates
+from services.nps_metrics import score_histogram
+from services.response_store import response_store
+from services.review_pipeline import header_for, sync_sheet
+from services.sheet_cache import sheet_cache
+
+
+def expected_histogram(spreadsheet, json_data, wave):
+    worksheet = spreadsheet.sheet1
+    waves = worksheet.columns[column_index(spreadsheet, header_for(json_data, "wave_number"))]
+    scores = worksheet.columns[column_index(spreadsheet, header_for(json_data, "recommendation_score"))]
+    return score_histogram([score for label, score in zip(waves, scores) if label == wave]).tolist()
+
+
+def edit_score(spreadsheet, json_data, row):
+    """Change the score of one existing row, as a corrected form response would, and return its wave."""
+    worksheet = spreadsheet.sheet1
+    scores = worksheet.columns[column_index(spreadsheet, header_for(json_data, "recommendation_score"))]
+    scores[row] = "0" if scores[row] != "0" else "10"
+    spreadsheet.revision += 1
+    return worksheet.columns[column_index(spreadsheet, header_for(json_data, "wave_number"))][row]
+
+
+def test_unchanged_revision_downloads_nothing(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    calls = spreadsheet.api_calls
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+    # Only the revision lookup
+    assert spreadsheet.api_calls == calls + 1
+    assert snapshot.row_count == 200
+
+
+def test_appended_rows_are_fetched_incrementally(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    spreadsheet.append_synthetic_rows(30, waves=4)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert snapshot.row_count == 230
+    assert snapshot.rewrite_from is None
+    assert len(response_store.wave_frame(spreadsheet_id, "Wave 1")) == 230 // 4 + (230 % 4 > 0)
+    assert nps_aggregates.get_wave(spreadsheet_id, "Wave 2")["metrics"]["histogram"] == \
+        expected_histogram(spreadsheet, json_data, "Wave 2")
+
+
+def test_edit_near_the_watermark_is_reconciled(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    wave = edit_score(spreadsheet, json_data, row=190)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    score_header = header_for(json_data, "recommendation_score")
+    assert snapshot.rewrite_from == 190
+    assert snapshot.columns[score_header][190] == int(spreadsheet.sheet1.columns[
+        column_index(spreadsheet, score_header)][190])
+    assert nps_aggregates.get_wave(spreadsheet_id, wave)["metrics"]["histogram"] == \
+        expected_histogram(spreadsheet, json_data, wave)
+    stored = response_store.load_snapshot(spreadsheet_id)
+    assert stored.columns[score_header] == snapshot.columns[score_header]
+
+
+def test_older_edits_are_caught_by_the_periodic_full_reload(sheets, spreadsheet_id, json_data, monkeypatch):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    wave = edit_score(spreadsheet, json_data, row=3)
+
+    # Outside the re-read window, an edit is only seen once a full reload is due
+    monkeypatch.setattr(sheet_cache_module, "SHEET_FULL_RELOAD_SECONDS", 0)
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert snapshot.rewrite_from == 3
+    assert nps_aggregates.get_wave(spreadsheet_id, wave)["metrics"]["histogram"] == \
+        expected_histogram(spreadsheet, json_data, wave)
+
+
+def test_removed_rows_rebuild_the_stores(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    for values in spreadsheet.sheet1.columns:
+        del values[150:]
+    spreadsheet.revision += 1
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert snapshot.row_count == 150
+    total = sum(aggregate["response_count"] for aggregate in nps_aggregates.get_sheet(spreadsheet_id).values())
+    assert total == 150
+    assert response_store.load_snapshot(spreadsheet_id).row_count == 150
+
+
+def test_snapshot_is_restored_from_the_response_store(sheets, spreadsheet_id, json_data):
+    sync_sheet(spreadsheet_id, json_data)
+    sheet_cache.invalidate(spreadsheet_id)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    calls = spreadsheet.api_calls
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert snapshot.row_count == 200
+    # Seeded from the store at the same revision, so no rows are downloaded again
+    assert spreadsheet.api_calls == calls + 1
+    assert np.sum(nps_aggregates.get_wave(spreadsheet_id, "Wave 1")["metrics"]["histogram"]) == 50
+
+
+def record_ranges(spreadsheet, monkeypatch):
+    """Record the A1 ranges of every batchGet the spreadsheet serves."""
+    requested = []
+    batch_get = spreadsheet.values_batch_get
+
+    def recording(ranges, params=None):
+        requested.append([name.split("!", 1)[1] for name in ranges])
+        return batch_get(ranges, params)
+
+    monkeypatch.setattr(spreadsheet, "values_batch_get", recording)
+    return requested
+
+
+def column_letters(spreadsheet, headers):
+    return {chr(ord("A") + column_index(spreadsheet, header)) for header in headers}
+
+
+def test_only_configured_columns_are_downloaded(sheets, spreadsheet_id, json_data, monkeypatch):
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    requested = record_ranges(spreadsheet, monkeypatch)
+    letters = column_letters(spreadsheet, json_data)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    # The sheet also has timestamp, email and comment columns that are never read
+    assert len(spreadsheet.sheet1.headers) > len(json_data)
+    assert set(snapshot.header) == set(json_data)
+    assert len(requested) == 1
+    assert {name.split(":")[0].rstrip("0123456789") for name in requested[0]} == letters
+    assert all(name.endswith(f"2:{name[0]}") for name in requested[0])
+
+
+def test_incremental_sync_requests_only_configured_columns(sheets, spreadsheet_id, json_data, monkeypatch):
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    requested = record_ranges(spreadsheet, monkeypatch)
+    spreadsheet.append_synthetic_rows(10, waves=4)
+
+    sync_sheet(spreadsheet_id, json_data)
+
+    first_row = 200 - sheet_cache_module.SHEET_RECONCILE_ROWS + 2
+    letters = sorted(column_letters(spreadsheet, json_data))
+    # One request: the header cells plus the reconciled and new rows of each configured column
+    assert requested == [[f"{letter}1" for letter in letters] + [f"{letter}{first_row}:{letter}" for letter in letters]]
+
+
+def rename_header(spreadsheet, old, new):
+    headers = spreadsheet.sheet1.headers
+    headers[headers.index(old)] = new
+    spreadsheet.revision += 1
+
+
+def test_missing_configured_header_fails_cleanly(sheets, spreadsheet_id, json_data, client):
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    rename_header(spreadsheet, header_for(json_data, "program_likings"), "What did you like?")
+
+    response = client.get("/extract-reviews/", params={"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 1"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"].endswith(header_for(json_data, "program_likings"))
+
+
+def test_header_renamed_after_a_sync_fails_cleanly(sheets, spreadsheet_id, json_data, client):
+    params = {"spreadsheet_url": sheet_url(spreadsheet_id), "wave_number": "Wave 1"}
+    assert client.get("/extract-reviews/", params=params).status_code == 200
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    rename_header(spreadsheet, "Wave Survey?", "Which wave?")
+
+    response = client.get("/extract-reviews/", params=params)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Wave Survey? column not found in the spreadsheet."
+    # The header check of the incremental sync forced a full reload without the renamed column
+    assert "Wave Survey?" not in sheet_cache.get(spreadsheet_id).header
+
+
+def count_opens(sheets, monkeypatch):
+    opened = []
+    open_by_key = sheets.open_by_key
+
+    def counting(spreadsheet_id):
+        opened.append(spreadsheet_id)
+        return open_by_key(spreadsheet_id)
+
+    monkeypatch.setattr(sheets, "open_by_key", counting)
+    return opened
+
+
+def test_spreadsheet_is_opened_once(sheets, spreadsheet_id, json_data, monkeypatch):
+    opened = count_opens(sheets, monkeypatch)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    opened.clear()
+
+    sync_sheet(spreadsheet_id, json_data)
+    sync_sheet(spreadsheet_id, json_data)
+    spreadsheet.append_synthetic_rows(5, waves=4)
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert opened == [spreadsheet_id]
+    assert snapshot.row_count == 205
+
+
+def test_spreadsheet_is_reopened_when_the_revision_lookup_fails(sheets, spreadsheet_id, json_data, monkeypatch):
+    sync_sheet(spreadsheet_id, json_data)
+    opened = count_opens(sheets, monkeypatch)
+    spreadsheet = sheets.open_by_key(spreadsheet_id)
+    opened.clear()
+    revision = spreadsheet.get_lastUpdateTime
+    failures = iter([True])
+
+    def flaky_revision():
+        if next(failures, False):
+            raise ConnectionError("stale handle")
+        return revision()
+
+    monkeypatch.setattr(spreadsheet, "get_lastUpdateTime", flaky_revision)
+
+    snapshot = sync_sheet(spreadsheet_id, json_data)
+
+    assert opened == [spreadsheet_id]
+    assert snapshot.revision == revision()
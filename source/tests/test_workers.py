@@ -0,0 +1,61 @@
+import shutil
+
+from conftest import sheet_url
+
+from launcher import Supervisor, connect_host
+from services.rate_limit import TokenBucket
+from services.telemetry import MetricsPublisher, MetricsRegistry
+
+
+def worker_registry(requests, latency):
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests.", labels=("route",)).inc(requests, route="/rows")
+    registry.histogram("latency_seconds", "Latency.", buckets=(1, 5)).observe(latency)
+    return registry
+
+
+def test_metrics_are_summed_across_workers(tmp_path):
+    first = MetricsPublisher(worker_registry(3, 0.5), str(tmp_path))
+    second = MetricsPublisher(worker_registry(4, 2.0), str(tmp_path))
+    second.publish()
+
+    rendered = first.render()
+
+    assert 'requests_total{route="/rows"} 7' in rendered
+    assert 'latency_seconds_bucket{le="1.0"} 1' in rendered
+    assert 'latency_seconds_bucket{le="5.0"} 2' in rendered
+    assert "latency_seconds_count 2" in rendered
+    assert "latency_seconds_sum 2.5" in rendered
+
+
+def test_metrics_of_a_single_process_are_not_published(tmp_path):
+    publisher = MetricsPublisher(worker_registry(3, 0.5), "")
+    publisher.publish()
+    assert 'requests_total{route="/rows"} 3' in publisher.render()
+
+
+def test_quota_is_split_between_workers():
+    assert TokenBucket.per_minute("sheets", 120, workers=4).rate == 0.5
+    assert TokenBucket.per_minute("sheets", 120, workers=1).rate == 2
+
+
+def test_wildcard_bind_is_reached_over_loopback():
+    assert connect_host("0.0.0.0") == "127.0.0.1"
+    assert connect_host("::") == "[::1]"
+    assert connect_host("10.0.0.5") == "10.0.0.5"
+    supervisor = Supervisor(host="0.0.0.0", port=9000, workers=3, ui=False)
+    assert supervisor.api_url == "http://127.0.0.1:9000"
+    assert supervisor.api.env["API_WORKERS"] == "3"
+    assert supervisor.api.env["METRICS_DIR"]
+    shutil.rmtree(supervisor.api.env["METRICS_DIR"])
+
+
+def test_metrics_endpoint_reports_request_stages(sheets, spreadsheet_id, client):
+    client.get("/extract-reviews/nps/trend", params={"spreadsheet_url": sheet_url(spreadsheet_id)})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'nps_stage_duration_seconds_count{stage="sheet_sync",outcome="ok"}' in response.text
+    assert 'route="/extract-reviews/nps/trend",status="200"' in response.text